@@ -0,0 +1,352 @@
+"""
+This module runs the financial analysis without prompts for every
+record of a JSON or CSV file of account inputs and writes structured
+results for each record
+"""
+import argparse
+import csv
+import json
+import sys
+import numpy as np
+from gspread.utils import rowcol_to_a1
+import run
+from commentary import INDUSTRY, get_classifier
+from models import history_values
+from peers import get_peer_index, size_band
+from ratio_engine import RATIO_NAMES, compute_ratios
+from report import finite_or_none
+from storage import (
+    PROFIT_AND_LOSS, BALANCE_SHEET, LINE_ITEM_CELLS, read_records,
+    recalculate, to_number
+)
+
+# Accounts read from the input file: worksheet, cell, minimum and maximum
+INPUT_ACCOUNTS = {
+    **{
+        account_name: (PROFIT_AND_LOSS, *account)
+        for account_name, account in run.PROFIT_AND_LOSS_ACCOUNTS.items()
+    },
+    **{
+        account_name: (BALANCE_SHEET, *account)
+        for account_name, account in run.BALANCE_SHEET_ACCOUNTS.items()
+    }
+}
+
+# Ratios where a value below the benchmark means better performance
+LOWER_IS_BETTER = ('debt_to_equity',)
+
+# Read and validate the input file
+
+
+def parse_value(value):
+    """
+    Parse an account input with the same rules as validate_input,
+    returning NaN when it is not a whole number
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    text = str(value if value is not None else '').replace(',', '').strip()
+    if not text.isdigit() or (text.startswith('0') and text != '0'):
+        return float('nan')
+    return float(text)
+
+
+def validate_records(records):
+    """
+    Validate the inputs of all records at once. Returns an array of
+    values (records x accounts), a boolean array of valid records and
+    the list of error messages for each record.
+    """
+    values = np.array(
+        [
+            [parse_value(record.get(account_name))
+             for account_name in INPUT_ACCOUNTS]
+            for record in records
+        ],
+        dtype=float
+    ).reshape(len(records), len(INPUT_ACCOUNTS))
+    minimum = np.array([account[2] for account in INPUT_ACCOUNTS.values()])
+    maximum = np.array([account[3] for account in INPUT_ACCOUNTS.values()])
+
+    not_digits = np.isnan(values)
+    with np.errstate(invalid='ignore'):
+        decimals = ~not_digits & (values != np.floor(values))
+        out_of_range = ~not_digits & (
+            (values < minimum) | (values > maximum))
+
+    account_names = list(INPUT_ACCOUNTS)
+    errors = [[] for _ in records]
+    for check, message in (
+        (not_digits, "Input must contain only digits."),
+        (decimals, "The number should not contain any decimal places."),
+        (out_of_range, "The number should be between {:,.0f} and {:,.0f}.")
+    ):
+        for row, column in zip(*np.nonzero(check)):
+            errors[row].append(
+                f"{account_names[column]}: "
+                f"{message.format(minimum[column], maximum[column])}"
+            )
+    valid = ~(not_digits | decimals | out_of_range).any(axis=1)
+    return values, valid, errors
+
+# Statements, ratios, benchmarks and trends for all records
+
+
+def base_cells(worksheet):
+    """Get the numeric cells of the worksheet from its snapshot"""
+    cells = {}
+    for row_number, row in enumerate(run.get_snapshot(worksheet), 1):
+        for col_number, value in enumerate(row, 1):
+            try:
+                number = to_number(value)
+            except ValueError:
+                continue
+            if value != '':
+                cells[rowcol_to_a1(row_number, col_number)] = number
+    return cells
+
+
+def statement_lines(worksheet):
+    """Get the label and value cell of each line of the statement"""
+    return [
+        (row[0].rstrip(':'), f"B{row_number}")
+        for row_number, row in enumerate(run.get_snapshot(worksheet), 1)
+        if row[0] and len(row) > 1 and row[1] not in ('', '£')
+    ]
+
+
+def recalculate_ratios(base, inputs):
+    """
+    Overlay input values on the numeric cells of the statements,
+    recalculate their totals and calculate the six ratios. `base` maps
+    each worksheet to {cell: value} and `inputs` maps (worksheet, cell)
+    to values, which are broadcast against each other. Returns the
+    recalculated workbook and the ratios, NaN where undefined.
+    """
+    workbook = {}
+    for worksheet, cells in base.items():
+        cells = dict(cells)
+        for (sheet, cell), value in inputs.items():
+            if sheet == worksheet:
+                cells[cell] = value
+        recalculate(worksheet, cells)
+        workbook[worksheet] = cells
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = compute_ratios({
+            item: workbook[worksheet].get(cell, 0.0)
+            for item, (worksheet, cell) in LINE_ITEM_CELLS.items()
+        })
+    return workbook, {
+        name: np.ma.filled(ratio, np.nan) for name, ratio in ratios.items()
+    }
+
+
+def compute_statements(values):
+    """
+    Overlay the inputs of every record on the workbook and recalculate
+    the statement totals and ratios for all records at once
+    """
+    base = {
+        worksheet: {
+            cell: np.full(len(values), value)
+            for cell, value in base_cells(worksheet).items()
+        }
+        for worksheet in (PROFIT_AND_LOSS, BALANCE_SHEET)
+    }
+    return recalculate_ratios(base, {
+        (sheet, cell): values[:, column]
+        for column, (sheet, cell, _, _) in enumerate(INPUT_ACCOUNTS.values())
+    })
+
+
+def compare_benchmarks(ratios, benchmarks):
+    """
+    Compare the ratios of all records with the benchmarks. Returns the
+    position (1 above, -1 below, 0 equal) for each ratio.
+    """
+    return {
+        name: np.sign(ratios[name] - benchmarks[name])
+        for name in RATIO_NAMES
+    }
+
+
+def compute_trends(ratios, historical_data):
+    """
+    Replace the latest period of the historical data with the ratios of
+    each record, as the interactive tool does, and calculate the
+    period-over-period change in % for all records at once
+    """
+    names, periods, history = history_values(historical_data)
+    history = history[[names.index(name) for name in RATIO_NAMES]]
+    history = np.broadcast_to(
+        history, (len(ratios[RATIO_NAMES[0]]),) + history.shape).copy()
+    history[:, :, -1] = np.stack(
+        [np.round(ratios[name], 2) for name in RATIO_NAMES], axis=1)
+
+    previous, current = history[:, :, :-1], history[:, :, 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        changes = np.where(
+            previous != 0, (current - previous) / previous * 100, np.inf)
+    labels = [
+        f"{periods[i - 1]}-{periods[i]}" for i in range(1, len(periods))
+    ]
+    return labels, changes
+
+
+def run_batch(records):
+    """Run the full analysis for all records and return the results"""
+    values, valid, errors = validate_records(records)
+    workbook, ratios = compute_statements(values)
+    benchmarks = run.get_benchmarks()
+    positions = compare_benchmarks(ratios, benchmarks)
+    classifier = get_classifier()
+    categories = classifier.categories(classifier.classify(ratios))
+    negative = classifier.negative(ratios)
+    peer_index = get_peer_index()
+    if peer_index is not None:
+        worksheet, cell = LINE_ITEM_CELLS['sales_revenue']
+        peers = peer_index.rank_companies(
+            ratios,
+            [record.get('industry') or INDUSTRY for record in records],
+            size_band(workbook[worksheet][cell])
+        )
+    periods, changes = compute_trends(ratios, run.get_historical_data())
+    lines = {
+        worksheet: statement_lines(worksheet)
+        for worksheet in (PROFIT_AND_LOSS, BALANCE_SHEET)
+    }
+
+    results = []
+    for index, record in enumerate(records):
+        result = {
+            'id': record.get('id', index + 1),
+            'valid': bool(valid[index]),
+            'errors': errors[index]
+        }
+        if valid[index]:
+            result['statements'] = {
+                worksheet: {
+                    label: float(workbook[worksheet][cell][index])
+                    for label, cell in statement
+                }
+                for worksheet, statement in lines.items()
+            }
+            result['ratios'] = {
+                name: finite_or_none(ratios[name][index])
+                for name in RATIO_NAMES
+            }
+            result['commentary'] = {
+                name: categories[name][index] for name in RATIO_NAMES
+            }
+            result['negative_ratios'] = [
+                classifier.rules[name]['label']
+                for name in RATIO_NAMES if negative[name][index]
+            ]
+            result['benchmarks'] = {
+                name: {
+                    'benchmark': benchmarks[name],
+                    'position': describe_position(
+                        name, positions[name][index])
+                }
+                for name in RATIO_NAMES
+            }
+            if peer_index is not None:
+                result['peers'] = {
+                    name: {
+                        key: finite_or_none(peers[name][key][index])
+                        for key in ('percentile', 'quartile', 'median',
+                                    'distance_from_median', 'peers')
+                    }
+                    for name in RATIO_NAMES
+                }
+                for name in RATIO_NAMES:
+                    result['peers'][name]['position'] = describe_position(
+                        name, peers[name]['position'][index])
+            result['trends'] = {
+                name: {
+                    period: finite_or_none(changes[index, row, column])
+                    for column, period in enumerate(periods)
+                }
+                for row, name in enumerate(RATIO_NAMES)
+            }
+        results.append(result)
+    return results
+
+
+def describe_position(name, position):
+    """Describe the ratio position against the benchmark"""
+    if np.isnan(position):
+        return None
+    if position == 0:
+        return 'equal, indicating average performance'
+    if name in LOWER_IS_BETTER:
+        return (
+            'below, indicating better performance' if position < 0
+            else 'above, indicating higher financial risk'
+        )
+    return (
+        'above, indicating better performance' if position > 0
+        else 'below, indicating underperformance'
+    )
+
+# Write the results
+
+
+def flatten(result, prefix=''):
+    """Flatten nested results into dotted column names for CSV"""
+    row = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            row.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, list):
+            row[f"{prefix}{key}"] = '; '.join(value)
+        else:
+            row[f"{prefix}{key}"] = value
+    return row
+
+
+def write_results(results, path):
+    """Write the results as JSON, or as CSV when the path ends in .csv"""
+    output = sys.stdout if path == '-' else open(path, 'w', newline='')
+    try:
+        if path.lower().endswith('.csv'):
+            rows = [flatten(result) for result in results]
+            columns = list(dict.fromkeys(
+                column for row in rows for column in row))
+            writer = csv.DictWriter(output, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            json.dump(results, output, indent=2, allow_nan=False,
+                      default=str)
+            output.write('\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def main(argv=None):
+    """Run the batch analysis from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Analyse every record of a JSON or CSV file of "
+        "account inputs without prompts."
+    )
+    parser.add_argument('input', help="JSON or CSV file of account inputs")
+    parser.add_argument(
+        '-o', '--output', default='-',
+        help="JSON or CSV file for the results (default: standard output)"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_batch(read_records(args.input))
+    write_results(results, args.output)
+    invalid = sum(not result['valid'] for result in results)
+    print(
+        f"Analysed {len(results) - invalid} records, "
+        f"{invalid} invalid.", file=sys.stderr
+    )
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+"""
+Benchmark suite for the financial analysis pipeline.
+
+Runs each stage against a recorded fixture of the workbook and reports
+wall time, peak memory allocated and the number of storage API calls.
+Baselines can be saved and checked so that CI fails on regressions:
+
+    python3 benchmarks/run_benchmarks.py              # report only
+    python3 benchmarks/run_benchmarks.py --save       # save baseline
+    python3 benchmarks/run_benchmarks.py --check      # fail on regression
+    python3 benchmarks/run_benchmarks.py --record     # record the fixture
+"""
+import argparse
+import atexit
+import contextlib
+import csv
+import io
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from gspread.utils import rowcol_to_a1
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+import run  # noqa: E402
+from commentary import get_classifier  # noqa: E402
+from export import Exporter  # noqa: E402
+from history_store import RatioHistoryStore  # noqa: E402
+from ledger import DEFAULT_ACCOUNT_MAPPING, ingest  # noqa: E402
+from models import RatioFrame  # noqa: E402
+from monte_carlo import SimulationModel, run_simulation  # noqa: E402
+from peers import PeerIndex, size_band  # noqa: E402
+from ratio_engine import LINE_ITEMS, RATIO_NAMES, compute_ratios  # noqa: E402
+from scenarios import ScenarioEngine, account_grid  # noqa: E402
+from report import PlainTextRenderer  # noqa: E402
+from storage import (  # noqa: E402
+    MemoryBackend, create_backend, range_bounds
+)
+from trends import TrendEngine  # noqa: E402
+
+FIXTURE_FILE = os.path.join(BENCHMARKS_DIR, 'fixtures', 'workbook.json')
+BASELINE_FILE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+
+# Synthetic history lengths for the scaling cases
+SCALING_PERIODS = (4, 40, 400, 4_000, 10_000)
+
+# Synthetic peers indexed and companies ranked against them
+PEER_COUNT = 20_000
+RANKED_COMPANIES = 5_000
+PEER_INDUSTRIES = ('retail', 'manufacturing', 'utilities')
+
+# Journal lines of the synthetic general ledger
+LEDGER_LINES = 200_000
+
+# Entities and periods of the synthetic ratios exported to CSV
+EXPORT_ENTITIES = 500
+EXPORT_PERIODS = 40
+
+# Entities and quarters of the synthetic ratio history, and the entities
+# whose last 20 quarters are looked up
+HISTORY_ENTITIES = 5_000
+HISTORY_QUARTERS = 40
+HISTORY_LOOKUPS = 1_000
+
+# Ratios of a sample company used by the analysis stages
+SAMPLE_RATIOS = (4.71, 3.53, -18.0, -10.0, 13.6, -1.57)
+
+# Recorded workbook fixture
+
+
+class FixtureBackend(MemoryBackend):
+    """
+    In-memory workbook loaded from the recorded fixture, counting the
+    read and write calls made to it
+    """
+
+    def __init__(self, fixture):
+        layout = {}
+        for worksheet, recorded in fixture.items():
+            first_row, _, first_col, _ = range_bounds(recorded['range'])
+            layout[worksheet] = {
+                rowcol_to_a1(row, col): value
+                for row, values in enumerate(recorded['rows'], first_row)
+                for col, value in enumerate(values, first_col)
+                if value != ''
+            }
+        super().__init__(layout)
+        self.calls = 0
+
+    def read_range(self, worksheet, cell_range):
+        self.calls += 1
+        return super().read_range(worksheet, cell_range)
+
+    def read_ranges(self, ranges):
+        self.calls += 1
+        return [
+            super(FixtureBackend, self).read_range(worksheet, cell_range)
+            for worksheet, cell_range in ranges
+        ]
+
+    def write_cells(self, updates):
+        self.calls += 1
+        super().write_cells(updates)
+
+
+def load_fixture():
+    """Load the recorded workbook fixture"""
+    with open(FIXTURE_FILE, encoding='utf-8') as fixture_file:
+        return json.load(fixture_file)
+
+
+def record_fixture():
+    """
+    Record every tab of the workbook from the storage backend set by
+    FIN_STORAGE, one row per line so that diffs stay readable
+    """
+    ranges = list(run.SNAPSHOT_RANGES.items())
+    rows = create_backend().read_ranges(ranges)
+    lines = []
+    for (worksheet, cell_range), values in zip(ranges, rows):
+        recorded_rows = ',\n'.join(
+            '   ' + json.dumps(row, ensure_ascii=False) for row in values)
+        lines.append(
+            f' {json.dumps(worksheet)}: {{\n'
+            f'  "range": {json.dumps(cell_range)},\n'
+            f'  "rows": [\n{recorded_rows}\n  ]\n }}'
+        )
+    with open(FIXTURE_FILE, 'w', encoding='utf-8') as fixture_file:
+        fixture_file.write('{\n' + ',\n'.join(lines) + '\n}\n')
+    print(f"Recorded {len(ranges)} worksheets to {FIXTURE_FILE}")
+
+# Pipeline stages
+
+
+def option_iv():
+    """Build and render the complete financial report (option IV)"""
+    PlainTextRenderer(io.StringIO()).render(
+        run.generate_complete_report(*SAMPLE_RATIOS))
+
+
+PIPELINE_STAGES = {
+    'generate_profit_and_loss': run.generate_profit_and_loss,
+    'generate_balance_sheet': run.generate_balance_sheet,
+    'calculate_liquidity_ratios': run.calculate_liquidity_ratios,
+    'calculate_profitability_ratios': run.calculate_profitability_ratios,
+    'calculate_solvency_ratios': run.calculate_solvency_ratios,
+    'get_historical_data': run.get_historical_data,
+    'calculate_trend_analysis': lambda: run.calculate_trend_analysis(
+        run.get_historical_data()),
+    'option_iv': option_iv,
+    'scenario_grid[7^6]': lambda: ScenarioEngine().sweep_grid(
+        account_grid(7)),
+    'scenario_breakpoints': lambda: ScenarioEngine().breakpoints(),
+    'monte_carlo[1000000]': lambda: run_simulation(
+        SimulationModel(), 1_000_000, seed=0, workers=1)
+}
+
+
+def synthetic_history(periods):
+    """Random ratio history with the given number of periods"""
+    rng = np.random.default_rng(periods)
+    labels = [f"P{index}" for index in range(periods)]
+    return {
+        ratio: dict(zip(labels, rng.uniform(0.5, 50, periods).tolist()))
+        for ratio in run.HISTORY_ROWS
+    }
+
+
+def synthetic_items(periods):
+    """Random line items for 100 entities x periods"""
+    rng = np.random.default_rng(periods)
+    return {
+        item: rng.uniform(1_000, 200_000, (100, periods))
+        for item in LINE_ITEMS
+    }
+
+
+def synthetic_peers(count, seed):
+    """Random industries, size bands and ratios of count companies"""
+    rng = np.random.default_rng(seed)
+    return (
+        rng.choice(PEER_INDUSTRIES, count),
+        size_band(rng.lognormal(14, 1.5, count)),
+        {name: rng.normal(10, 5, count) for name in RATIO_NAMES}
+    )
+
+
+def synthetic_ledger(lines):
+    """Write a random two-year general ledger to a temporary CSV file"""
+    rng = np.random.default_rng(lines)
+    accounts = rng.choice(list(DEFAULT_ACCOUNT_MAPPING), lines)
+    dates = np.datetime64('2023-01-01') + rng.integers(0, 730, lines)
+    amounts = np.round(rng.uniform(-1_000, 1_000, lines), 2)
+    ledger_file = tempfile.NamedTemporaryFile(
+        'w', newline='', suffix='.csv', delete=False)
+    with ledger_file:
+        writer = csv.writer(ledger_file)
+        writer.writerow(('date', 'account', 'amount'))
+        writer.writerows(zip(dates.astype(str), accounts, amounts))
+    atexit.register(os.remove, ledger_file.name)
+    return ledger_file.name
+
+
+def export_stage(entities, periods):
+    """Export the ratios, benchmarks and trends of synthetic entities"""
+    rng = np.random.default_rng(entities)
+    ratios = RatioFrame(
+        range(entities), range(periods),
+        rng.normal(10, 5, (entities, periods, len(RATIO_NAMES))))
+    directory = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, directory)
+
+    def stage():
+        with Exporter(directory, 'csv', ('ratios', 'benchmarks', 'trends'),
+                      dict(zip(RATIO_NAMES, SAMPLE_RATIOS))) as exporter:
+            exporter.add(ratios)
+    return stage
+
+
+def synthetic_ratio_history(entities, quarters):
+    """Ratios of synthetic entities over consecutive quarters"""
+    rng = np.random.default_rng(quarters)
+    return RatioFrame(
+        [f"entity-{index}" for index in range(entities)],
+        [f"Q{index % 4 + 1} {2000 + index // 4}" for index in range(quarters)],
+        rng.normal(10, 5, (entities, quarters, len(RATIO_NAMES))))
+
+
+def scaling_stages():
+    """
+    Trend, ratio and commentary stages over synthetic histories of
+    growing length, peer ranking against synthetic peers, ingestion of a
+    synthetic general ledger, the CSV export of synthetic ratios and a
+    synthetic ratio history store
+    """
+    stages = {}
+    for periods in SCALING_PERIODS:
+        history = synthetic_history(periods)
+        items = synthetic_items(periods)
+        stages[f'trend_engine[{periods}]'] = (
+            lambda history=history: TrendEngine.from_history(history).cagr)
+        stages[f'calculate_trend_analysis[{periods}]'] = (
+            lambda history=history: run.calculate_trend_analysis(history))
+        stages[f'compute_ratios[100x{periods}]'] = (
+            lambda items=items: compute_ratios(items))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = compute_ratios(items)
+        stages[f'classify_ratios[100x{periods}]'] = (
+            lambda ratios=ratios: get_classifier().comments(
+                get_classifier().classify(ratios)))
+    peers = synthetic_peers(PEER_COUNT, 0)
+    companies = synthetic_peers(RANKED_COMPANIES, 1)
+    index = PeerIndex(*peers)
+    stages[f'peer_index[{PEER_COUNT}]'] = lambda: PeerIndex(*peers)
+    stages[f'peer_ranking[{RANKED_COMPANIES}x{PEER_COUNT}]'] = (
+        lambda: index.rank_companies(companies[2], *companies[:2]))
+    ledger_path = synthetic_ledger(LEDGER_LINES)
+    stages[f'ledger_ingest[{LEDGER_LINES}]'] = (
+        lambda: ingest(ledger_path).ratios())
+    stages[f'export_csv[{EXPORT_ENTITIES}x{EXPORT_PERIODS}]'] = export_stage(
+        EXPORT_ENTITIES, EXPORT_PERIODS)
+    history = synthetic_ratio_history(HISTORY_ENTITIES, HISTORY_QUARTERS)
+    store = RatioHistoryStore()
+    store.append_frame(history)
+    stages[f'history_append[{HISTORY_ENTITIES}x{HISTORY_QUARTERS}]'] = (
+        lambda: RatioHistoryStore().append_frame(history))
+    stages[f'history_lookup[{HISTORY_LOOKUPS}x20]'] = lambda: [
+        store.history(entity, ('quick_ratio',), last=20)
+        for entity in history.entities[:HISTORY_LOOKUPS]
+    ]
+    return stages
+
+# Measurements
+
+
+def measure(stage, backend, repeats):
+    """
+    Run the stage with a cold cache and return the median wall time in
+    ms, the peak memory allocated in KiB and the storage calls made
+    """
+    timings = []
+    for _ in range(repeats):
+        run.clear_cache()
+        start = time.perf_counter()
+        stage()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    run.clear_cache()
+    calls_before = backend.calls
+    tracemalloc.start()
+    stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'wall_ms': round(statistics.median(timings), 3),
+        'peak_kib': round(peak / 1024, 1),
+        'api_calls': backend.calls - calls_before
+    }
+
+
+def run_benchmarks(repeats, include_scaling=True):
+    """Run every stage against the fixture and return the results"""
+    backend = FixtureBackend(load_fixture())
+    run.get_backend = lambda: backend
+    run.TYPING_DELAY = 0
+    run.PAUSE = 0
+
+    stages = dict(PIPELINE_STAGES)
+    if include_scaling:
+        stages.update(scaling_stages())
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, stage in stages.items():
+            results[name] = measure(stage, backend, repeats)
+    return results
+
+
+def check_regressions(results, baseline, tolerance):
+    """
+    Compare results with the baseline. API calls must not increase;
+    time and memory may grow by the tolerance (0.5 = 50%).
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]
+        if result['api_calls'] > expected['api_calls']:
+            regressions.append(
+                f"{name}: {result['api_calls']} API calls, "
+                f"baseline {expected['api_calls']}")
+        for metric in ('wall_ms', 'peak_kib'):
+            limit = expected[metric] * (1 + tolerance)
+            # Ignore differences too small to measure reliably
+            if result[metric] > max(limit, expected[metric] + 1):
+                regressions.append(
+                    f"{name}: {metric} {result[metric]}, "
+                    f"baseline {expected[metric]}")
+    return regressions
+
+
+def print_results(results):
+    """Print a table of the results"""
+    width = max(len(name) for name in results)
+    print(f"{'stage':<{width}}  {'wall ms':>10}  {'peak KiB':>10}  "
+          f"{'API calls':>9}")
+    for name, result in results.items():
+        print(f"{name:<{width}}  {result['wall_ms']:>10.3f}  "
+              f"{result['peak_kib']:>10.1f}  {result['api_calls']:>9}")
+
+
+def main(argv=None):
+    """Run the benchmark suite from the command line"""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeats', type=int, default=5,
+                        help="runs per stage for the median wall time")
+    parser.add_argument('--no-scaling', action='store_true',
+                        help="skip the synthetic scaling cases")
+    parser.add_argument('--save', action='store_true',
+                        help="save the results as the baseline")
+    parser.add_argument('--check', action='store_true',
+                        help="exit with an error on regressions")
+    parser.add_argument('--tolerance', type=float, default=1.0,
+                        help="allowed growth of time and memory "
+                        "(default: 1.0, i.e. 100%%)")
+    parser.add_argument('--record', action='store_true',
+                        help="record the fixture from FIN_STORAGE")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        record_fixture()
+        return 0
+
+    results = run_benchmarks(args.repeats, not args.no_scaling)
+    print_results(results)
+
+    if args.save:
+        with open(BASELINE_FILE, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+            baseline_file.write('\n')
+        print(f"\nBaseline saved to {BASELINE_FILE}")
+    if args.check:
+        with open(BASELINE_FILE) as baseline_file:
+            regressions = check_regressions(
+                results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
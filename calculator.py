@@ -0,0 +1,147 @@
+"""
+This module calculates the statement totals and financial ratios locally
+as a dependency graph, so that a changed input updates only the totals
+and ratios that depend on it without reading them back from Google Sheets
+"""
+import numpy as np
+from gspread.utils import rowcol_to_a1
+from ratio_engine import RATIO_FORMULAS
+from storage import LINE_ITEM_CELLS, WORKBOOK_FORMULAS, to_number
+
+
+def signed_sum(signs):
+    """Formula adding up its terms, each multiplied by its sign"""
+    return lambda *values: sum(
+        sign * value for sign, value in zip(signs, values))
+
+
+def ratio_value(function):
+    """Ratio formula returning NaN instead of a masked zero division"""
+    def calculate(*values):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return float(np.ma.filled(function(*values), np.nan))
+    return calculate
+
+
+class CalculationGraph:
+    """
+    Cells of the statements and the six ratios as nodes of a graph. A
+    total depends on the cells of its formula and a ratio on the cells
+    of its line items; input cells have no dependencies. Cells are keyed
+    by (worksheet, cell) and ratios by name.
+    """
+
+    def __init__(self, formulas=WORKBOOK_FORMULAS):
+        self.values = {}
+        self.formulas = {}
+        self.dependents = {}
+        for worksheet, cells in formulas.items():
+            for cell, terms in cells.items():
+                self.add_node(
+                    (worksheet, cell),
+                    [(worksheet, term.lstrip('-')) for term in terms],
+                    signed_sum([
+                        -1 if term.startswith('-') else 1 for term in terms
+                    ])
+                )
+        for name, (items, function) in RATIO_FORMULAS.items():
+            self.add_node(
+                name,
+                [LINE_ITEM_CELLS[item] for item in items],
+                ratio_value(function)
+            )
+        self.order = self.sort_nodes()
+
+    def add_node(self, node, dependencies, function):
+        """Add a calculated node and link it to its dependencies"""
+        self.formulas[node] = (dependencies, function)
+        for dependency in dependencies:
+            self.dependents.setdefault(dependency, []).append(node)
+
+    def sort_nodes(self):
+        """
+        Order the calculated nodes so that each one comes after the
+        nodes it depends on
+        """
+        order = []
+        state = {}
+
+        def visit(node):
+            if state.get(node) == 'done':
+                return
+            if state.get(node) == 'visiting':
+                raise ValueError(f"Circular formula at {node}")
+            state[node] = 'visiting'
+            for dependency in self.formulas[node][0]:
+                if dependency in self.formulas:
+                    visit(dependency)
+            state[node] = 'done'
+            order.append(node)
+
+        for node in self.formulas:
+            visit(node)
+        return order
+
+    def recalculate(self, nodes):
+        """Calculate the given nodes, which must be in dependency order"""
+        for node in nodes:
+            dependencies, function = self.formulas[node]
+            self.values[node] = function(
+                *(self.values.get(dependency, 0.0)
+                  for dependency in dependencies))
+
+    def affected(self, nodes):
+        """Get the calculated nodes depending on any of the given nodes"""
+        found = set()
+        stack = list(nodes)
+        while stack:
+            for dependent in self.dependents.get(stack.pop(), ()):
+                if dependent not in found:
+                    found.add(dependent)
+                    stack.append(dependent)
+        return [node for node in self.order if node in found]
+
+    def load(self, snapshots):
+        """
+        Load the input cells of each worksheet from its snapshot rows,
+        given as {worksheet: rows}, and recalculate the totals and ratios
+        depending on them
+        """
+        inputs = {}
+        for worksheet, rows in snapshots.items():
+            for row_number, row in enumerate(rows, 1):
+                for col_number, value in enumerate(row, 1):
+                    node = (worksheet, rowcol_to_a1(row_number, col_number))
+                    if value == '' or node in self.formulas:
+                        continue
+                    try:
+                        inputs[node] = to_number(value)
+                    except ValueError:
+                        continue
+        self.values.update(inputs)
+        self.recalculate(self.affected(inputs))
+
+    def set(self, worksheet, cell, value):
+        """
+        Set an input cell and recalculate only the totals and ratios
+        depending on it. Returns the recalculated nodes.
+        """
+        node = (worksheet, cell)
+        if node in self.formulas:
+            raise ValueError(f"{worksheet}!{cell} is a calculated total")
+        self.values[node] = to_number(value)
+        nodes = self.affected([node])
+        self.recalculate(nodes)
+        return nodes
+
+    def value(self, worksheet, cell):
+        """Get the value of a cell, zero when it is empty"""
+        return self.values.get((worksheet, cell), 0.0)
+
+    def line_item(self, name):
+        """Get the value of a line item used by the ratios"""
+        return self.value(*LINE_ITEM_CELLS[name])
+
+    def ratio(self, name):
+        """Get a ratio, NaN when its denominator is zero"""
+        return self.values[name]
@@ -0,0 +1,232 @@
+"""
+This module classifies financial ratios into the categories commented on
+in the ratio analysis, from a table of thresholds that can be adjusted
+per industry, for one company or many companies and periods at once
+"""
+import copy
+import functools
+import json
+import os
+import numpy as np
+
+# Industry of the analysed company, which selects the threshold overrides
+INDUSTRY = os.environ.get('FIN_INDUSTRY', 'retail')
+
+# JSON file of the threshold overrides per industry, in the format
+# {industry: {ratio: {'thresholds': [[value, operator], ...]}}}
+COMMENTARY_CONFIG = os.environ.get(
+    'FIN_COMMENTARY_CONFIG',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                 'commentary.json')
+)
+
+# Commentary on each ratio: the thresholds between its categories in
+# ascending order, each one reached when the ratio is at least ('>=') or
+# above ('>') its value, and the categories from the lowest values to
+# the highest with their comment. A ratio that cannot be calculated is
+# put in the `missing` category.
+COMMENTARY_RULES = {
+    'current_ratio': {
+        'label': 'current ratio',
+        'thresholds': ((1, '>='), (1.5, '>=')),
+        'categories': (
+            ('poor', "Current ratio indicates poor liquidity, and "
+             "immediate attention may be required."),
+            ('adequate', "Current ratio suggests adequate liquidity, "
+             "but caution may be needed."),
+            ('good', "Current ratio indicates good liquidity.")
+        ),
+        'missing': 'poor'
+    },
+    'quick_ratio': {
+        'label': 'quick ratio',
+        'thresholds': ((1, '>='),),
+        'categories': (
+            ('weak', "Quick ratio suggests potential difficulties in "
+             "meeting short-term obligations."),
+            ('strong', "Quick ratio indicates strong ability to meet "
+             "short-term obligations.")
+        ),
+        'missing': 'weak'
+    },
+    'net_profit_margin': {
+        'label': 'net profit margin',
+        'thresholds': ((5, '>='), (10, '>')),
+        'categories': (
+            ('low', "Net profit margin indicates low profitability, "
+             "and improvement may be needed."),
+            ('satisfactory', "Net profit margin suggests satisfactory "
+             "profitability."),
+            ('healthy', "Net profit margin indicates healthy "
+             "profitability.")
+        ),
+        'missing': 'low'
+    },
+    'return_on_assets': {
+        'label': 'return on assets',
+        'thresholds': ((5, '>='), (10, '>')),
+        'categories': (
+            ('inefficient', "Return on assets suggests inefficiency in "
+             "asset utilization, and optimization may be required."),
+            ('satisfactory', "Return on assets indicates satisfactory "
+             "performance in asset utilization."),
+            ('efficient', "Return on assets suggests efficient "
+             "utilization of assets.")
+        ),
+        'missing': 'inefficient'
+    },
+    'debt_to_equity': {
+        'label': 'debt-to-equity ratio',
+        'thresholds': ((50, '>='), (60, '>')),
+        'categories': (
+            ('low_risk', "Debt-to-equity ratio indicates low financial "
+             "risk."),
+            ('moderate_risk', "Debt-to-equity ratio suggests moderate "
+             "financial risk."),
+            ('high_risk', "Debt-to-equity ratio indicates high financial "
+             "risk, and debt management strategies may be needed.")
+        ),
+        'missing': 'high_risk'
+    },
+    'interest_cover': {
+        'label': 'interest cover ratio',
+        'thresholds': ((2, '>='),),
+        'categories': (
+            ('strained', "Interest cover ratio suggests potential "
+             "challenges in covering interest expenses."),
+            ('comfortable', "Interest cover ratio indicates comfortable "
+             "ability to cover interest expenses.")
+        ),
+        'missing': 'strained'
+    }
+}
+
+# Sections of the ratio analysis and the ratios commented on in each
+COMMENTARY_SECTIONS = (
+    ("Liquidity Ratios Analysis:", ('current_ratio', 'quick_ratio')),
+    ("Profitability Ratios Analysis:",
+     ('net_profit_margin', 'return_on_assets')),
+    ("Solvency Ratios Analysis:", ('debt_to_equity', 'interest_cover'))
+)
+
+OPERATORS = ('>=', '>')
+
+
+def ratio_values(values):
+    """Float array of the values, NaN where a masked ratio is undefined"""
+    return np.ma.filled(np.ma.asarray(values, dtype=float), np.nan)
+
+
+def load_overrides(path=COMMENTARY_CONFIG):
+    """Read the threshold overrides per industry, none without the file"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as config_file:
+        return json.load(config_file)
+
+
+def industry_rules(industry=INDUSTRY, overrides=None):
+    """
+    Get the commentary rules with the overrides of the industry applied.
+    An override replaces the keys it sets in the rule of its ratio.
+    """
+    if overrides is None:
+        overrides = load_overrides()
+    rules = copy.deepcopy(COMMENTARY_RULES)
+    for name, override in overrides.get(industry, {}).items():
+        if name not in rules:
+            raise ValueError(f"Unknown ratio in {industry} overrides: {name}")
+        rules[name].update(override)
+    return rules
+
+
+class CommentaryClassifier:
+    """
+    Apply the commentary rules to arrays of ratios. Each rule is turned
+    into the bin edges of np.digitize, so that every value of a ratio is
+    classified in one pass. Category codes index the categories of the
+    rule, from the lowest values to the highest.
+    """
+
+    def __init__(self, rules=COMMENTARY_RULES):
+        self.rules = rules
+        self.bins = {}
+        self.missing = {}
+        self.names = {}
+        self.messages = {}
+        for name, rule in rules.items():
+            thresholds = [tuple(threshold) for threshold in rule['thresholds']]
+            categories = [tuple(category) for category in rule['categories']]
+            if len(categories) != len(thresholds) + 1:
+                raise ValueError(
+                    f"{name} needs one category more than thresholds")
+            if any(operator not in OPERATORS for _, operator in thresholds):
+                raise ValueError(
+                    f"{name} thresholds must use one of {OPERATORS}")
+            # A value above the threshold is at least the next float
+            edges = np.array([
+                value if operator == '>=' else np.nextafter(value, np.inf)
+                for value, operator in thresholds
+            ], dtype=float)
+            if np.any(np.diff(edges) <= 0):
+                raise ValueError(f"{name} thresholds must be ascending")
+            self.bins[name] = edges
+            self.names[name] = np.array(
+                [category for category, _ in categories], dtype=object)
+            self.messages[name] = np.array(
+                [message for _, message in categories], dtype=object)
+            try:
+                self.missing[name] = list(self.names[name]).index(
+                    rule['missing'])
+            except ValueError:
+                raise ValueError(
+                    f"{name} missing category {rule['missing']} is not "
+                    "one of its categories") from None
+
+    def classify(self, ratios):
+        """
+        Get the category codes of each ratio, with the shape of its
+        values. Takes {ratio: values}, as returned by compute_ratios, a
+        RatioSet or a RatioFrame.
+        """
+        codes = {}
+        for name, edges in self.bins.items():
+            values = ratio_values(ratios[name])
+            codes[name] = np.where(
+                np.isnan(values),
+                self.missing[name],
+                np.digitize(values, edges)
+            ).astype(np.int8)
+        return codes
+
+    def categories(self, codes):
+        """Get the category names of the codes of each ratio"""
+        return {name: self.names[name][codes[name]] for name in codes}
+
+    def comments(self, codes):
+        """Get the comments of the codes of each ratio"""
+        return {name: self.messages[name][codes[name]] for name in codes}
+
+    def negative(self, ratios):
+        """
+        Find the negative ratios, which indicate severe financial
+        distress. Returns {ratio: boolean mask}.
+        """
+        with np.errstate(invalid='ignore'):
+            return {
+                name: ratio_values(ratios[name]) < 0
+                for name in self.rules
+            }
+
+    def negative_labels(self, ratios):
+        """Labels of the negative ratios of a single company and period"""
+        return [
+            self.rules[name]['label']
+            for name, negative in self.negative(ratios).items() if negative
+        ]
+
+
+@functools.lru_cache(maxsize=None)
+def get_classifier(industry=INDUSTRY):
+    """Classifier with the rules of the industry, built once per industry"""
+    return CommentaryClassifier(industry_rules(industry))
@@ -0,0 +1,449 @@
+"""
+This module exports the statements, ratios, benchmark verdicts and trend
+changes of one or many entities and periods to CSV, Parquet or Arrow IPC
+files for other tools. Rows are written a row group at a time as the
+entities are analysed, so an export never holds all its rows in memory.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import numpy as np
+import run
+from batch import (
+    compute_statements, describe_position, read_records, validate_records
+)
+from commentary import get_classifier
+from ledger import FREQUENCIES, ingest
+from models import RatioFrame, RatioSet, StatementFrame, history_values
+from ratio_engine import LINE_ITEMS, RATIO_NAMES
+from storage import LINE_ITEM_CELLS
+from trends import TrendEngine
+
+# Parquet and Arrow output need pyarrow, which is optional
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Rows written at once, one row group of Parquet or batch of Arrow
+EXPORT_ROW_GROUP = 100_000
+
+# Input records analysed at once by the command line tool
+EXPORT_CHUNK = 10_000
+
+# Columns of each dataset. Statements and ratios have one row per entity
+# and period, benchmarks one per entity, period and ratio, and trends one
+# per entity, ratio and period.
+EXPORT_COLUMNS = {
+    'statements': ('entity', 'period') + LINE_ITEMS,
+    'ratios': ('entity', 'period') + RATIO_NAMES,
+    'benchmarks': (
+        'entity', 'period', 'ratio', 'value', 'benchmark', 'position',
+        'verdict', 'category'
+    ),
+    'trends': (
+        'entity', 'ratio', 'period', 'value', 'qoq', 'yoy', 'moving_average'
+    )
+}
+
+# Columns of text labels, given to the writers as (codes, labels) with
+# a code of -1 where the label is missing
+LABEL_COLUMNS = ('entity', 'period', 'ratio', 'verdict', 'category')
+
+# Write the files
+
+
+class CsvTableWriter:
+    """Write row groups to a CSV file, missing values left empty"""
+
+    def __init__(self, path, columns):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, group):
+        """Write a row group of {column: values or (codes, labels)}"""
+        columns = []
+        for values in group.values():
+            if isinstance(values, tuple):
+                codes, labels = values
+                column = np.array(list(labels) + [''], dtype=object)[codes]
+            else:
+                column = values.astype(object)
+                column[~np.isfinite(values)] = ''
+            columns.append(column.tolist())
+        self.writer.writerows(zip(*columns))
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowTableWriter:
+    """
+    Write row groups to an Arrow IPC file, non-finite values marked as
+    null. Contiguous number columns are handed to Arrow without copying.
+    """
+
+    # IPC files cannot change the labels of a dictionary between batches
+    dictionary_labels = False
+
+    def __init__(self, path, columns):
+        if pa is None:
+            raise ValueError(
+                "Parquet and Arrow export need pyarrow: pip install pyarrow")
+        label_type = (
+            pa.dictionary(pa.int32(), pa.string())
+            if self.dictionary_labels else pa.string()
+        )
+        self.schema = pa.schema([
+            (name, label_type if name in LABEL_COLUMNS else pa.float64())
+            for name in columns
+        ])
+        self.writer = self.open(path)
+
+    def open(self, path):
+        return pa.ipc.new_file(path, self.schema)
+
+    def array(self, values):
+        """Arrow array of a number column or of (codes, labels)"""
+        if not isinstance(values, tuple):
+            return pa.array(values, mask=~np.isfinite(values))
+        codes, labels = values
+        array = pa.DictionaryArray.from_arrays(
+            pa.array(codes, mask=codes < 0), pa.array(labels, pa.string()))
+        return array if self.dictionary_labels else array.dictionary_decode()
+
+    def write(self, group):
+        """Write a row group of {column: values or (codes, labels)}"""
+        self.writer.write_batch(pa.RecordBatch.from_arrays(
+            [self.array(values) for values in group.values()],
+            schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class ParquetTableWriter(ArrowTableWriter):
+    """Write row groups to a Parquet file, labels dictionary encoded"""
+
+    dictionary_labels = True
+
+    def open(self, path):
+        return pq.ParquetWriter(path, self.schema)
+
+
+TABLE_WRITERS = {
+    'csv': CsvTableWriter,
+    'parquet': ParquetTableWriter,
+    'arrow': ArrowTableWriter
+}
+
+# Build the rows of each dataset
+
+
+def label_codes(count, repeat=1, tile=1):
+    """Codes 0..count-1, each repeated `repeat` times, all `tile` times"""
+    return np.tile(np.repeat(np.arange(count, dtype=np.int32), repeat), tile)
+
+
+def labels(values):
+    """Entity or period labels as text"""
+    return [str(value) for value in values]
+
+
+class Exporter:
+    """
+    Write the datasets of an export, one file per dataset in a directory,
+    a row group at a time. Entities are added in batches of frames, and
+    each batch is written before the next one is analysed.
+    """
+
+    def __init__(self, directory, export_format='csv', datasets=None,
+                 benchmarks=None, row_group=EXPORT_ROW_GROUP):
+        if export_format not in TABLE_WRITERS:
+            raise ValueError(f"Unknown export format: {export_format}")
+        datasets = list(datasets or EXPORT_COLUMNS)
+        unknown = set(datasets) - set(EXPORT_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown datasets: {', '.join(unknown)}")
+        self.row_group = row_group
+        if 'benchmarks' in datasets:
+            self.benchmark_verdicts(
+                benchmarks if benchmarks is not None
+                else run.get_benchmarks())
+        os.makedirs(directory, exist_ok=True)
+        self.paths = {
+            dataset: os.path.join(directory, f"{dataset}.{export_format}")
+            for dataset in datasets
+        }
+        self.writers = {}
+        for dataset, path in self.paths.items():
+            self.writers[dataset] = TABLE_WRITERS[export_format](
+                path, EXPORT_COLUMNS[dataset])
+        self.rows = dict.fromkeys(datasets, 0)
+
+    def benchmark_verdicts(self, benchmarks):
+        """
+        Prepare the benchmark of each ratio, the codes of the verdict of
+        each ratio and position (-1, 0, 1) and the commentary categories
+        of all ratios in one list
+        """
+        self.benchmarks = np.array(
+            [benchmarks[name] for name in RATIO_NAMES], dtype=float)
+        verdicts = [
+            [describe_position(name, position) for position in (-1, 0, 1)]
+            for name in RATIO_NAMES
+        ]
+        self.verdicts = list(dict.fromkeys(
+            verdict for row in verdicts for verdict in row))
+        self.verdict_codes = np.array(
+            [[self.verdicts.index(verdict) for verdict in row]
+             for row in verdicts],
+            dtype=np.int32)
+        self.classifier = get_classifier()
+        names = [self.classifier.names[name] for name in RATIO_NAMES]
+        self.categories = [category for row in names for category in row]
+        self.category_offsets = np.cumsum(
+            [0] + [len(row) for row in names[:-1]]).astype(np.int32)
+
+    def add(self, ratios, statements=None):
+        """
+        Export a batch of entities: their RatioFrame and, when given, the
+        StatementFrame of the periods with statements
+        """
+        frames = [(ratios, ('ratios', 'benchmarks', 'trends'))]
+        if statements is not None:
+            frames.append((statements, ('statements',)))
+        for frame, datasets in frames:
+            datasets = [name for name in datasets if name in self.writers]
+            cells = max(len(frame.periods) * len(frame.fields), 1)
+            step = max(self.row_group // cells, 1)
+            for start in range(0, len(frame.entities), step):
+                selected = slice(start, start + step)
+                for dataset in datasets:
+                    group = getattr(self, f"{dataset}_rows")(frame, selected)
+                    self.writers[dataset].write(group)
+                    self.rows[dataset] += len(group['entity'][0])
+
+    def wide_rows(self, frame, selected):
+        """
+        One row per entity and period with a column per field. The frame
+        holds the fields of a row together, so the batch is copied once
+        into a contiguous array per field.
+        """
+        data = frame.data[selected]
+        entities, periods = data.shape[:2]
+        columns = np.moveaxis(data, -1, 0).reshape(len(frame.fields), -1)
+        return {
+            'entity': (label_codes(entities, periods),
+                       labels(frame.entities[selected])),
+            'period': (label_codes(periods, 1, entities),
+                       labels(frame.periods)),
+            **dict(zip(frame.fields, columns))
+        }
+
+    statements_rows = wide_rows
+    ratios_rows = wide_rows
+
+    def benchmarks_rows(self, frame, selected):
+        """One row per entity, period and ratio, in the order of the frame"""
+        data = frame.data[selected]
+        entities, periods = data.shape[:2]
+        count = entities * periods
+        values = data.reshape(-1)
+        benchmarks = np.tile(self.benchmarks, count)
+        position = np.sign(values - benchmarks)
+        ratio = label_codes(len(RATIO_NAMES), 1, count)
+        known = ~np.isnan(position)
+        verdict = np.where(
+            known,
+            self.verdict_codes[
+                ratio, np.where(known, position, 0).astype(int) + 1],
+            -1
+        )
+        codes = self.classifier.classify({
+            name: data[:, :, index] for index, name in enumerate(RATIO_NAMES)
+        })
+        category = (np.stack(
+            [codes[name] for name in RATIO_NAMES], axis=-1
+        ) + self.category_offsets).reshape(-1)
+        return {
+            'entity': (label_codes(entities, periods * len(RATIO_NAMES)),
+                       labels(frame.entities[selected])),
+            'period': (label_codes(periods, len(RATIO_NAMES), entities),
+                       labels(frame.periods)),
+            'ratio': (ratio, RATIO_NAMES),
+            'value': values,
+            'benchmark': benchmarks,
+            'position': position,
+            'verdict': (verdict, self.verdicts),
+            'category': (category, self.categories)
+        }
+
+    def trends_rows(self, frame, selected):
+        """
+        One row per entity, ratio and period. The ratios of every entity
+        go through one TrendEngine as rows of its history, so its arrays
+        are already in the order of the rows.
+        """
+        data = frame.data[selected]
+        entities, periods = data.shape[:2]
+        count = entities * len(RATIO_NAMES)
+        engine = TrendEngine(range(count), capacity=max(periods, 1))
+        engine.extend(
+            frame.periods, data.transpose(0, 2, 1).reshape(count, periods))
+        return {
+            'entity': (label_codes(entities, len(RATIO_NAMES) * periods),
+                       labels(frame.entities[selected])),
+            'ratio': (label_codes(len(RATIO_NAMES), periods, entities),
+                      RATIO_NAMES),
+            'period': (label_codes(periods, 1, count),
+                       labels(frame.periods)),
+            'value': engine.values.reshape(-1),
+            'qoq': engine.qoq.reshape(-1),
+            'yoy': engine.yoy.reshape(-1),
+            'moving_average': engine.moving_average.reshape(-1)
+        }
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Frames of the sources
+
+
+def record_frames(records, historical_data, first_id=1):
+    """
+    Analyse batch records into the StatementFrame of their current
+    period and the RatioFrame of the historical periods with the latest
+    one replaced by the ratios of each record, rounded to 2 decimals as
+    in batch mode. Invalid records are left out. Returns both frames and
+    the number of invalid records.
+    """
+    values, valid, _ = validate_records(records)
+    ids = [
+        record.get('id', first_id + index)
+        for index, record in enumerate(records) if valid[index]
+    ]
+    workbook, _ = compute_statements(values[valid])
+    names, periods, history = history_values(historical_data)
+    statements = StatementFrame.from_columns(
+        {
+            item: workbook[worksheet][cell][:, None]
+            for item, (worksheet, cell) in LINE_ITEM_CELLS.items()
+        },
+        ids, periods[-1:]
+    )
+    data = np.broadcast_to(
+        history[[names.index(name) for name in RATIO_NAMES]].T,
+        (len(ids), len(periods), len(RATIO_NAMES))).copy()
+    data[:, -1:] = np.round(RatioFrame.from_statements(statements).data, 2)
+    return (
+        statements, RatioFrame(ids, periods, data),
+        int(np.count_nonzero(~valid))
+    )
+
+
+def ledger_frames(path, mapping=None, frequency='quarter', entity=None):
+    """
+    StatementFrame and RatioFrame of every period of a general ledger,
+    with one entity named after the file by default
+    """
+    periods, workbook = ingest(path, mapping, frequency).statements()
+    statements = StatementFrame.from_columns(
+        {
+            item: workbook[worksheet][cell][None, :]
+            for item, (worksheet, cell) in LINE_ITEM_CELLS.items()
+        },
+        [entity or os.path.splitext(os.path.basename(path))[0]], periods
+    )
+    return statements, RatioFrame.from_statements(statements)
+
+
+def read_benchmarks(path):
+    """Benchmarks of the six ratios from a JSON object {ratio: value}"""
+    with open(path) as benchmarks_file:
+        benchmarks = json.load(benchmarks_file)
+    missing = [name for name in RATIO_NAMES if name not in benchmarks]
+    if missing:
+        raise ValueError(f"Benchmarks missing: {', '.join(missing)}")
+    return RatioSet(**{name: float(benchmarks[name]) for name in RATIO_NAMES})
+
+
+def main(argv=None):
+    """Export the analysis of batch records or of a ledger"""
+    parser = argparse.ArgumentParser(
+        description="Export the statements, ratios, benchmark verdicts "
+        "and trends of batch records or of a general ledger."
+    )
+    parser.add_argument(
+        'input', help="JSON or CSV file of account inputs, or a ledger")
+    parser.add_argument(
+        '-o', '--output', default='export',
+        help="directory of the exported files (default: export)")
+    parser.add_argument(
+        '--format', choices=TABLE_WRITERS, default='csv',
+        help="file format (default: csv)")
+    parser.add_argument(
+        '--datasets', nargs='+', choices=EXPORT_COLUMNS,
+        help="datasets to export (default: all, and without benchmarks "
+        "for a ledger unless --benchmarks is given)")
+    parser.add_argument(
+        '--benchmarks',
+        help="JSON file of the benchmark of each ratio, instead of the "
+        "industry_benchmarks tab")
+    parser.add_argument(
+        '--ledger', action='store_true',
+        help="read the input as a general ledger export")
+    parser.add_argument(
+        '--mapping', help="JSON file mapping ledger accounts to line items")
+    parser.add_argument(
+        '--frequency', choices=FREQUENCIES, default='quarter',
+        help="period the ledger lines are added up by (default: quarter)")
+    args = parser.parse_args(argv)
+
+    benchmarks = read_benchmarks(args.benchmarks) if args.benchmarks else None
+    datasets = args.datasets
+    if datasets is None and args.ledger and benchmarks is None:
+        # A ledger is exported without reading anything from the workbook
+        datasets = [name for name in EXPORT_COLUMNS if name != 'benchmarks']
+
+    invalid = 0
+    with Exporter(
+            args.output, args.format, datasets, benchmarks) as exporter:
+        if args.ledger:
+            mapping = None
+            if args.mapping:
+                with open(args.mapping) as mapping_file:
+                    mapping = json.load(mapping_file)
+            statements, ratios = ledger_frames(
+                args.input, mapping, args.frequency)
+            exporter.add(ratios, statements)
+        else:
+            records = read_records(args.input)
+            historical_data = run.get_historical_data()
+            for start in range(0, len(records), EXPORT_CHUNK):
+                statements, ratios, skipped = record_frames(
+                    records[start:start + EXPORT_CHUNK], historical_data,
+                    start + 1)
+                exporter.add(ratios, statements)
+                invalid += skipped
+
+    for dataset, path in exporter.paths.items():
+        print(f"{path}: {exporter.rows[dataset]:,} rows", file=sys.stderr)
+    if invalid:
+        print(f"{invalid} invalid records left out.", file=sys.stderr)
+    return 1 if invalid else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
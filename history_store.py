@@ -0,0 +1,329 @@
+"""
+This module keeps an append-only history of the calculated ratios in a
+local SQLite database. Every run adds its ratios keyed by entity, period
+and time of the run, so earlier results are never overwritten, and the
+latest values of any range of periods are read through an index.
+"""
+import argparse
+import functools
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+import numpy as np
+from models import RatioFrame
+from ratio_engine import RATIO_NAMES
+
+# Database file of the ratio history; the history is not kept when empty
+HISTORY_STORE_FILE = os.environ.get('FIN_HISTORY_STORE', '')
+
+# Entity the interactive tool records its ratios under
+HISTORY_ENTITY = os.environ.get('FIN_ENTITY', 'default')
+
+# Entities looked up in one query, within the SQLite variable limit
+QUERY_BATCH = 500
+
+
+def period_end(label):
+    """
+    Month in which a period ends, counted from January 1970, for labels
+    such as 'Q4 2023', '2023-12' or '2023'
+    """
+    label = str(label).strip()
+    match = re.fullmatch(r'Q([1-4]) (\d{4})', label)
+    if match:
+        return (int(match[2]) - 1970) * 12 + int(match[1]) * 3 - 1
+    match = re.fullmatch(r'(\d{4})(?:-(0[1-9]|1[0-2]))?', label)
+    if match:
+        month = int(match[2]) if match[2] else 12
+        return (int(match[1]) - 1970) * 12 + month - 1
+    raise ValueError(
+        f"Unknown period label: '{label}'. Label periods with their year, "
+        "like 'Q4 2023', '2023-12' or '2023'.")
+
+
+def ratio_columns(names):
+    """Check the ratio names before they are used as column names"""
+    unknown = set(names) - set(RATIO_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown ratios: {', '.join(unknown)}")
+    return ', '.join(names)
+
+
+def period_conditions(start=None, end=None, as_of=None):
+    """
+    Conditions and parameters of a query of the periods from `start` to
+    `end` as recorded at time `as_of`, each of them optional
+    """
+    conditions, parameters = [], []
+    if start is not None:
+        conditions.append("period_end >= ?")
+        parameters.append(period_end(start))
+    if end is not None:
+        conditions.append("period_end <= ?")
+        parameters.append(period_end(end))
+    if as_of is not None:
+        conditions.append("recorded_at <= ?")
+        parameters.append(as_of)
+    return conditions, parameters
+
+
+def latest_condition(as_of=None):
+    """
+    Condition and parameters selecting the record of each entity and
+    period with the latest time of recording, as known at time `as_of`,
+    the last one inserted among records of the same time
+    """
+    recorded = "" if as_of is None else "AND later.recorded_at <= ? "
+    return (
+        "ratio_history.rowid = (SELECT later.rowid FROM ratio_history "
+        "AS later WHERE later.entity = ratio_history.entity "
+        "AND later.period_end = ratio_history.period_end "
+        f"{recorded}ORDER BY later.recorded_at DESC, later.rowid DESC "
+        "LIMIT 1)",
+        [] if as_of is None else [as_of]
+    )
+
+
+class RatioHistoryStore:
+    """
+    Records of the ratios of each entity and period, one per run. The
+    latest record of a period is its current value; the earlier ones
+    stay until the store is compacted. Missing ratios are stored as NULL
+    and read back as NaN.
+    """
+
+    def __init__(self, path=':memory:'):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS ratio_history ("
+                "entity TEXT NOT NULL, period_end INTEGER NOT NULL, "
+                "period TEXT NOT NULL, recorded_at REAL NOT NULL, "
+                + ', '.join(f"{name} REAL" for name in RATIO_NAMES) + ")"
+            )
+            # The rowid is part of every index entry, so the latest record
+            # of each period is found by reading the index backwards
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS ratio_history_period "
+                "ON ratio_history (entity, period_end, recorded_at)"
+            )
+
+    def append(self, entity, period, ratios, recorded_at=None):
+        """Append the ratios of one entity and period, a RatioSet or dict"""
+        self.insert([
+            (str(entity), period_end(period), str(period),
+             *(ratios[name] for name in RATIO_NAMES))
+        ], recorded_at)
+
+    def append_frame(self, frame, recorded_at=None):
+        """Append the ratios of every entity and period of a RatioFrame"""
+        ends = [period_end(period) for period in frame.periods]
+        self.insert(
+            (
+                (str(entity), end, str(period), *values)
+                for entity, rows in zip(frame.entities, frame.data.tolist())
+                for end, period, values in zip(ends, frame.periods, rows)
+            ),
+            recorded_at
+        )
+
+    def append_history(self, entity, historical_data, recorded_at=None):
+        """
+        Append historical data in the format returned by
+        get_historical_data: {ratio: {period: value}}
+        """
+        self.append_frame(
+            RatioFrame.from_history(historical_data, entity), recorded_at)
+
+    def insert(self, rows, recorded_at=None):
+        """Insert (entity, period_end, period, *ratios) rows in one go"""
+        recorded_at = time.time() if recorded_at is None else recorded_at
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT INTO ratio_history (entity, period_end, period, "
+                f"recorded_at, {ratio_columns(RATIO_NAMES)}) VALUES ("
+                + ', '.join('?' * (len(RATIO_NAMES) + 4)) + ")",
+                (
+                    (entity, end, period, recorded_at, *ratios)
+                    for entity, end, period, *ratios in rows
+                )
+            )
+
+    def latest(self, entities, names, start=None, end=None, as_of=None):
+        """
+        Latest record of each entity and period, optionally from period
+        `start` to `end` and as known at time `as_of`. Returns rows of
+        (entity, period_end, period, *ratios) ordered by entity and period.
+        """
+        conditions, parameters = period_conditions(start, end, as_of)
+        latest, latest_parameters = latest_condition(as_of)
+        query = (
+            f"SELECT entity, period_end, period, {ratio_columns(names)} "
+            "FROM ratio_history WHERE entity IN ({}) "
+            + "".join(f"AND {condition} " for condition in conditions)
+            + f"AND {latest} ORDER BY entity, period_end"
+        )
+        entities = [str(entity) for entity in entities]
+        rows = []
+        with self.lock:
+            for first in range(0, len(entities), QUERY_BATCH):
+                batch = entities[first:first + QUERY_BATCH]
+                rows.extend(self.connection.execute(
+                    query.format(', '.join('?' * len(batch))),
+                    batch + parameters + latest_parameters))
+        return rows
+
+    def history(self, entity, names=RATIO_NAMES, start=None, end=None,
+                last=None, as_of=None):
+        """
+        Latest values of the ratios of one entity, optionally limited to
+        the `last` periods, in the format returned by get_historical_data:
+        {ratio: {period: value}}
+        """
+        conditions, parameters = period_conditions(start, end, as_of)
+        latest, latest_parameters = latest_condition(as_of)
+        # The index is read backwards from the last period, so only the
+        # `last` periods are visited; a LIMIT of -1 reads them all
+        query = (
+            f"SELECT entity, period_end, period, {ratio_columns(names)} "
+            "FROM ratio_history WHERE entity = ? "
+            + "".join(f"AND {condition} " for condition in conditions)
+            + f"AND {latest} ORDER BY period_end DESC LIMIT ?"
+        )
+        with self.lock:
+            rows = self.connection.execute(
+                query,
+                [str(entity)] + parameters + latest_parameters
+                + [-1 if last is None else last]
+            ).fetchall()
+        rows.reverse()
+        return {
+            name: {
+                row[2]: np.nan if row[3 + index] is None else row[3 + index]
+                for row in rows
+            }
+            for index, name in enumerate(names)
+        }
+
+    def frame(self, entities=None, start=None, end=None, as_of=None):
+        """
+        Latest ratios of many entities, all by default, as a RatioFrame
+        over every period any of them has, NaN where a period is missing
+        """
+        entities = [
+            str(entity) for entity in (
+                self.entities() if entities is None else entities)
+        ]
+        rows = self.latest(entities, RATIO_NAMES, start, end, as_of)
+        periods = dict(sorted({row[1]: row[2] for row in rows}.items()))
+        frame = RatioFrame(entities, periods.values())
+        if rows:
+            columns = list(zip(*rows))
+            frame.data[
+                [frame.entity_index[entity] for entity in columns[0]],
+                [frame.period_index[period] for period in columns[2]]
+            ] = np.array(columns[3:], dtype=float).T
+        return frame
+
+    def entities(self):
+        """Entities with a history, in sorted order"""
+        with self.lock:
+            return [
+                entity for entity, in self.connection.execute(
+                    "SELECT DISTINCT entity FROM ratio_history "
+                    "ORDER BY entity")
+            ]
+
+    def records(self):
+        """Number of records kept, including superseded ones"""
+        with self.lock:
+            return self.connection.execute(
+                "SELECT count(*) FROM ratio_history").fetchone()[0]
+
+    def compact(self, before=None):
+        """
+        Drop the records superseded by a later record of the same entity
+        and period, only those recorded before time `before` when given,
+        and reclaim the space. Returns the number of records dropped.
+        """
+        condition, parameters = "", ()
+        if before is not None:
+            condition, parameters = "recorded_at < ? AND ", (before,)
+        with self.lock:
+            with self.connection:
+                dropped = self.connection.execute(
+                    f"DELETE FROM ratio_history WHERE {condition}"
+                    f"NOT {latest_condition()[0]}",
+                    parameters
+                ).rowcount
+            self.connection.execute("VACUUM")
+        return dropped
+
+    def close(self):
+        self.connection.close()
+
+
+@functools.lru_cache(maxsize=None)
+def get_history_store(path=HISTORY_STORE_FILE):
+    """History store of the database file, opened once; None without it"""
+    if not path:
+        return None
+    return RatioHistoryStore(path)
+
+
+def main(argv=None):
+    """Query or compact the ratio history from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Query or compact the local ratio history.")
+    parser.add_argument(
+        '--store', default=HISTORY_STORE_FILE or 'ratio_history.db',
+        help="database file (default: $FIN_HISTORY_STORE or "
+        "ratio_history.db)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    query = commands.add_parser(
+        'query', help="print the latest ratios of an entity")
+    query.add_argument('entity', nargs='?', default=HISTORY_ENTITY)
+    query.add_argument(
+        '--ratios', nargs='+', choices=RATIO_NAMES, default=RATIO_NAMES)
+    query.add_argument('--last', type=int, help="number of latest periods")
+    query.add_argument('--start', help="first period, e.g. 'Q1 2020'")
+    query.add_argument('--end', help="last period, e.g. 'Q4 2023'")
+    query.add_argument(
+        '--as-of', help="as recorded at this ISO date and time")
+    compact = commands.add_parser(
+        'compact', help="drop superseded records")
+    compact.add_argument(
+        '--before', help="only records older than this ISO date and time")
+    args = parser.parse_args(argv)
+
+    store = RatioHistoryStore(args.store)
+    if args.command == 'compact':
+        dropped = store.compact(
+            datetime.fromisoformat(args.before).timestamp()
+            if args.before else None)
+        print(f"Dropped {dropped:,} superseded records, "
+              f"{store.records():,} kept.")
+        return 0
+
+    history = store.history(
+        args.entity, args.ratios, args.start, args.end, args.last,
+        datetime.fromisoformat(args.as_of).timestamp()
+        if args.as_of else None)
+    periods = list(history[args.ratios[0]])
+    if not periods:
+        print(f"No history for {args.entity}.", file=sys.stderr)
+        return 1
+    print('\t'.join(['period'] + list(args.ratios)))
+    for period in periods:
+        print('\t'.join([period] + [
+            f"{history[name][period]:.2f}" for name in args.ratios]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
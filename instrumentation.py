@@ -0,0 +1,374 @@
+"""
+This module records the latency, payload size, retries and quota usage
+of every storage API call, and named spans around the steps of a
+session, and exports them as a session summary, Prometheus counters or
+a Chrome trace
+"""
+import contextlib
+import json
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Sheets API quotas are counted in requests per minute, separately for
+# reads and writes; a batch request uses one unit whatever its size.
+# Revision checks use the Drive API quota. Backends that schedule their
+# requests report each request sent, which may serve several calls.
+QUOTA_BUCKETS = {
+    'read_range': 'read',
+    'read_ranges': 'read',
+    'write_cells': 'write',
+    'revision': 'drive'
+}
+QUOTA_WINDOW = 60
+
+
+class Instrumentation:
+    """
+    Collect API call and span events of a session. Events are kept as
+    dicts with the start time and duration in seconds from the start of
+    the session and the thread that recorded them.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.started_at = datetime.now()
+        self.calls = deque()
+        self.spans = deque()
+        self.requests = deque()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def clock(self):
+        """Seconds since the start of the session"""
+        return time.perf_counter() - self.started
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        """Record the time spent in the with block as a named span"""
+        start = self.clock()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.spans.append({
+                    'name': name,
+                    'start': start,
+                    'duration': self.clock() - start,
+                    'thread': threading.get_ident(),
+                    'args': args
+                })
+
+    @contextlib.contextmanager
+    def api_call(
+        self, operation, worksheet=None, cell_range=None, counted=True
+    ):
+        """
+        Record an API call made in the with block. The block sets the
+        payload size in bytes on the yielded dict; retries are counted
+        by note_retry while the call is in progress. A call that is not
+        counted uses only the quota units reported by note_request.
+        """
+        call = {
+            'operation': operation,
+            'worksheet': worksheet,
+            'range': cell_range,
+            'start': self.clock(),
+            'thread': threading.get_ident(),
+            'payload_bytes': 0,
+            'retries': 0,
+            'quota_units': 0,
+            'error': None
+        }
+        outer = getattr(self.local, 'call', None)
+        self.local.call = call
+        try:
+            yield call
+        except Exception as error:
+            call['error'] = type(error).__name__
+            raise
+        finally:
+            call['duration'] = self.clock() - call['start']
+            if counted:
+                # Every attempt counts against the quota
+                for _ in range(1 + call['retries']):
+                    self.note_request(
+                        QUOTA_BUCKETS[operation], call['start'])
+            self.local.call = outer
+            with self.lock:
+                self.calls.append(call)
+
+    def note_retry(self):
+        """Count a retry of the API call in progress on this thread"""
+        call = getattr(self.local, 'call', None)
+        if call is not None:
+            call['retries'] += 1
+
+    def note_request(self, bucket, start=None):
+        """
+        Count a request sent to the API against the quota bucket, and
+        against the API call in progress on this thread
+        """
+        call = getattr(self.local, 'call', None)
+        if call is not None:
+            call['quota_units'] += 1
+        with self.lock:
+            self.requests.append(
+                (self.clock() if start is None else start, bucket))
+
+    def keep_last(self, count):
+        """
+        Keep only the last count calls and spans, so that a long-running
+        process does not grow without bound
+        """
+        with self.lock:
+            self.calls = deque(self.calls, maxlen=count)
+            self.spans = deque(self.spans, maxlen=count)
+            self.requests = deque(self.requests, maxlen=count)
+
+    def reset(self):
+        """Drop all recorded events and restart the session clock"""
+        with self.lock:
+            self.calls.clear()
+            self.spans.clear()
+            self.requests.clear()
+        self.started = time.perf_counter()
+        self.started_at = datetime.now()
+
+    # Exports
+
+    def summary(self):
+        """Get the totals of the session per operation, quota and span"""
+        with self.lock:
+            calls = list(self.calls)
+            spans = list(self.spans)
+            requests = list(self.requests)
+        api = {}
+        for operation in dict.fromkeys(call['operation'] for call in calls):
+            selected = [
+                call for call in calls if call['operation'] == operation]
+            latencies = sorted(call['duration'] * 1000 for call in selected)
+            api[operation] = {
+                'calls': len(selected),
+                'errors': sum(call['error'] is not None for call in selected),
+                'retries': sum(call['retries'] for call in selected),
+                'payload_bytes': sum(
+                    call['payload_bytes'] for call in selected),
+                'latency_ms': {
+                    'total': round(sum(latencies), 3),
+                    'mean': round(statistics.mean(latencies), 3),
+                    'p50': round(statistics.median(latencies), 3),
+                    'p95': round(
+                        latencies[int(0.95 * (len(latencies) - 1))], 3),
+                    'max': round(latencies[-1], 3)
+                }
+            }
+        quota = {}
+        for bucket in dict.fromkeys(QUOTA_BUCKETS.values()):
+            selected = sorted(
+                (start, 1) for start, request_bucket in requests
+                if request_bucket == bucket
+            )
+            quota[bucket] = {
+                'units': sum(units for _, units in selected),
+                'peak_per_minute': peak_in_window(selected, QUOTA_WINDOW)
+            }
+        span_totals = {}
+        for span in spans:
+            totals = span_totals.setdefault(
+                span['name'], {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            totals['count'] += 1
+            totals['total_ms'] += span['duration'] * 1000
+            totals['max_ms'] = max(totals['max_ms'], span['duration'] * 1000)
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'session_seconds': round(self.clock(), 3),
+            'api': api,
+            'quota': quota,
+            'spans': {
+                name: {key: round(value, 3) for key, value in totals.items()}
+                for name, totals in span_totals.items()
+            }
+        }
+
+    def to_prometheus(self):
+        """Get the session totals in the Prometheus text format"""
+        summary = self.summary()
+        metrics = [
+            ('fin_api_calls_total', 'counter',
+             "Storage API calls by operation.",
+             'operation', summary['api'], lambda api: api['calls']),
+            ('fin_api_errors_total', 'counter',
+             "Storage API calls that failed.",
+             'operation', summary['api'], lambda api: api['errors']),
+            ('fin_api_retries_total', 'counter',
+             "Retries of storage API calls.",
+             'operation', summary['api'], lambda api: api['retries']),
+            ('fin_api_payload_bytes_total', 'counter',
+             "Bytes read or written by storage API calls.",
+             'operation', summary['api'], lambda api: api['payload_bytes']),
+            ('fin_api_latency_seconds_total', 'counter',
+             "Time spent in storage API calls.",
+             'operation', summary['api'],
+             lambda api: api['latency_ms']['total'] / 1000),
+            ('fin_quota_units_total', 'counter',
+             "API quota units used.",
+             'quota', summary['quota'], lambda quota: quota['units']),
+            ('fin_quota_peak_per_minute', 'gauge',
+             "Most quota units used within one minute.",
+             'quota', summary['quota'],
+             lambda quota: quota['peak_per_minute']),
+            ('fin_span_seconds_total', 'counter',
+             "Time spent in each step of the session.",
+             'span', summary['spans'], lambda span: span['total_ms'] / 1000),
+            ('fin_span_count_total', 'counter',
+             "Times each step of the session ran.",
+             'span', summary['spans'], lambda span: span['count'])
+        ]
+        lines = []
+        for name, kind, description, label, values, metric in metrics:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in values.items():
+                lines.append(f'{name}{{{label}="{key}"}} {metric(value):g}')
+        return '\n'.join(lines) + '\n'
+
+    def to_chrome_trace(self):
+        """
+        Get the spans and API calls as a Chrome trace, to be opened in
+        chrome://tracing or Perfetto
+        """
+        with self.lock:
+            calls = list(self.calls)
+            spans = list(self.spans)
+        pid = os.getpid()
+        threads = {
+            thread.ident: thread.name for thread in threading.enumerate()}
+        events = [
+            {
+                'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                'args': {'name': threads.get(tid, str(tid))}
+            }
+            for tid in dict.fromkeys(
+                event['thread'] for event in spans + calls)
+        ]
+        for span in spans:
+            events.append({
+                'name': span['name'], 'cat': 'step', 'ph': 'X',
+                'ts': span['start'] * 1e6, 'dur': span['duration'] * 1e6,
+                'pid': pid, 'tid': span['thread'], 'args': span['args']
+            })
+        for call in calls:
+            events.append({
+                'name': call['operation'], 'cat': 'api', 'ph': 'X',
+                'ts': call['start'] * 1e6, 'dur': call['duration'] * 1e6,
+                'pid': pid, 'tid': call['thread'],
+                'args': {
+                    key: call[key] for key in (
+                        'worksheet', 'range', 'payload_bytes', 'retries',
+                        'quota_units', 'error')
+                }
+            })
+        return json.dumps(
+            {'traceEvents': events, 'displayTimeUnit': 'ms'}, default=str)
+
+    def export(self, directory):
+        """
+        Write the session summary, Prometheus counters and Chrome trace
+        to the directory and return the paths of the files
+        """
+        os.makedirs(directory, exist_ok=True)
+        prefix = os.path.join(
+            directory,
+            f"session-{self.started_at:%Y%m%d-%H%M%S}-{os.getpid()}"
+        )
+        paths = []
+        for suffix, content in (
+            ('summary.json', json.dumps(self.summary(), indent=2) + '\n'),
+            ('prom', self.to_prometheus()),
+            ('trace.json', self.to_chrome_trace())
+        ):
+            path = f"{prefix}.{suffix}"
+            with open(path, 'w') as export_file:
+                export_file.write(content)
+            paths.append(path)
+        return paths
+
+
+def peak_in_window(events, window):
+    """
+    Get the most units used within any window of seconds, from
+    (start, units) pairs sorted by start
+    """
+    peak = used = first = 0
+    for start, units in events:
+        used += units
+        while events[first][0] <= start - window:
+            used -= events[first][1]
+            first += 1
+        peak = max(peak, used)
+    return peak
+
+
+class InstrumentedBackend:
+    """
+    Wrap a storage backend so that every read and write is recorded as
+    an API call of the session. The quota units of a backend that
+    schedules its requests are counted by its scheduler as each request
+    is sent, since one request may serve the calls of several threads.
+    """
+
+    def __init__(self, backend, instrumentation):
+        self.backend = backend
+        self.instrumentation = instrumentation
+        self.counted = not backend.schedules_requests
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def read_range(self, worksheet, cell_range):
+        with self.instrumentation.api_call(
+                'read_range', worksheet, cell_range, self.counted) as call:
+            values = self.backend.read_range(worksheet, cell_range)
+            call['payload_bytes'] = payload_size(values)
+        return values
+
+    def read_ranges(self, ranges):
+        with self.instrumentation.api_call(
+                'read_ranges',
+                ', '.join(dict.fromkeys(worksheet for worksheet, _ in ranges)),
+                ', '.join(cell_range for _, cell_range in ranges),
+                self.counted) as call:
+            values = self.backend.read_ranges(ranges)
+            call['payload_bytes'] = payload_size(values)
+        return values
+
+    def write_cells(self, updates):
+        with self.instrumentation.api_call(
+                'write_cells',
+                ', '.join(dict.fromkeys(worksheet for worksheet, _, _ in
+                                        updates)),
+                ', '.join(cell for _, cell, _ in updates),
+                self.counted) as call:
+            call['payload_bytes'] = payload_size(updates)
+            self.backend.write_cells(updates)
+
+    def revision(self):
+        with self.instrumentation.api_call(
+                'revision', counted=self.counted):
+            return self.backend.revision()
+
+
+def payload_size(values):
+    """Size in bytes of the values encoded as JSON, as sent by the API"""
+    return len(json.dumps(values, default=str).encode('utf-8'))
+
+
+# Instrumentation of the current process
+session = Instrumentation()
+span = session.span
+note_retry = session.note_retry
+note_request = session.note_request
@@ -0,0 +1,387 @@
+"""
+This module builds the statements from a general-ledger export. The
+journal lines of a CSV or JSON Lines file are read in chunks, so that
+memory does not grow with the size of the file, mapped from their
+account to a statement line item and added up per period. The
+statements of every period are then passed to the ratio engine.
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+import numpy as np
+from batch import write_results
+from models import RatioFrame
+from ratio_engine import RATIO_NAMES, compute_ratios
+from storage import (
+    PROFIT_AND_LOSS, BALANCE_SHEET, LINE_ITEM_CELLS, WORKBOOK_LAYOUT,
+    recalculate, to_number
+)
+
+# Journal lines read and aggregated at once
+LEDGER_CHUNK = 100_000
+
+# Columns of the ledger export; the amount is debit - credit when there
+# is no amount column
+LEDGER_COLUMNS = {
+    'date': 'date',
+    'account': 'account',
+    'amount': 'amount',
+    'debit': 'debit',
+    'credit': 'credit'
+}
+
+# Periods the lines can be added up by
+FREQUENCIES = ('month', 'quarter', 'year')
+
+# Statement line items of the workbook by label, with their input cell
+LEDGER_LINE_ITEMS = {
+    WORKBOOK_LAYOUT[worksheet][f"A{cell[1:]}"]: (worksheet, cell)
+    for worksheet in (PROFIT_AND_LOSS, BALANCE_SHEET)
+    for cell, value in WORKBOOK_LAYOUT[worksheet].items()
+    if cell.startswith('B') and isinstance(value, (int, float))
+}
+
+# Line items of the cost of goods sold taken from the inventory balance
+# at the start and end of the period instead of from an account
+INVENTORY_ITEMS = ('Beginning Inventory', 'Ending Inventory')
+
+# Line items with a credit balance, reported with the opposite sign
+CREDIT_ITEMS = (
+    'Sales Revenue', 'Long-term Debt', 'Accounts Payable',
+    'Short-term Loans', 'Common Stock', 'Retained Earnings'
+)
+
+# Ledger account names mapped to line items by default, compared in
+# lower case. A mapping file adds to them or replaces them.
+DEFAULT_ACCOUNT_MAPPING = {
+    'sales': 'Sales Revenue',
+    'sales revenue': 'Sales Revenue',
+    'revenue': 'Sales Revenue',
+    'purchases': 'Purchased Inventory',
+    'purchased inventory': 'Purchased Inventory',
+    'payroll': 'Payroll',
+    'wages': 'Payroll',
+    'salaries': 'Payroll',
+    'utilities': 'Utilities',
+    'rent': 'Rent',
+    'advertising': 'Advertising & Marketing Expenses',
+    'marketing': 'Advertising & Marketing Expenses',
+    'advertising & marketing expenses': 'Advertising & Marketing Expenses',
+    'depreciation': 'Depreciation Expense',
+    'depreciation expense': 'Depreciation Expense',
+    'interest': 'Interest Expense',
+    'interest expense': 'Interest Expense',
+    'property, plant & equipment': 'Property, Plant & Equipment',
+    'fixed assets': 'Property, Plant & Equipment',
+    'cash': 'Cash and Cash Equivalents',
+    'bank': 'Cash and Cash Equivalents',
+    'cash and cash equivalents': 'Cash and Cash Equivalents',
+    'accounts receivable': 'Accounts Receivable',
+    'receivables': 'Accounts Receivable',
+    'trade debtors': 'Accounts Receivable',
+    'inventory': 'Inventory',
+    'stock': 'Inventory',
+    'long-term debt': 'Long-term Debt',
+    'bank loan': 'Long-term Debt',
+    'accounts payable': 'Accounts Payable',
+    'payables': 'Accounts Payable',
+    'trade creditors': 'Accounts Payable',
+    'short-term loans': 'Short-term Loans',
+    'overdraft': 'Short-term Loans',
+    'common stock': 'Common Stock',
+    'share capital': 'Common Stock',
+    'retained earnings': 'Retained Earnings'
+}
+
+# Read the ledger
+
+
+def parse_amounts(values):
+    """
+    Parse the amounts of a chunk of lines as floats, empty values as
+    zero. Values with thousands separators are parsed one by one.
+    """
+    try:
+        return np.array(
+            [float(value) if value else 0.0 for value in values])
+    except ValueError:
+        return np.array([to_number(value) for value in values])
+
+
+def json_line(line, columns=LEDGER_COLUMNS):
+    """
+    Date, account and amount of a JSON Lines journal line. The amount is
+    debit - credit when the line has no amount.
+    """
+    if columns['amount'] in line:
+        amount = line[columns['amount']]
+    else:
+        debit, credit = parse_amounts(
+            [line.get(columns['debit']), line.get(columns['credit'])])
+        amount = debit - credit
+    return [line.get(columns['date']), line.get(columns['account']), amount]
+
+
+def read_ledger(path, columns=LEDGER_COLUMNS, chunk_size=LEDGER_CHUNK):
+    """
+    Read the journal lines of a CSV or JSON Lines file in chunks. Yields
+    the dates, accounts and amounts of each chunk. The amount of a line
+    is its debit - credit when it has no amount.
+    """
+    with open(path, newline='') as ledger_file:
+        if path.lower().endswith('.csv'):
+            reader = filter(None, csv.reader(ledger_file))
+            header = next(reader, [])
+            found = {
+                key: header.index(column)
+                for key, column in columns.items() if column in header
+            }
+            if 'amount' not in found and not (
+                    'debit' in found and 'credit' in found):
+                raise ValueError(
+                    f"{path} needs an amount column or debit and credit "
+                    "columns")
+            lines = reader
+        else:
+            found = {'date': 0, 'account': 1, 'amount': 2}
+            lines = (
+                json_line(json.loads(text), columns)
+                for text in ledger_file if text.strip()
+            )
+        while True:
+            chunk = list(itertools.islice(lines, chunk_size))
+            if not chunk:
+                return
+            values = {
+                key: [line[index] for line in chunk]
+                for key, index in found.items()
+                if key in ('date', 'account', 'amount') or
+                'amount' not in found
+            }
+            if 'amount' in values:
+                amounts = parse_amounts(values['amount'])
+            else:
+                amounts = (parse_amounts(values['debit']) -
+                           parse_amounts(values['credit']))
+            yield values['date'], values['account'], amounts
+
+
+def factorize(values):
+    """
+    Get the distinct values in order of appearance and the index of each
+    value among them
+    """
+    index = {}
+    codes = np.fromiter(
+        (index.setdefault(value, len(index)) for value in values),
+        dtype=np.intp, count=len(values))
+    return list(index), codes
+
+
+def period_keys(dates, frequency):
+    """
+    Number of each date's period counted from 1970, for ISO dates
+    given as 'YYYY-MM-DD'
+    """
+    months = np.array(dates, dtype='datetime64[M]').astype(np.int64)
+    return months // {'month': 1, 'quarter': 3, 'year': 12}[frequency]
+
+
+def period_label(key, frequency):
+    """Label of a period, in the format of the ratio history tab"""
+    if frequency == 'year':
+        return str(1970 + key)
+    if frequency == 'quarter':
+        return f"Q{key % 4 + 1} {1970 + key // 4}"
+    return f"{1970 + key // 12}-{key % 12 + 1:02d}"
+
+# Aggregate the ledger
+
+
+class LedgerAggregator:
+    """
+    Add up journal lines per period and line item. Only the totals are
+    kept: one row of line items per period and the total of each
+    unmapped account.
+    """
+
+    def __init__(self, mapping=None, frequency='quarter'):
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Frequency must be one of {FREQUENCIES}")
+        self.frequency = frequency
+        self.items = [
+            label for label in LEDGER_LINE_ITEMS
+            if label not in INVENTORY_ITEMS
+        ]
+        self.mapping = {
+            account.lower(): label
+            for account, label in {
+                **DEFAULT_ACCOUNT_MAPPING, **(mapping or {})}.items()
+        }
+        unknown = set(self.mapping.values()) - set(self.items)
+        if unknown:
+            raise ValueError(
+                f"Unknown line items in the mapping: {', '.join(unknown)}")
+        self.accounts = {}
+        self.periods = {}
+        self.totals = np.zeros((0, len(self.items)))
+        self.unmapped = {}
+        self.lines = 0
+
+    def item_index(self, account):
+        """Index of the line item of an account, -1 when not mapped"""
+        index = self.accounts.get(account)
+        if index is None:
+            label = self.mapping.get(account.strip().lower())
+            index = self.accounts[account] = (
+                self.items.index(label) if label is not None else -1)
+        return index
+
+    def add(self, dates, accounts, amounts):
+        """Add a chunk of journal lines to the totals"""
+        names, accounts = factorize(accounts)
+        account_items = np.array(
+            [self.item_index(str(name)) for name in names], dtype=int)
+        items = account_items[accounts]
+        amounts = np.asarray(amounts, dtype=float)
+        # Ledgers have few distinct dates, each parsed once
+        dates, periods = factorize(dates)
+        keys, inverse = np.unique(
+            period_keys([str(date)[:10] for date in dates], self.frequency),
+            return_inverse=True)
+        periods = inverse[periods]
+        for key in keys.tolist():
+            self.periods.setdefault(key, len(self.periods))
+        if len(self.periods) > len(self.totals):
+            self.totals = np.vstack([
+                self.totals,
+                np.zeros((len(self.periods) - len(self.totals),
+                          len(self.items)))
+            ])
+        rows = np.array([self.periods[key] for key in keys.tolist()])[periods]
+
+        mapped = items >= 0
+        self.totals += np.bincount(
+            rows[mapped] * len(self.items) + items[mapped],
+            weights=amounts[mapped],
+            minlength=self.totals.size
+        ).reshape(self.totals.shape)
+        unmapped = account_items < 0
+        for name, total in zip(
+                np.array(names, dtype=object)[unmapped],
+                np.bincount(accounts, amounts, len(names))[unmapped]):
+            name = str(name)
+            self.unmapped[name] = self.unmapped.get(name, 0.0) + total
+        self.lines += len(amounts)
+
+    def statements(self):
+        """
+        Get the period labels in order and the input cells of both
+        statements as arrays over the periods, with the totals
+        recalculated. Profit and loss items are the activity of each
+        period; balance sheet items are balances at the end of it.
+        """
+        order = sorted(self.periods)
+        activity = self.totals[[self.periods[key] for key in order]]
+        activity = activity * np.array([
+            -1 if label in CREDIT_ITEMS else 1 for label in self.items])
+        balances = np.cumsum(activity, axis=0)
+        workbook = {PROFIT_AND_LOSS: {}, BALANCE_SHEET: {}}
+        for column, label in enumerate(self.items):
+            worksheet, cell = LEDGER_LINE_ITEMS[label]
+            workbook[worksheet][cell] = (
+                activity if worksheet == PROFIT_AND_LOSS else balances
+            )[:, column]
+        inventory = balances[:, self.items.index('Inventory')]
+        opening = np.concatenate([[0.0], inventory])[:-1]
+        for label, values in (('Beginning Inventory', opening),
+                              ('Ending Inventory', inventory)):
+            worksheet, cell = LEDGER_LINE_ITEMS[label]
+            workbook[worksheet][cell] = values
+        for worksheet, cells in workbook.items():
+            recalculate(worksheet, cells)
+        labels = [period_label(key, self.frequency) for key in order]
+        return labels, workbook
+
+    def ratios(self, entity=None):
+        """Calculate the ratios of every period as a one-entity RatioFrame"""
+        periods, workbook = self.statements()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = compute_ratios({
+                item: workbook[worksheet][cell][None, :]
+                for item, (worksheet, cell) in LINE_ITEM_CELLS.items()
+            })
+        return RatioFrame.from_columns(ratios, [entity], periods)
+
+
+def ingest(path, mapping=None, frequency='quarter',
+           columns=LEDGER_COLUMNS, chunk_size=LEDGER_CHUNK):
+    """Read the whole ledger file chunk by chunk into an aggregator"""
+    aggregator = LedgerAggregator(mapping, frequency)
+    for dates, accounts, amounts in read_ledger(path, columns, chunk_size):
+        aggregator.add(dates, accounts, amounts)
+    return aggregator
+
+
+def ledger_results(aggregator):
+    """Results of every period: statements by label and ratios"""
+    periods, workbook = aggregator.statements()
+    ratios = aggregator.ratios()
+    results = []
+    for index, period in enumerate(periods):
+        results.append({
+            'period': period,
+            'statements': {
+                worksheet: {
+                    label: float(workbook[sheet][cell][index])
+                    for label, (sheet, cell) in LEDGER_LINE_ITEMS.items()
+                    if sheet == worksheet
+                }
+                for worksheet in (PROFIT_AND_LOSS, BALANCE_SHEET)
+            },
+            'ratios': {
+                name: value if np.isfinite(value) else None
+                for name, value in zip(
+                    RATIO_NAMES, ratios.data[0, index].tolist())
+            }
+        })
+    return results
+
+
+def main(argv=None):
+    """Build the statements and ratios of a ledger from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Build the statements and ratios of every period from "
+        "a general-ledger export (CSV or JSON Lines)."
+    )
+    parser.add_argument('ledger', help="CSV or JSON Lines ledger file")
+    parser.add_argument(
+        '--mapping', help="JSON file mapping ledger accounts to line items")
+    parser.add_argument(
+        '--frequency', choices=FREQUENCIES, default='quarter',
+        help="period the lines are added up by (default: quarter)")
+    parser.add_argument(
+        '-o', '--output', default='-',
+        help="JSON or CSV file for the results (default: standard output)"
+    )
+    args = parser.parse_args(argv)
+
+    mapping = None
+    if args.mapping:
+        with open(args.mapping) as mapping_file:
+            mapping = json.load(mapping_file)
+    aggregator = ingest(args.ledger, mapping, args.frequency)
+    write_results(ledger_results(aggregator), args.output)
+    print(
+        f"Read {aggregator.lines:,} journal lines into "
+        f"{len(aggregator.periods)} periods.", file=sys.stderr
+    )
+    for account, total in sorted(aggregator.unmapped.items()):
+        print(f"Unmapped account {account}: {total:,.2f}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
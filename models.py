@@ -0,0 +1,255 @@
+"""
+This module provides compact record types for the line items of one
+statement and one set of ratios, and a columnar frame holding the ratios
+or line items of many companies and periods in a single array
+"""
+import functools
+import numpy as np
+from ratio_engine import LINE_ITEMS, RATIO_NAMES, compute_ratios
+
+
+class Record:
+    """
+    Fixed set of named float fields stored in slots instead of a dict.
+    Fields can be read by attribute or by name, and iterate in order.
+    """
+
+    __slots__ = ()
+    fields = ()
+
+    def __init__(self, *values, **named):
+        if len(values) > len(self.fields):
+            raise TypeError(
+                f"{type(self).__name__} takes {len(self.fields)} values")
+        for field, value in zip(self.fields, values):
+            setattr(self, field, float(value))
+        for field in self.fields[len(values):]:
+            setattr(self, field, float(named.pop(field, 'nan')))
+        if named:
+            raise TypeError(f"Unknown fields: {', '.join(named)}")
+
+    @classmethod
+    def from_dict(cls, values):
+        """Create the record from a dict, ignoring other keys"""
+        return cls(**{field: values[field] for field in cls.fields})
+
+    def __getitem__(self, field):
+        if field not in self.fields:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __contains__(self, field):
+        return field in self.fields
+
+    def __iter__(self):
+        return (getattr(self, field) for field in self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and list(self) == list(other)
+
+    def keys(self):
+        return self.fields
+
+    def values(self):
+        return list(self)
+
+    def items(self):
+        return zip(self.fields, self)
+
+    def to_dict(self):
+        """Get the fields as a dict"""
+        return dict(self.items())
+
+    def __repr__(self):
+        fields = ', '.join(
+            f"{field}={value:.2f}" for field, value in self.items())
+        return f"{type(self).__name__}({fields})"
+
+
+class RatioSet(Record):
+    """The six ratios of one company and period"""
+
+    __slots__ = RATIO_NAMES
+    fields = RATIO_NAMES
+
+
+class Statement(Record):
+    """The line items of one company and period that the ratios use"""
+
+    __slots__ = LINE_ITEMS
+    fields = LINE_ITEMS
+
+    @classmethod
+    def from_graph(cls, calculation):
+        """Get the line items from a calculation graph"""
+        return cls(*(calculation.line_item(item) for item in LINE_ITEMS))
+
+    def ratios(self):
+        """Calculate the ratios, NaN where the denominator is zero"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return RatioSet(**{
+                name: float(np.ma.filled(value, np.nan))
+                for name, value in compute_ratios(self).items()
+            })
+
+
+def accepts_ratio_set(position=0):
+    """
+    Let a function taking the six ratios as positional arguments from
+    `position` on also take a single RatioSet there
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if len(args) > position and isinstance(args[position], RatioSet):
+                args = args[:position] + tuple(args[position]) + (
+                    args[position + 1:])
+            return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Frame:
+    """
+    Values of a fixed set of fields for many entities and periods, held
+    in one float array of shape entities x periods x fields. frame[field]
+    gives the entities x periods array of a field, as compute_ratios and
+    the batch functions expect.
+    """
+
+    __slots__ = ('entities', 'periods', 'data', 'entity_index',
+                 'period_index')
+    fields = ()
+    record = None
+
+    def __init__(self, entities, periods, data=None):
+        self.entities = list(entities)
+        self.periods = list(periods)
+        shape = (len(self.entities), len(self.periods), len(self.fields))
+        self.data = np.full(shape, np.nan) if data is None else (
+            np.asarray(data, dtype=float).reshape(shape))
+        self.entity_index = {
+            entity: index for index, entity in enumerate(self.entities)}
+        self.period_index = {
+            period: index for index, period in enumerate(self.periods)}
+
+    @classmethod
+    def from_columns(cls, columns, entities, periods):
+        """Create the frame from a dict of entities x periods arrays"""
+        return cls(entities, periods, np.stack(
+            [
+                np.ma.filled(
+                    np.ma.asarray(columns[field], dtype=float), np.nan)
+                for field in cls.fields
+            ],
+            axis=-1
+        ))
+
+    @classmethod
+    def from_records(cls, records):
+        """Create the frame from {(entity, period): record} pairs"""
+        entities = list(dict.fromkeys(entity for entity, _ in records))
+        periods = list(dict.fromkeys(period for _, period in records))
+        frame = cls(entities, periods)
+        for (entity, period), record in records.items():
+            frame.set(entity, period, record)
+        return frame
+
+    def __getitem__(self, field):
+        return self.data[:, :, self.fields.index(field)]
+
+    def __contains__(self, field):
+        return field in self.fields
+
+    def keys(self):
+        return self.fields
+
+    @property
+    def shape(self):
+        return self.data.shape[:2]
+
+    @property
+    def nbytes(self):
+        """Memory held by the values, in bytes"""
+        return self.data.nbytes
+
+    def get(self, entity, period):
+        """Get the record of one entity and period"""
+        return self.record(*self.data[
+            self.entity_index[entity], self.period_index[period]].tolist())
+
+    def set(self, entity, period, record):
+        """Set the values of one entity and period from a record or dict"""
+        self.data[self.entity_index[entity], self.period_index[period]] = [
+            record[field] for field in self.fields]
+
+
+class RatioFrame(Frame):
+    """Ratios of many entities and periods"""
+
+    __slots__ = ()
+    fields = RATIO_NAMES
+    record = RatioSet
+
+    @classmethod
+    def from_history(cls, historical_data, entity=None):
+        """
+        Create a one-entity frame from historical data in the format
+        returned by get_historical_data: {ratio: {period: value}}
+        """
+        periods = list(historical_data[RATIO_NAMES[0]])
+        return cls([entity], periods, np.array([
+            [historical_data[name][period] for name in RATIO_NAMES]
+            for period in periods
+        ]))
+
+    @classmethod
+    def from_statements(cls, statements):
+        """Calculate the ratios of every entity and period of a frame"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return cls.from_columns(
+                compute_ratios(statements),
+                statements.entities, statements.periods)
+
+    def history(self, entity=None):
+        """
+        Get the period labels and the ratios x periods array of one
+        entity, the first one by default
+        """
+        index = self.entity_index[entity] if entity is not None else 0
+        return self.periods, self.data[index].T
+
+    def to_history(self, entity=None):
+        """Get one entity in the format returned by get_historical_data"""
+        periods, values = self.history(entity)
+        return {
+            name: dict(zip(periods, row))
+            for name, row in zip(RATIO_NAMES, values.tolist())
+        }
+
+
+class StatementFrame(Frame):
+    """Line items of many entities and periods"""
+
+    __slots__ = ()
+    fields = LINE_ITEMS
+    record = Statement
+
+
+def history_values(historical_data):
+    """
+    Get the ratio names, period labels and ratios x periods array of
+    historical data given as a RatioFrame or as {ratio: {period: value}}
+    """
+    if isinstance(historical_data, RatioFrame):
+        return (list(RATIO_NAMES),) + historical_data.history()
+    names = list(historical_data)
+    periods = list(historical_data[names[0]]) if names else []
+    return names, periods, np.array(
+        [[historical_data[name][period] for period in periods]
+         for name in names],
+        dtype=float
+    ).reshape(len(names), len(periods))
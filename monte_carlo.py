@@ -0,0 +1,331 @@
+"""
+This module simulates the distribution of the six ratios when the
+statement line items are uncertain. Each input line item is drawn from
+its own distribution, optionally correlated with the others, and the
+draws are calculated in chunks on a process pool. Each chunk is reduced
+to a histogram of every ratio, so the memory and the data sent back by
+the workers do not grow with the number of draws. The results give the
+percentiles of each ratio and the probability of each category of the
+ratio analysis.
+"""
+import argparse
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from batch import INPUT_ACCOUNTS, base_cells, recalculate_ratios
+from commentary import get_classifier
+from ratio_engine import RATIO_NAMES
+from storage import PROFIT_AND_LOSS, BALANCE_SHEET, WORKBOOK_FORMULAS
+
+# Draws calculated at once by a worker
+CHUNK_SIZE = 250_000
+
+# Standard deviation of the line items without their own distribution,
+# relative to their value in the workbook
+DEFAULT_VOLATILITY = 0.1
+
+# Distributions a line item can be drawn from: normal with a mean and
+# standard deviation, lognormal with a mean and the standard deviation
+# of its logarithm
+DISTRIBUTIONS = ('normal', 'lognormal')
+
+# Percentiles reported for each ratio
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+# Bins of the histogram of each ratio, spread over the range of a pilot
+# sample; values outside it are counted in one bin below and one above
+HISTOGRAM_BINS = 4096
+PILOT_DRAWS = 10_000
+
+# Describe the simulation
+
+
+def item_cell(key):
+    """
+    Get the (worksheet, cell) of a line item, given as the name of an
+    input account or as 'worksheet!cell'
+    """
+    if key in INPUT_ACCOUNTS:
+        return INPUT_ACCOUNTS[key][:2]
+    worksheet, _, cell = key.partition('!')
+    if worksheet not in (PROFIT_AND_LOSS, BALANCE_SHEET) or not cell:
+        raise ValueError(
+            f"Unknown line item {key}: use an input account name or "
+            "'worksheet!cell'")
+    if cell in WORKBOOK_FORMULAS[worksheet]:
+        raise ValueError(f"{key} is a calculated total")
+    return worksheet, cell
+
+
+class SimulationModel:
+    """
+    Distributions of the uncertain line items on top of the workbook.
+    `items` maps a line item to {'distribution', 'mean', 'sd'}; the mean
+    defaults to the value in the workbook and the sd to
+    DEFAULT_VOLATILITY of it (of the logarithm for lognormal). The input
+    accounts are uncertain by default. `correlations` lists
+    (item, item, coefficient) between the normal draws of the items.
+    """
+
+    def __init__(self, base=None, items=None, correlations=()):
+        self.base = base if base is not None else {
+            worksheet: base_cells(worksheet)
+            for worksheet in (PROFIT_AND_LOSS, BALANCE_SHEET)
+        }
+        specs = {name: {} for name in INPUT_ACCOUNTS}
+        specs.update(items or {})
+        self.cells = [item_cell(key) for key in specs]
+        if len(set(self.cells)) != len(self.cells):
+            raise ValueError("A line item is given more than once")
+        self.lognormal = np.zeros(len(specs), dtype=bool)
+        self.location = np.zeros(len(specs))
+        self.scale = np.zeros(len(specs))
+        for index, (key, spec) in enumerate(specs.items()):
+            worksheet, cell = self.cells[index]
+            distribution = spec.get('distribution', 'normal')
+            if distribution not in DISTRIBUTIONS:
+                raise ValueError(
+                    f"{key}: distribution must be one of {DISTRIBUTIONS}")
+            mean = float(spec.get('mean', self.base[worksheet].get(cell, 0)))
+            if distribution == 'lognormal':
+                if mean <= 0:
+                    raise ValueError(f"{key}: a lognormal mean must be > 0")
+                sigma = float(spec.get('sd', DEFAULT_VOLATILITY))
+                # Location of the logarithm keeping the mean of the item
+                self.lognormal[index] = True
+                self.location[index] = np.log(mean) - sigma ** 2 / 2
+                self.scale[index] = sigma
+            else:
+                self.location[index] = mean
+                self.scale[index] = float(
+                    spec.get('sd', DEFAULT_VOLATILITY * abs(mean)))
+
+        keys = list(specs)
+        correlation = np.eye(len(keys))
+        for first, second, coefficient in correlations:
+            i, j = keys.index(first), keys.index(second)
+            correlation[i, j] = correlation[j, i] = float(coefficient)
+        self.correlated = bool(correlations)
+        try:
+            self.cholesky = np.linalg.cholesky(correlation)
+        except np.linalg.LinAlgError:
+            raise ValueError(
+                "The correlations are not a valid correlation matrix"
+            ) from None
+        self.classifier = get_classifier()
+
+    @classmethod
+    def from_config(cls, config, base=None):
+        """Create the model from a dict with 'items' and 'correlations'"""
+        return cls(
+            base, config.get('items'), config.get('correlations', ()))
+
+    def draw(self, rng, size):
+        """Draw size values of every uncertain line item, items x size"""
+        normal = rng.standard_normal((len(self.cells), size))
+        if self.correlated:
+            normal = self.cholesky @ normal
+        values = self.location[:, None] + self.scale[:, None] * normal
+        values[self.lognormal] = np.exp(values[self.lognormal])
+        return values
+
+    def ratios(self, values):
+        """Calculate the ratios of drawn line items, NaN when undefined"""
+        _, ratios = recalculate_ratios(
+            self.base, dict(zip(self.cells, values)))
+        size = values.shape[1]
+        return {
+            name: np.broadcast_to(ratio, size)
+            for name, ratio in ratios.items()
+        }
+
+# Run the simulation
+
+
+def histogram_edges(model, seed):
+    """
+    Bin edges of the histogram of each ratio, evenly spaced over the
+    range of the finite values of a pilot sample
+    """
+    ratios = model.ratios(model.draw(np.random.default_rng(seed),
+                                     PILOT_DRAWS))
+    edges = {}
+    for name in RATIO_NAMES:
+        finite = ratios[name][np.isfinite(ratios[name])]
+        low, high = (finite.min(), finite.max()) if finite.size else (0, 1)
+        if high <= low:
+            high = low + max(abs(low), 1)
+        edges[name] = np.linspace(low, high, HISTOGRAM_BINS + 1)
+    return edges
+
+
+def simulate_chunk(model, seed, size, edges):
+    """
+    Simulate one chunk of draws. Returns, per ratio, the histogram of
+    its finite values over the edges, with one bin below and one above
+    them, their sum, minimum and maximum, and the number of draws in
+    each category, below zero and undefined. Runs in a worker process.
+    """
+    ratios = model.ratios(model.draw(np.random.default_rng(seed), size))
+    codes = model.classifier.classify(ratios)
+    negative = model.classifier.negative(ratios)
+    chunk = {}
+    for name in RATIO_NAMES:
+        values = ratios[name]
+        finite = values[np.isfinite(values)]
+        # The edges are evenly spaced, so the bin is found arithmetically
+        low, high = edges[name][0], edges[name][-1]
+        bins = np.clip(
+            np.floor((finite - low) * (HISTOGRAM_BINS / (high - low))) + 1,
+            0, HISTOGRAM_BINS + 1).astype(np.intp)
+        chunk[name] = {
+            'histogram': np.bincount(bins, minlength=HISTOGRAM_BINS + 2),
+            'sum': float(finite.sum()),
+            'minimum': float(finite.min()) if finite.size else np.inf,
+            'maximum': float(finite.max()) if finite.size else -np.inf,
+            'categories': np.bincount(
+                codes[name], minlength=len(model.classifier.names[name])),
+            'negative': int(np.count_nonzero(negative[name])),
+            'undefined': int(np.count_nonzero(np.isnan(values)))
+        }
+    return chunk
+
+
+def run_simulation(model, draws, seed=None, workers=None,
+                   chunk_size=CHUNK_SIZE):
+    """
+    Run the draws in chunks on a process pool and summarise them. The
+    pilot sample and every chunk have their own seed spawned from
+    `seed`, so the results are the same for any number of workers. One
+    worker runs in this process.
+    """
+    if draws <= 0:
+        raise ValueError("The number of draws must be positive")
+    sizes = [chunk_size] * (draws // chunk_size)
+    if draws % chunk_size:
+        sizes.append(draws % chunk_size)
+    pilot_seed, *seeds = np.random.SeedSequence(seed).spawn(len(sizes) + 1)
+    edges = histogram_edges(model, pilot_seed)
+    if workers == 1:
+        chunks = [
+            simulate_chunk(model, chunk_seed, size, edges)
+            for chunk_seed, size in zip(seeds, sizes)
+        ]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            chunks = list(pool.map(
+                simulate_chunk, [model] * len(sizes), seeds, sizes,
+                [edges] * len(sizes)))
+    return summarise(model, chunks, draws, edges)
+
+
+def histogram_percentiles(counts, edges, minimum, maximum, percentiles):
+    """
+    Percentiles of the values counted in a histogram with one bin below
+    and one above the edges, interpolated linearly as np.percentile does
+    and assuming the values of a bin are spread evenly over it. Exact to
+    within the width of a bin, and exact at the smallest and largest
+    value.
+    """
+    bounds = np.concatenate((
+        [min(minimum, edges[0])], edges, [max(maximum, edges[-1])]))
+    cumulative = np.cumsum(counts)
+    position = np.asarray(percentiles) / 100 * (cumulative[-1] - 1)
+    index = np.searchsorted(cumulative, position, side='right')
+    before = cumulative[index] - counts[index]
+    fraction = (position - before + 0.5) / counts[index]
+    values = bounds[index] + fraction * (bounds[index + 1] - bounds[index])
+    # The smallest and largest values are known exactly
+    values = np.where(position <= 0, minimum, values)
+    values = np.where(position >= cumulative[-1] - 1, maximum, values)
+    return np.clip(values, minimum, maximum).tolist()
+
+
+def summarise(model, chunks, draws, edges):
+    """
+    Merge the histograms and counts of the chunks into the percentiles
+    and mean of each ratio and the probability of each category, of a
+    negative and of an undefined ratio
+    """
+    summary = {
+        'draws': draws, 'percentiles': {}, 'mean': {}, 'categories': {},
+        'negative': {}, 'undefined': {}
+    }
+    for name in RATIO_NAMES:
+        parts = [chunk[name] for chunk in chunks]
+        counts = sum(part['histogram'] for part in parts)
+        finite = int(counts.sum())
+        summary['percentiles'][name] = dict(zip(
+            (f"p{percentile}" for percentile in PERCENTILES),
+            histogram_percentiles(
+                counts, edges[name],
+                min(part['minimum'] for part in parts),
+                max(part['maximum'] for part in parts), PERCENTILES)
+            if finite else [None] * len(PERCENTILES)
+        ))
+        summary['mean'][name] = (
+            sum(part['sum'] for part in parts) / finite if finite else None)
+        categories = sum(part['categories'] for part in parts)
+        summary['categories'][name] = dict(zip(
+            model.classifier.names[name], (categories / draws).tolist()))
+        summary['negative'][name] = sum(
+            part['negative'] for part in parts) / draws
+        summary['undefined'][name] = sum(
+            part['undefined'] for part in parts) / draws
+    return summary
+
+
+def positive_int(value):
+    """Parse a command line number that must be at least 1"""
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be positive, got {value}")
+    return number
+
+
+def main(argv=None):
+    """Run the Monte Carlo simulation from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Simulate the distribution of the ratios from "
+        "uncertain line items."
+    )
+    parser.add_argument(
+        '--draws', type=positive_int, default=1_000_000,
+        help="number of draws (default: 1,000,000)")
+    parser.add_argument('--seed', type=int, help="seed of the draws")
+    parser.add_argument(
+        '--config',
+        help="JSON file of the line item distributions and correlations")
+    parser.add_argument(
+        '--workers', type=positive_int,
+        help="worker processes (default: one per CPU)")
+    parser.add_argument('-o', '--output', help="JSON file for the summary")
+    args = parser.parse_args(argv)
+
+    config = {}
+    if args.config:
+        with open(args.config) as config_file:
+            config = json.load(config_file)
+    model = SimulationModel.from_config(config)
+    summary = run_simulation(model, args.draws, args.seed, args.workers)
+
+    print(f"Simulated {args.draws:,} draws.")
+    for name in RATIO_NAMES:
+        percentiles = summary['percentiles'][name]
+        print(f"\n{name}: " + ', '.join(
+            f"{key} {value:.2f}" for key, value in percentiles.items()
+            if value is not None))
+        print("\t" + ', '.join(
+            f"P({category}) {probability:.1%}"
+            for category, probability in summary['categories'][name].items()
+        ) + f", P(negative) {summary['negative'][name]:.1%}")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(summary, output, indent=2)
+            output.write('\n')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+This module benchmarks ratios against the distribution of the ratios of
+peer companies in the same industry and size band. The peer ratios are
+sorted once into an index, so that the percentile rank of any number of
+companies is found by binary search.
+"""
+import functools
+import os
+import numpy as np
+from ratio_engine import RATIO_NAMES
+from storage import read_records
+
+# File of the peer ratios, CSV or a JSON list of objects, with the
+# industry, the size band or sales revenue and the six ratios of each peer
+PEERS_FILE = os.environ.get(
+    'FIN_PEERS_FILE',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'peers.csv')
+)
+
+# Size bands by sales revenue: below the first edge, between the edges
+# and from the last edge on
+SIZE_BAND_EDGES = (1_000_000, 10_000_000)
+SIZE_BANDS = ('small', 'medium', 'large')
+
+# Fewest peers with a value of a ratio for a size band to be used alone;
+# smaller bands are compared with the whole industry
+MIN_PEERS = 20
+
+# Percentiles at the upper end of the first three quartiles
+QUARTILE_EDGES = (25, 50, 75)
+
+# Measures of the rank of each ratio
+RANK_MEASURES = (
+    'percentile', 'quartile', 'median', 'distance_from_median', 'position',
+    'peers'
+)
+
+
+def size_band(sales_revenue):
+    """
+    Size band of each sales revenue, as an array of names, None where
+    the revenue is not known
+    """
+    sales_revenue = np.asarray(sales_revenue, dtype=float)
+    return np.where(
+        np.isnan(sales_revenue), None,
+        np.array(SIZE_BANDS, dtype=object)[
+            np.digitize(sales_revenue, SIZE_BAND_EDGES)]
+    )
+
+
+def peer_value(value):
+    """Parse a peer ratio, NaN when it is missing or not a number"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        return float(str(value).replace(',', ''))
+    except ValueError:
+        return float('nan')
+
+
+class PeerIndex:
+    """
+    Sorted ratios of the peers of each industry and size band, and of
+    each industry as a whole (size band None). Missing ratios are left
+    out of the index.
+    """
+
+    def __init__(self, industries, size_bands, ratios):
+        industries = np.asarray(industries, dtype=object)
+        size_bands = np.asarray(size_bands, dtype=object)
+        values = {
+            name: np.asarray(ratios[name], dtype=float)
+            for name in RATIO_NAMES
+        }
+        self.groups = {}
+        for industry in dict.fromkeys(industries.tolist()):
+            in_industry = industries == industry
+            self.add_group((industry, None), in_industry, values)
+            for band in dict.fromkeys(size_bands[in_industry].tolist()):
+                self.add_group(
+                    (industry, band), in_industry & (size_bands == band),
+                    values)
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Build the index from peer records with an 'industry', a
+        'size_band' or 'sales_revenue' and the six ratios
+        """
+        industries = [record['industry'] for record in records]
+        size_bands = [
+            record.get('size_band') or band
+            for record, band in zip(records, size_band([
+                peer_value(record.get('sales_revenue'))
+                for record in records
+            ]))
+        ]
+        return cls(industries, size_bands, {
+            name: [peer_value(record.get(name)) for record in records]
+            for name in RATIO_NAMES
+        })
+
+    def add_group(self, key, selected, values):
+        """Sort the ratios of the selected peers into the group"""
+        self.groups[key] = {}
+        for name, column in values.items():
+            column = column[selected]
+            self.groups[key][name] = np.sort(column[~np.isnan(column)])
+
+    def peers(self, name, industry, band=None):
+        """
+        Sorted values of a ratio among the peers of the industry and size
+        band, of the whole industry when the band has too few peers
+        """
+        group = self.groups.get((industry, band))
+        if group is None or len(group[name]) < MIN_PEERS:
+            group = self.groups.get((industry, None))
+        if group is None:
+            return np.empty(0)
+        return group[name]
+
+    def rank(self, ratios, industry, band=None):
+        """
+        Rank the ratios of companies of one industry and size band.
+        Takes {ratio: values} and returns, for each ratio, arrays of the
+        percentile rank (0-100, ties counted as half), the quartile
+        (1-4), the peer median, the distance from the median, the
+        position against the median (1 above, -1 below, 0 equal) and
+        the number of peers. Values without peers get NaN.
+        """
+        ranking = {}
+        for name in RATIO_NAMES:
+            values = np.ma.filled(
+                np.ma.asarray(ratios[name], dtype=float), np.nan)
+            peers = self.peers(name, industry, band)
+            count = len(peers)
+            if count:
+                percentile = (
+                    np.searchsorted(peers, values, 'left') +
+                    np.searchsorted(peers, values, 'right')
+                ) / (2 * count) * 100
+                median = np.median(peers)
+            else:
+                percentile = np.full(values.shape, np.nan)
+                median = np.nan
+            missing = np.isnan(values) | np.isnan(percentile)
+            percentile = np.where(missing, np.nan, percentile)
+            distance = values - median
+            ranking[name] = {
+                'percentile': percentile,
+                'quartile': np.where(
+                    missing, np.nan,
+                    np.digitize(percentile, QUARTILE_EDGES, right=True) + 1),
+                'median': np.full(values.shape, median),
+                'distance_from_median': distance,
+                'position': np.sign(distance),
+                'peers': np.full(values.shape, count)
+            }
+        return ranking
+
+    def rank_companies(self, ratios, industries, size_bands):
+        """
+        Rank companies of any industries and size bands, given one
+        industry and band per company, in one pass per peer group
+        """
+        industries = np.asarray(industries, dtype=object)
+        size_bands = np.asarray(size_bands, dtype=object)
+        values = {
+            name: np.ma.filled(
+                np.ma.asarray(ratios[name], dtype=float), np.nan)
+            for name in RATIO_NAMES
+        }
+        ranking = {
+            name: {
+                key: np.full(len(industries), np.nan)
+                for key in RANK_MEASURES
+            }
+            for name in RATIO_NAMES
+        }
+        for industry, band in dict.fromkeys(
+                zip(industries.tolist(), size_bands.tolist())):
+            selected = np.flatnonzero(
+                (industries == industry) & (size_bands == band))
+            group = self.rank(
+                {name: column[selected] for name, column in values.items()},
+                industry, band)
+            for name, measures in group.items():
+                for key, column in measures.items():
+                    ranking[name][key][selected] = column
+        return ranking
+
+
+@functools.lru_cache(maxsize=None)
+def get_peer_index(path=PEERS_FILE):
+    """Peer index of the peers file, built once; None without the file"""
+    if not path or not os.path.exists(path):
+        return None
+    return PeerIndex.from_records(read_records(path))
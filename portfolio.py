@@ -0,0 +1,189 @@
+"""
+This module runs the ratio, benchmark and trend analysis for a portfolio
+of workbooks, one per client company, fetching them concurrently and
+analysing them on a process pool
+"""
+import argparse
+import sys
+from concurrent.futures import (
+    ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+)
+import run
+from batch import compare_benchmarks, describe_position, write_results
+from ratio_engine import RATIO_NAMES, compute_ratios
+from report import finite_or_none
+from storage import (
+    BENCHMARKS, FIN_RATIOS, LINE_ITEM_CELLS, GoogleSheetsBackend
+)
+from trends import TrendEngine
+
+# Workbooks fetched at the same time, to stay within the API quotas
+FETCH_WORKERS = 8
+
+# Fetch the workbooks
+
+
+def fetch_workbook(backend):
+    """
+    Read every tab of the workbook in one batch request and return the
+    snapshot rows keyed by worksheet name
+    """
+    ranges = list(run.SNAPSHOT_RANGES.items())
+    return dict(zip(run.SNAPSHOT_RANGES, backend.read_ranges(ranges)))
+
+
+def sheets_backend(spreadsheet_id):
+    """Create the Google Sheets backend of the spreadsheet"""
+    return GoogleSheetsBackend(key=spreadsheet_id)
+
+# Analyse a workbook
+
+
+def analyse_workbook(spreadsheet_id, snapshot):
+    """
+    Calculate the ratios, benchmark comparison and trend analysis of one
+    workbook from its snapshot. Runs in a worker process.
+    """
+    items = {
+        item: run.cell_value(snapshot[worksheet], cell)
+        for item, (worksheet, cell) in LINE_ITEM_CELLS.items()
+    }
+    ratios = {
+        name: finite_or_none(value)
+        for name, value in compute_ratios(items).items()
+    }
+    benchmarks = run.get_benchmarks(snapshot[BENCHMARKS])
+    positions = compare_benchmarks(
+        {
+            name: float('nan') if value is None else value
+            for name, value in ratios.items()
+        },
+        benchmarks
+    )
+    engine = TrendEngine.from_history(
+        run.get_historical_data(snapshot[FIN_RATIOS]))
+    return {
+        'spreadsheet_id': spreadsheet_id,
+        'status': 'ok',
+        'error': None,
+        'ratios': ratios,
+        'benchmarks': {
+            name: {
+                'benchmark': benchmarks[name],
+                'position': describe_position(name, positions[name])
+            }
+            for name in RATIO_NAMES
+        },
+        'trends': {
+            name: {
+                period: finite_or_none(change)
+                for period, change in changes.items()
+            }
+            for name, changes in engine.changes().items()
+        },
+        'cagr': {
+            name: finite_or_none(value)
+            for name, value in zip(engine.names, engine.cagr)
+        }
+    }
+
+
+def error_result(spreadsheet_id, stage, error):
+    """Result of a workbook that could not be fetched or analysed"""
+    return {
+        'spreadsheet_id': spreadsheet_id,
+        'status': 'error',
+        'error': f"{stage}: {type(error).__name__}: {error}"
+    }
+
+# Run the portfolio
+
+
+def run_portfolio(
+    spreadsheet_ids,
+    fetch_workers=FETCH_WORKERS,
+    process_workers=None,
+    backend_factory=sheets_backend
+):
+    """
+    Fetch the workbooks on a bounded thread pool, analyse each one on a
+    process pool as soon as it arrives and return one result per
+    workbook, in the order of the ids. A workbook that fails is reported
+    in its result without stopping the others.
+    """
+    results = {}
+    with ThreadPoolExecutor(fetch_workers) as fetch_pool, \
+            ProcessPoolExecutor(process_workers) as process_pool:
+        fetches = {
+            fetch_pool.submit(
+                lambda key: fetch_workbook(backend_factory(key)),
+                spreadsheet_id
+            ): spreadsheet_id
+            for spreadsheet_id in dict.fromkeys(spreadsheet_ids)
+        }
+        analyses = {}
+        for future in as_completed(fetches):
+            spreadsheet_id = fetches[future]
+            try:
+                snapshot = future.result()
+            except Exception as error:
+                results[spreadsheet_id] = error_result(
+                    spreadsheet_id, 'fetch', error)
+                continue
+            analyses[process_pool.submit(
+                analyse_workbook, spreadsheet_id, snapshot
+            )] = spreadsheet_id
+
+        for future in as_completed(analyses):
+            spreadsheet_id = analyses[future]
+            try:
+                results[spreadsheet_id] = future.result()
+            except Exception as error:
+                results[spreadsheet_id] = error_result(
+                    spreadsheet_id, 'analysis', error)
+    return [results[spreadsheet_id] for spreadsheet_id in spreadsheet_ids]
+
+
+def read_spreadsheet_ids(path):
+    """Read spreadsheet ids, one per line, skipping blank lines"""
+    with open(path) as ids_file:
+        return [line.strip() for line in ids_file if line.strip()]
+
+
+def main(argv=None):
+    """Run the portfolio analysis from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Analyse a portfolio of workbooks, one spreadsheet "
+        "id per line."
+    )
+    parser.add_argument('ids', help="file of spreadsheet ids")
+    parser.add_argument(
+        '-o', '--output', default='-',
+        help="JSON or CSV file for the results (default: standard output)"
+    )
+    parser.add_argument(
+        '--fetch-workers', type=int, default=FETCH_WORKERS,
+        help="workbooks fetched at the same time"
+    )
+    parser.add_argument(
+        '--process-workers', type=int, default=None,
+        help="processes analysing workbooks (default: CPU count)"
+    )
+    args = parser.parse_args(argv)
+
+    results = run_portfolio(
+        read_spreadsheet_ids(args.ids),
+        args.fetch_workers,
+        args.process_workers
+    )
+    write_results(results, args.output)
+    failed = sum(result['status'] == 'error' for result in results)
+    print(
+        f"Analysed {len(results) - failed} workbooks, {failed} failed.",
+        file=sys.stderr
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""
+This module provides a vectorised engine that calculates the financial
+ratios for many companies and periods at once
+"""
+import numpy as np
+
+# Ratios in the order they are returned and written to Google Sheets
+RATIO_NAMES = (
+    'current_ratio',
+    'quick_ratio',
+    'net_profit_margin',
+    'return_on_assets',
+    'debt_to_equity',
+    'interest_cover'
+)
+
+# Statement line items needed to calculate the ratios
+LINE_ITEMS = (
+    'current_assets',
+    'current_liabilities',
+    'inventory',
+    'net_income',
+    'sales_revenue',
+    'total_assets',
+    'total_liabilities',
+    'total_equity',
+    'operating_income',
+    'interest_expense'
+)
+
+
+def safe_divide(numerator, denominator):
+    """
+    Divide element by element and mask the results where the denominator
+    is zero instead of raising an error for the whole array
+    """
+    zero = denominator == 0
+    result = np.divide(
+        numerator, denominator,
+        out=np.zeros(np.broadcast(numerator, denominator).shape),
+        where=~zero
+    )
+    return np.ma.masked_array(result, mask=zero)
+
+
+# Line items each ratio depends on and how it is calculated from them
+RATIO_FORMULAS = {
+    'current_ratio': (
+        ('current_assets', 'current_liabilities'),
+        lambda current_assets, current_liabilities: safe_divide(
+            current_assets, current_liabilities)
+    ),
+    'quick_ratio': (
+        ('current_assets', 'inventory', 'current_liabilities'),
+        lambda current_assets, inventory, current_liabilities: safe_divide(
+            current_assets - inventory, current_liabilities)
+    ),
+    'net_profit_margin': (
+        ('net_income', 'sales_revenue'),
+        lambda net_income, sales_revenue: safe_divide(
+            net_income, sales_revenue) * 100
+    ),
+    'return_on_assets': (
+        ('net_income', 'total_assets'),
+        lambda net_income, total_assets: safe_divide(
+            net_income, total_assets) * 100
+    ),
+    'debt_to_equity': (
+        ('total_liabilities', 'total_equity'),
+        lambda total_liabilities, total_equity: safe_divide(
+            total_liabilities, total_equity) * 100
+    ),
+    'interest_cover': (
+        ('operating_income', 'interest_expense'),
+        lambda operating_income, interest_expense: safe_divide(
+            operating_income, interest_expense)
+    )
+}
+
+
+def compute_ratios(items):
+    """
+    Calculate all six ratios from a dict of line item arrays of the same
+    shape, e.g. entities x periods. Returns a dict of masked arrays keyed
+    by ratio name; ratios with a zero denominator are masked.
+    """
+    missing = [item for item in LINE_ITEMS if item not in items]
+    if missing:
+        raise ValueError(f"Missing line items: {', '.join(missing)}")
+    values = {
+        item: np.asarray(items[item], dtype=float) for item in LINE_ITEMS
+    }
+    return {
+        name: function(*(values[item] for item in dependencies))
+        for name, (dependencies, function) in RATIO_FORMULAS.items()
+    }
+
+
+def stack_ratios(ratios):
+    """Stack a dict of ratio arrays into one array with ratios last"""
+    return np.ma.stack([ratios[name] for name in RATIO_NAMES], axis=-1)
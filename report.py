@@ -0,0 +1,207 @@
+"""
+This module provides the report model built by the analysis functions
+and the renderers that turn it into terminal, plain text, JSON or HTML
+output
+"""
+import html
+import json
+import math
+import os
+import sys
+import time
+import numpy as np
+from colorama import Fore, Back
+
+# Report model
+
+
+class Report:
+    """
+    Lines of a financial report, each with a style, and the structured
+    results behind them
+    """
+
+    def __init__(self, title=None):
+        self.title = title
+        self.lines = []
+        self.data = {}
+
+    def add(self, style, text):
+        """Add a line of the given style"""
+        self.lines.append((style, text))
+        return self
+
+    def heading(self, text):
+        """Add a section heading"""
+        return self.add('heading', text)
+
+    def text(self, text):
+        """Add a line of commentary"""
+        return self.add('text', text)
+
+    def note(self, text):
+        """Add a short explanation of a term for non-financial users"""
+        return self.add('note', text)
+
+    def warning(self, text):
+        """Add a warning that needs the user's attention"""
+        return self.add('warning', text)
+
+    def rule(self):
+        """Add a separator line"""
+        return self.add('rule', "\n-------------------------------")
+
+    def extend(self, other):
+        """Append the lines and data of another report"""
+        self.lines.extend(other.lines)
+        self.data.update(other.data)
+        return self
+
+
+def finite_or_none(value):
+    """
+    Replace infinite, NaN and masked numbers, which JSON cannot hold, by
+    None, also inside dicts, lists and tuples. NumPy numbers become
+    Python floats.
+    """
+    if isinstance(value, dict):
+        return {key: finite_or_none(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [finite_or_none(item) for item in value]
+    if isinstance(value, np.ndarray) and value.ndim == 0:
+        value = np.ma.filled(value.astype(float), np.nan).item()
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    return value
+
+# Renderers
+
+
+class TerminalRenderer:
+    """
+    Print the report with colours and an incremental typing effect,
+    pausing after each heading
+    """
+
+    def __init__(self, delay=0.05, pause=1, stream=None):
+        self.delay = delay
+        self.pause = pause
+        self.stream = stream or sys.stdout
+
+    def type_text(self, text):
+        """Print text with an incremental typing effect."""
+        for char in text:
+            print(char, end='', flush=True, file=self.stream)
+            time.sleep(self.delay)
+        print(file=self.stream)
+
+    def render(self, report):
+        for style, text in report.lines:
+            if style == 'heading':
+                print(f"\n{Fore.CYAN}{text}", file=self.stream)
+                time.sleep(self.pause)
+            elif style == 'note':
+                print(f"{Back.BLUE}{text}", file=self.stream)
+            elif style == 'warning':
+                print(f"{Fore.RED}{text}", file=self.stream)
+            elif style == 'rule':
+                print(text, file=self.stream)
+            else:
+                self.type_text(text)
+
+
+class PlainTextRenderer:
+    """Write the whole report at once as plain text without colours"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def to_text(self, report):
+        """Get the report as one string"""
+        return '\n'.join(
+            f"\n{text}" if style == 'heading' else text
+            for style, text in report.lines
+        ) + '\n'
+
+    def render(self, report):
+        self.stream.write(self.to_text(report))
+        self.stream.flush()
+
+
+class JsonRenderer:
+    """Write the report lines and structured results as JSON"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def to_dict(self, report):
+        """Get the report as a dict that JSON can hold"""
+        return {
+            'title': report.title,
+            'lines': [
+                {'style': style, 'text': text.strip()}
+                for style, text in report.lines
+                if style != 'rule'
+            ],
+            'data': finite_or_none(report.data)
+        }
+
+    def to_json(self, report):
+        """Get the report as a JSON string"""
+        return json.dumps(self.to_dict(report), indent=2)
+
+    def render(self, report):
+        self.stream.write(self.to_json(report) + '\n')
+        self.stream.flush()
+
+
+class HtmlRenderer:
+    """Write the report as a standalone HTML page"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def to_html(self, report):
+        """Get the report as an HTML string"""
+        title = html.escape(report.title or 'Financial Report')
+        body = []
+        for style, text in report.lines:
+            text = html.escape(text.strip())
+            if style == 'heading':
+                body.append(f"<h2>{text}</h2>")
+            elif style == 'rule':
+                body.append("<hr>")
+            else:
+                body.append(f'<p class="{style}">{text}</p>')
+        return (
+            "<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n"
+            f"<title>{title}</title>\n<style>\n"
+            ".note { background: #d9e8fb; }\n"
+            ".warning { color: #c00; }\n"
+            "</style>\n</head>\n<body>\n"
+            f"<h1>{title}</h1>\n" + '\n'.join(body) +
+            "\n</body>\n</html>\n"
+        )
+
+    def render(self, report):
+        self.stream.write(self.to_html(report))
+        self.stream.flush()
+
+
+RENDERERS = {
+    'terminal': TerminalRenderer,
+    'plain': PlainTextRenderer,
+    'json': JsonRenderer,
+    'html': HtmlRenderer
+}
+
+
+def get_renderer(name=None, **options):
+    """
+    Create the renderer selected by name or by the FIN_REPORT_FORMAT
+    environment variable: terminal (default), plain, json or html
+    """
+    name = name or os.environ.get('FIN_REPORT_FORMAT', 'terminal')
+    if name not in RENDERERS:
+        raise ValueError(f"Unknown report format: {name}")
+    return RENDERERS[name](**options)
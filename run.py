@@ -1,43 +1,258 @@
 """
 This module provides functions for analysing and comparing financial data
 """
+import functools
+import math
+import os
+import threading
 import time
-import gspread
-from google.oauth2.service_account import Credentials
+from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 from colorama import init, Fore, Back
+from gspread.utils import a1_to_rowcol, rowcol_to_a1
+from instrumentation import InstrumentedBackend, session, span
+from calculator import CalculationGraph
+from commentary import COMMENTARY_SECTIONS, INDUSTRY, get_classifier
+from history_store import HISTORY_ENTITY, get_history_store, period_end
+from models import RatioSet, accepts_ratio_set
+from peers import get_peer_index, size_band
+from ratio_engine import RATIO_NAMES
+from report import Report, TerminalRenderer, get_renderer
+from trends import TrendEngine
+from storage import (
+    PROFIT_AND_LOSS, BALANCE_SHEET, FIN_RATIOS, BENCHMARKS,
+    SNAPSHOT_CACHE_FILE, SnapshotCacheBackend, create_backend
+)
 
 init(autoreset=True)
 
-# Authenticate and authorise the Google Sheets API
+# Storage backend holding the workbook
 
-SCOPE = [
-    "https://www.googleapis.com/auth/spreadsheets",
-    "https://www.googleapis.com/auth/drive.file",
-    "https://www.googleapis.com/auth/drive"
-]
 
-CREDS = Credentials.from_service_account_file('creds.json')
-SCOPED_CREDS = CREDS.with_scopes(SCOPE)
-GSPREAD_CLIENT = gspread.authorize(SCOPED_CREDS)
-SHEET = GSPREAD_CLIENT.open('financial_statements')
+@functools.lru_cache(maxsize=None)
+def get_backend():
+    """
+    Create the storage backend selected by the FIN_STORAGE environment
+    variable on first use and reuse it for the rest of the process.
+    Every request is recorded by the session instrumentation, and ranges
+    are kept on disk until the workbook changes when it tracks revisions.
+    """
+    backend = InstrumentedBackend(create_backend(), session)
+    if SNAPSHOT_CACHE_FILE and backend.tracks_revisions:
+        backend = SnapshotCacheBackend(backend)
+    return backend
+
+
+# Worksheet snapshots
+
+# Cell range read in a single request for each worksheet
+SNAPSHOT_RANGES = {
+    PROFIT_AND_LOSS: 'A1:B27',
+    BALANCE_SHEET: 'A1:B31',
+    FIN_RATIOS: '1:12',
+    BENCHMARKS: 'A1:B9'
+}
+
+# Snapshots are kept for CACHE_TTL seconds, the least recently used
+# snapshot is dropped when more than CACHE_MAXSIZE are held
+CACHE_TTL = float(os.environ.get('SHEETS_CACHE_TTL', 300))
+CACHE_MAXSIZE = int(os.environ.get('SHEETS_CACHE_MAXSIZE', 32))
+
+snapshots = TTLCache(maxsize=CACHE_MAXSIZE, ttl=CACHE_TTL)
+cache_lock = threading.RLock()
+cache_stats = {'hits': 0, 'misses': 0}
+
+# Reads started in the background by prefetch, and a counter per
+# worksheet bumped on every update so that a read started before the
+# update is never cached
+prefetch_pool = ThreadPoolExecutor(max_workers=len(SNAPSHOT_RANGES))
+prefetches = {}
+generations = {}
+
+
+def load_snapshot(worksheet):
+    """Read the worksheet range and cache it unless updated meanwhile"""
+    key = (worksheet, SNAPSHOT_RANGES[worksheet])
+    with cache_lock:
+        generation = generations.get(worksheet, 0)
+    values = get_backend().read_range(worksheet, key[1])
+    with cache_lock:
+        if generations.get(worksheet, 0) == generation:
+            snapshots[key] = values
+    return values
+
+
+def get_snapshot(worksheet):
+    """
+    Read the whole range of the worksheet in one request and keep the
+    values in the cache, so that every cell lookup is served without
+    another API call. Waits for a prefetch of the worksheet if one is
+    in progress.
+    """
+    key = (worksheet, SNAPSHOT_RANGES[worksheet])
+    with cache_lock:
+        if key in snapshots:
+            cache_stats['hits'] += 1
+            return snapshots[key]
+        cache_stats['misses'] += 1
+        prefetched = prefetches.pop(worksheet, None)
+    if prefetched is not None:
+        try:
+            return prefetched.result()
+        except Exception:
+            pass
+    return load_snapshot(worksheet)
+
+
+def prefetch(*worksheets):
+    """
+    Start reading the worksheets (all of them by default) concurrently
+    in the background, so that they are already in memory when needed
+    """
+    get_backend()
+    with cache_lock:
+        for worksheet in worksheets or SNAPSHOT_RANGES:
+            key = (worksheet, SNAPSHOT_RANGES[worksheet])
+            if key not in snapshots and worksheet not in prefetches:
+                prefetches[worksheet] = prefetch_pool.submit(
+                    load_snapshot, worksheet)
+
+
+def invalidate_snapshot(worksheet):
+    """
+    Drop every cached range of the worksheet after it has been updated,
+    so that recalculated formulas are read again on the next lookup
+    """
+    with cache_lock:
+        generations[worksheet] = generations.get(worksheet, 0) + 1
+        prefetches.pop(worksheet, None)
+        for key in [key for key in snapshots if key[0] == worksheet]:
+            del snapshots[key]
+
+
+def clear_cache():
+    """
+    Drop all cached ranges and the calculation graph loaded from them,
+    and reset the hit and miss counters
+    """
+    global graph, trends
+    with cache_lock:
+        snapshots.clear()
+        prefetches.clear()
+        graph = None
+        trends = None
+        cache_stats['hits'] = 0
+        cache_stats['misses'] = 0
+
+
+def refresh_workbook():
+    """
+    Drop all cached ranges, the calculation graph and the trend engine,
+    and check the revision of the workbook again, so that the next
+    lookups see edits made elsewhere. The hit and miss counters are
+    kept.
+    """
+    global graph, trends
+    for worksheet in SNAPSHOT_RANGES:
+        invalidate_snapshot(worksheet)
+    with cache_lock:
+        graph = None
+        trends = None
+    invalidate = getattr(get_backend(), 'invalidate', None)
+    if invalidate is not None:
+        invalidate()
+
+
+# Local calculation graph of the statements
+
+STATEMENTS = (PROFIT_AND_LOSS, BALANCE_SHEET)
+graph = None
+
+
+def get_graph():
+    """
+    Load the inputs of both statements into the calculation graph on
+    first use. Later updates are applied to the graph locally, so that
+    totals and ratios never wait for Google Sheets to recalculate.
+    """
+    global graph
+    if graph is None:
+        loaded = CalculationGraph()
+        loaded.load({
+            worksheet: get_snapshot(worksheet) for worksheet in STATEMENTS
+        })
+        with cache_lock:
+            if graph is None:
+                graph = loaded
+    return graph
+
+
+def statement_value(worksheet, cell):
+    """Get a line item or total of a statement from the graph"""
+    return get_graph().value(worksheet, cell)
+
+
+# Batched worksheet updates
+
+pending_updates = []
+
+
+def queue_update(worksheet, cell, value):
+    """
+    Add a cell update to the batch that is sent by flush_updates and
+    apply it to the calculation graph of the statements
+    """
+    if worksheet in STATEMENTS:
+        get_graph().set(worksheet, cell, value)
+    pending_updates.append((worksheet, cell, value))
+
+
+def flush_updates():
+    """
+    Send all pending cell updates to the storage backend in one batch
+    and drop the snapshots of the updated worksheets
+    """
+    if not pending_updates:
+        return
+    get_backend().write_cells(pending_updates)
 
+    for worksheet, _, _ in pending_updates:
+        invalidate_snapshot(worksheet)
+    pending_updates.clear()
 
-# Get the worksheet objects
-profit_and_loss_sheet = SHEET.worksheet('profit_and_loss')
-balance_sheet = SHEET.worksheet('balance_sheet')
-fin_ratios_sheet = SHEET.worksheet('ratios_historical_data')
-benchmarks_sheet = SHEET.worksheet('industry_benchmarks')
 
 # Incremental typing effect
 
+# Delay per character and pause between steps in seconds, set both to 0
+# to print the report at once
+TYPING_DELAY = float(os.environ.get('FIN_TYPING_DELAY', 0.05))
+PAUSE = float(os.environ.get('FIN_PAUSE', 1))
 
-def print_with_delay(text, delay=0.05):
+
+def print_with_delay(text, delay=None):
     """Print text with an incremental typing effect."""
+    delay = TYPING_DELAY if delay is None else delay
     for char in text:
         print(char, end='', flush=True)
         time.sleep(delay)
     print()
 
+
+def pause():
+    """Pause between steps of the demo"""
+    time.sleep(PAUSE)
+
+
+def render_report(report):
+    """
+    Render the report in the format set by the FIN_REPORT_FORMAT
+    environment variable, animated in the terminal by default
+    """
+    if os.environ.get('FIN_REPORT_FORMAT', 'terminal') == 'terminal':
+        TerminalRenderer(TYPING_DELAY, PAUSE).render(report)
+    else:
+        get_renderer().render(report)
+
 # Instructions
 
 
@@ -48,7 +263,7 @@ def display_instructions():
         "\nPlease follow the steps below to update and generate the "
         "financial report:"
     )
-    time.sleep(1)
+    pause()
     print(
         f"\n{Fore.CYAN}1. Update the Profit and Loss account "
         "numbers:"
@@ -61,7 +276,7 @@ def display_instructions():
         "   - Ensure the values you enter are within the "
         "specified ranges."
     )
-    time.sleep(1)
+    pause()
     print(f"\n{Fore.CYAN}2. Update the Balance Sheet numbers:")
     print_with_delay(
         "   - You will be prompted to enter values for Cash and "
@@ -70,31 +285,31 @@ def display_instructions():
     print_with_delay(
         "   - Ensure the values you enter are within the specified ranges."
     )
-    time.sleep(1)
+    pause()
     print(f"\n{Fore.CYAN}3. Generate Financial Statements:")
     print_with_delay(
         "   - Confirm whether you would like to generate the updated "
         "Profit and Loss account and Balance Sheet."
     )
-    time.sleep(1)
+    pause()
     print(f"\n{Fore.CYAN}4. Calculate Financial Ratios:")
     print_with_delay(
         "   - Based on the updated data the tool will calculate liquidity, "
         "profitability, and solvency ratios."
     )
-    time.sleep(1)
+    pause()
     print(f"\n{Fore.CYAN}5. Analyse and Compare Ratios:")
     print_with_delay(
         "   - You will be prompted to choose to analyse financial ratios, "
         "compare with industry benchmarks, perform trend analysis, or "
         "generate a complete financial report."
     )
-    time.sleep(1)
+    pause()
     print(
         f"\n{Fore.CYAN}6. Follow the prompts and enter values/option "
         "points as requested."
     )
-    time.sleep(1)
+    pause()
     print(f"\n{Fore.CYAN}7. To exit at any point, simply type 'exit'.")
 
 # Financial statements update
@@ -138,18 +353,26 @@ def validate_input(message, min_value, max_value, account_name):
 # Function to update the profit and loss account
 
 
+# Accounts entered by the user: cell, minimum and maximum value
+PROFIT_AND_LOSS_ACCOUNTS = {
+    'Sales Revenue': ('B5', 80_000, 200_000),
+    'Purchased Inventory': ('B9', 10_000, 80_000),
+    'Rent': ('B18', 5_000, 8_000),
+    'Interest Expense': ('B25', 5_000, 10_000)
+}
+
+BALANCE_SHEET_ACCOUNTS = {
+    'Cash and Cash Equivalents': ('B8', 20_000, 50_000),
+    'Short-Term Loans': ('B20', 1_000, 5_000)
+}
+
+
 def update_profit_and_loss():
     """
     Update the profit and loss account numbers for particular
     lines in Google sheets profit_and_loss tab
     """
-
-    accounts_to_update = {
-        'Sales Revenue': ('B5', 80_000, 200_000),
-        'Purchased Inventory': ('B9', 10_000, 80_000),
-        'Rent': ('B18', 5_000, 8_000),
-        'Interest Expense': ('B25', 5_000, 10_000)
-    }
+    accounts_to_update = PROFIT_AND_LOSS_ACCOUNTS
 
     for account_name, (cell, min_value, max_value) in \
             accounts_to_update.items():
@@ -161,7 +384,10 @@ def update_profit_and_loss():
             f"and {max_value:,.0f}:\n "
         )
         value = validate_input(message, min_value, max_value, account_name)
-        profit_and_loss_sheet.update_acell(cell, value)
+        queue_update(PROFIT_AND_LOSS, cell, value)
+
+    flush_updates()
+    for account_name in accounts_to_update:
         print_with_delay(f"\n\t{account_name} updated successfully")
 
 
@@ -173,10 +399,7 @@ def update_balance_sheet():
     Update the Balance Sheet numbers for particular lines
     in Google sheets balance_sheet tab
     """
-    accounts_to_update = {
-        'Cash and Cash Equivalents': ('B8', 20_000, 50_000),
-        'Short-Term Loans': ('B20', 1_000, 5_000)
-    }
+    accounts_to_update = BALANCE_SHEET_ACCOUNTS
 
     for account_name, (cell, min_value, max_value) in \
             accounts_to_update.items():
@@ -188,7 +411,10 @@ def update_balance_sheet():
             f"and {max_value:,.0f}:\n "
         )
         value = validate_input(message, min_value, max_value, account_name)
-        balance_sheet.update_acell(cell, value)
+        queue_update(BALANCE_SHEET, cell, value)
+
+    flush_updates()
+    for account_name in accounts_to_update:
         print_with_delay(f"\n\t{account_name} updated successfully")
 
 
@@ -197,44 +423,40 @@ def update_balance_sheet():
 # Function to extract data from the google sheets
 
 
+def cell_value(rows, cell):
+    """Extract and convert cell value from snapshot rows to float."""
+    row, col = a1_to_rowcol(cell)
+    return float(rows[row - 1][col - 1].replace(',', ''))
+
+
 def get_value(worksheet, cell):
-    """Extract and convert cell value from the google sheets to float."""
-    return float(worksheet.acell(cell).value.replace(',', ''))
+    """Extract and convert cell value from the worksheet snapshot to float."""
+    return cell_value(get_snapshot(worksheet), cell)
 
 # Generate the Profit and Loss account
 
 
 def generate_profit_and_loss():
     """Generate and display the Profit and Loss account"""
-    # Extract data from Google Sheets
-    sales_revenue = get_value(profit_and_loss_sheet, 'B5')
-    beginning_inventory = get_value(profit_and_loss_sheet, 'B8')
-    purchased_inventory = get_value(profit_and_loss_sheet, 'B9')
-    ending_inventory = get_value(profit_and_loss_sheet, 'B10')
-    payroll = get_value(profit_and_loss_sheet, 'B16')
-    utilities = get_value(profit_and_loss_sheet, 'B17')
-    rent_expense = get_value(profit_and_loss_sheet, 'B18')
-    advertising_marketing_expenses = get_value(profit_and_loss_sheet, 'B19')
-    depreciation_expense = get_value(profit_and_loss_sheet, 'B20')
-    interest_expenses = get_value(profit_and_loss_sheet, 'B25')
-
-    # Calculations
-
-    cost_of_goods_sold = (
-        beginning_inventory + purchased_inventory - ending_inventory
-    )
-    gross_profit = sales_revenue - cost_of_goods_sold
-    total_operating_expenses = (
-        payroll + utilities + rent_expense +
-        advertising_marketing_expenses + depreciation_expense
-    )
-    operating_income = gross_profit - total_operating_expenses
-    net_income = operating_income - interest_expenses
+    # Extract line items and totals from the calculation graph
+    sales_revenue = statement_value(PROFIT_AND_LOSS, 'B5')
+    payroll = statement_value(PROFIT_AND_LOSS, 'B16')
+    utilities = statement_value(PROFIT_AND_LOSS, 'B17')
+    rent_expense = statement_value(PROFIT_AND_LOSS, 'B18')
+    advertising_marketing_expenses = statement_value(PROFIT_AND_LOSS, 'B19')
+    depreciation_expense = statement_value(PROFIT_AND_LOSS, 'B20')
+    interest_expenses = statement_value(PROFIT_AND_LOSS, 'B25')
+
+    cost_of_goods_sold = statement_value(PROFIT_AND_LOSS, 'B11')
+    gross_profit = statement_value(PROFIT_AND_LOSS, 'B13')
+    total_operating_expenses = statement_value(PROFIT_AND_LOSS, 'B21')
+    operating_income = statement_value(PROFIT_AND_LOSS, 'B23')
+    net_income = statement_value(PROFIT_AND_LOSS, 'B27')
 
     # Display profit and loss account
 
     print(f"\n{Fore.CYAN}Profit and Loss Account:")
-    time.sleep(1)
+    pause()
     print("-------------------------------")
     print(f"Sales Revenue: £{sales_revenue:,.2f}")
     print(f"Cost of Goods Sold: £{cost_of_goods_sold:,.2f}")
@@ -266,31 +488,25 @@ def generate_profit_and_loss():
 
 def generate_balance_sheet():
     """Generate and display the Balance Sheet"""
-    # Extract data from Google Sheets
-    property_plant_equipment = get_value(balance_sheet, 'B5')
-    cash_and_equivalents = get_value(balance_sheet, 'B8')
-    accounts_receivable = get_value(balance_sheet, 'B9')
-    inventory = get_value(balance_sheet, 'B10')
-    long_term_debt = get_value(balance_sheet, 'B16')
-    accounts_payable = get_value(balance_sheet, 'B19')
-    short_term_loans = get_value(balance_sheet, 'B20')
-    common_stock = get_value(balance_sheet, 'B25')
-    retained_earnings = get_value(balance_sheet, 'B26')
-
-    # Calculations
-    total_assets = (
-        property_plant_equipment + cash_and_equivalents +
-        accounts_receivable + inventory
-    )
-    total_liabilities = long_term_debt + accounts_payable + short_term_loans
-    total_liabilities_and_equity = (
-        total_liabilities + common_stock + retained_earnings
-    )
-    discrepancy = total_assets - total_liabilities_and_equity
+    # Extract line items and totals from the calculation graph
+    property_plant_equipment = statement_value(BALANCE_SHEET, 'B5')
+    cash_and_equivalents = statement_value(BALANCE_SHEET, 'B8')
+    accounts_receivable = statement_value(BALANCE_SHEET, 'B9')
+    inventory = statement_value(BALANCE_SHEET, 'B10')
+    long_term_debt = statement_value(BALANCE_SHEET, 'B16')
+    accounts_payable = statement_value(BALANCE_SHEET, 'B19')
+    short_term_loans = statement_value(BALANCE_SHEET, 'B20')
+    common_stock = statement_value(BALANCE_SHEET, 'B25')
+    retained_earnings = statement_value(BALANCE_SHEET, 'B26')
+
+    total_assets = statement_value(BALANCE_SHEET, 'B13')
+    total_liabilities = statement_value(BALANCE_SHEET, 'B23')
+    total_liabilities_and_equity = statement_value(BALANCE_SHEET, 'B29')
+    discrepancy = statement_value(BALANCE_SHEET, 'B31')
 
     # Display the Balance Sheet
     print(f"\n{Fore.CYAN}Balance Sheet:")
-    time.sleep(1)
+    pause()
     print("-------------------------------")
     print("Non-Current Assets:")
     print(
@@ -308,7 +524,7 @@ def generate_balance_sheet():
     print(f"Total Assets: £{total_assets:,.2f}")
     print("-------------------------------")
     print("Non-Current Liabilities:")
-    print("Long-term Debt: £{long_term_debt:,.2f}")
+    print(f"Long-term Debt: £{long_term_debt:,.2f}")
     print("Current Liabilities:")
     print(f"Accounts Payable: £{accounts_payable:,.2f}")
     print(f"Short-Term Loans: £{short_term_loans:,.2f}")
@@ -334,19 +550,17 @@ def calculate_liquidity_ratios():
     Calculate liquidity ratios based on the updated financial
     statements: current and quick ratios.
     """
-    # Extract values
-    current_assets = get_value(balance_sheet, 'B11')
-    current_liabilities = get_value(balance_sheet, 'B21')
-    # Calculations and validation to avoid division by zero
+    # Extract line items and ratios from the calculation graph
+    calculation = get_graph()
+    current_liabilities = calculation.line_item('current_liabilities')
+    # Validation to avoid division by zero
     if current_liabilities == 0:
         raise ValueError(
             "Current Liabilities should not be zero "
             "to avoid division by zero."
         )
-    current_ratio = current_assets / current_liabilities
-    quick_ratio = (
-        current_assets - get_value(balance_sheet, 'B10')
-    ) / current_liabilities
+    current_ratio = calculation.ratio('current_ratio')
+    quick_ratio = calculation.ratio('quick_ratio')
 
     # Liquidity ratios results:
     print("\n-------------------------------")
@@ -377,12 +591,12 @@ def calculate_profitability_ratios():
     financial statements:
     net profit margin and return on assets
     """
-    # Extract values
-    net_profit = get_value(profit_and_loss_sheet, 'B27')
-    sales_revenue = get_value(profit_and_loss_sheet, 'B5')
-    total_assets = get_value(balance_sheet, 'B13')
+    # Extract line items and ratios from the calculation graph
+    calculation = get_graph()
+    sales_revenue = calculation.line_item('sales_revenue')
+    total_assets = calculation.line_item('total_assets')
 
-    # Calculations and validation to avoid division by zero
+    # Validation to avoid division by zero
     if sales_revenue == 0:
         raise ValueError(
             "Sales Revenue should not be zero to avoid "
@@ -393,8 +607,8 @@ def calculate_profitability_ratios():
             "Total Assets should not be zero to avoid "
             "division by zero."
         )
-    net_profit_margin = (net_profit / sales_revenue) * 100
-    return_on_assets = (net_profit / total_assets) * 100
+    net_profit_margin = calculation.ratio('net_profit_margin')
+    return_on_assets = calculation.ratio('return_on_assets')
 
     # Profitability ratios results:
     print("\n-------------------------------")
@@ -426,21 +640,20 @@ def calculate_solvency_ratios():
     Calculate solvency ratios based on the updated financial statements:
     debt-to-equity and interest cover ratios
     """
-    # Extract values
-    total_liabilities = get_value(balance_sheet, 'B21')
-    total_equity = get_value(balance_sheet, 'B27')
-    interest_expenses = get_value(profit_and_loss_sheet, 'B25')
+    # Extract line items and ratios from the calculation graph
+    calculation = get_graph()
+    total_equity = calculation.line_item('total_equity')
+    interest_expenses = calculation.line_item('interest_expense')
 
-    # Calculations and validation to avoid division by zero
+    # Validation to avoid division by zero
     if total_equity == 0:
         raise ValueError(
             "Total Equity should not be zero to avoid division by zero.")
     if interest_expenses == 0:
         raise ValueError(
             "Interest Expenses should not be zero to avoid division by zero.")
-    debt_to_equity = (total_liabilities / total_equity) * 100
-    interest_cover = (get_value(profit_and_loss_sheet,
-                      'B23') / interest_expenses)
+    debt_to_equity = calculation.ratio('debt_to_equity')
+    interest_cover = calculation.ratio('interest_cover')
 
     # Solvency ratios results:
     print("\n-------------------------------")
@@ -464,6 +677,32 @@ def calculate_solvency_ratios():
     return debt_to_equity, interest_cover
 
 
+# Line items the ratios divide by, in the order they are checked by the
+# calculate_*_ratios functions
+RATIO_DENOMINATORS = {
+    'current_liabilities': 'Current Liabilities',
+    'sales_revenue': 'Sales Revenue',
+    'total_assets': 'Total Assets',
+    'total_equity': 'Total Equity',
+    'interest_expense': 'Interest Expenses'
+}
+
+
+def calculate_ratios(calculation=None):
+    """
+    Calculate the six ratios without printing them, validating the
+    denominators as the calculate_*_ratios functions do. Uses the graph
+    of the session unless another one is given.
+    """
+    calculation = calculation or get_graph()
+    for item, label in RATIO_DENOMINATORS.items():
+        if calculation.line_item(item) == 0:
+            raise ValueError(
+                f"{label} should not be zero to avoid division by zero.")
+    return RatioSet(*(calculation.ratio(name) for name in RATIO_NAMES))
+
+
+@accepts_ratio_set()
 def update_ratios_googlews(
     current_ratio,
     quick_ratio,
@@ -481,16 +720,97 @@ def update_ratios_googlews(
         'Debt-to-Equity Ratio': ('E11', f"{debt_to_equity:.2f}"),
         'Interest Cover Ratio': ('E12', f"{interest_cover:.2f}")
     }
-
-    for ratio_name, (cell, value) in ratios_to_update.items():
-        fin_ratios_sheet.update_acell(cell, value)
+    column = a1_to_rowcol(ratios_to_update['Current Ratio'][0])[1]
+    history_rows = check_history_periods(column)
+    # The label is needed only to record the ratios, and is read before
+    # the update while the tab is still cached
+    period = None
+    if history_rows is not None or trends is not None:
+        period = history_label(column, history_rows)
+
+    for cell, value in ratios_to_update.values():
+        queue_update(FIN_RATIOS, cell, value)
+
+    flush_updates()
+    ratios = RatioSet(current_ratio, quick_ratio, net_profit_margin,
+                      return_on_assets, debt_to_equity, interest_cover)
+    record_ratio_history(ratios, period, history_rows)
+    record_trends(ratios, period)
+    for ratio_name in ratios_to_update:
         print("\n-------------------------------")
         print_with_delay(f"\n\t{ratio_name} updated successfully")
 
 
+def check_history_periods(column):
+    """
+    Check, before the ratios_historical_data tab is updated, that the
+    local history store can take the period of the column and, on the
+    first run, the periods of the history copied from the tab. Returns
+    the rows of the tab as they were, None without a store.
+    """
+    store = get_history_store()
+    if store is None:
+        return None
+    rows = get_snapshot(FIN_RATIOS)
+    columns = [column - 1]
+    if not store.history(HISTORY_ENTITY, last=1)[RATIO_NAMES[0]]:
+        columns += [period for period, _ in history_periods(rows)]
+    for period in columns:
+        label = rows[HISTORY_HEADER_ROW - 1][period]
+        try:
+            period_end(label)
+        except ValueError as error:
+            cell = rowcol_to_a1(HISTORY_HEADER_ROW, period + 1)
+            raise ValueError(
+                f"Cell {cell} of the {FIN_RATIOS} tab cannot be kept in "
+                f"the history store: {error}") from None
+    return rows
+
+
+def history_label(column, rows=None):
+    """
+    Label of the period of a column of the ratios_historical_data tab,
+    as get_historical_data labels it. Reads the tab unless its rows are
+    given.
+    """
+    rows = rows or get_snapshot(FIN_RATIOS)
+    return rows[HISTORY_HEADER_ROW - 1][column - 1] or f"P{column - 1}"
+
+
+def record_ratio_history(ratios, period, rows):
+    """
+    Append the ratios to the local history store, when one is set, under
+    the period, rounded as they are written to the tab. The history in
+    the tab, as given by the rows read before the update, is copied to
+    the store the first time.
+    """
+    store = get_history_store()
+    if store is None:
+        return
+    if not store.history(HISTORY_ENTITY, last=1)[RATIO_NAMES[0]]:
+        store.append_history(HISTORY_ENTITY, get_historical_data(rows))
+    store.append(
+        HISTORY_ENTITY, period,
+        RatioSet(*(round(value, 2) for value in ratios)))
+
+
+def record_trends(ratios, period):
+    """
+    Append the ratios, rounded as they are written to the tab, to the
+    trend engine of the session when it has been built, so that the
+    trends are updated for the period instead of being calculated again
+    from the whole history
+    """
+    with cache_lock:
+        if trends is not None:
+            trends.append(
+                period, [round(ratios[name], 2) for name in trends.names])
+
+
 # Analyse Financial Ratios Results
 
 
+@accepts_ratio_set()
 def analyse_ratios(
     current_ratio,
     quick_ratio,
@@ -499,114 +819,81 @@ def analyse_ratios(
     debt_to_equity,
     interest_cover
 ):
-    """Analyse financial ratios and provide comments"""
-    print("\n-------------------------------")
-    print(f"\n{Fore.CYAN}Liquidity Ratios Analysis:")
-    time.sleep(1)
-    if current_ratio >= 1.5:
-        print_with_delay("\n\tCurrent ratio indicates good liquidity.")
-    elif 1 <= current_ratio < 1.5:
-        print_with_delay(
-            "\n\tCurrent ratio suggests adequate liquidity, "
-            "but caution may be needed.")
-    else:
-        print_with_delay(
-            "\n\tCurrent ratio indicates poor liquidity, and "
-            "immediate attention may be required.")
-
-    if quick_ratio >= 1:
-        print_with_delay(
-            "\n\tQuick ratio indicates strong ability to meet "
-            "short-term obligations.")
-    else:
-        print_with_delay(
-            "\n\tQuick ratio suggests potential difficulties in "
-            "meeting short-term obligations.")
-    print(f"\n{Fore.CYAN}Profitability Ratios Analysis:")
-    if net_profit_margin > 10:
-        print_with_delay(
-            "\n\tNet profit margin indicates healthy profitability.")
-    elif 5 <= net_profit_margin <= 10:
-        print_with_delay(
-            "\n\tNet profit margin suggests satisfactory profitability.")
-    else:
-        print_with_delay(
-            "\n\tNet profit margin indicates low profitability, "
-            "and improvement may be needed.")
-
-    if return_on_assets > 10:
-        print_with_delay(
-            "\n\tReturn on assets suggests efficient utilization of assets.")
-    elif 5 <= return_on_assets <= 10:
-        print_with_delay(
-            "\n\tReturn on assets indicates satisfactory performance "
-            "in asset utilization.")
-    else:
-        print_with_delay(
-            "\n\tReturn on assets suggests inefficiency in asset utilization, "
-            "and optimization may be required.")
-    print(f"\n{Fore.CYAN}Solvency Ratios Analysis:")
-    if debt_to_equity < 50:
-        print_with_delay(
-            "\n\tDebt-to-equity ratio indicates low financial risk.")
-    elif 50 <= debt_to_equity <= 60:
-        print_with_delay(
-            "\n\tDebt-to-equity ratio suggests moderate financial risk.")
-    else:
-        print_with_delay(
-            "\n\tDebt-to-equity ratio indicates high financial risk, and "
-            "debt management strategies may be needed.")
-
-    if interest_cover >= 2:
-        print_with_delay(
-            "\n\tInterest cover ratio indicates comfortable ability to "
-            "cover interest expenses.")
-    else:
-        print_with_delay(
-            "\n\tInterest cover ratio suggests potential challenges in "
-            "covering interest expenses.")
-
-    negative_ratios = []
-    if current_ratio < 0:
-        negative_ratios.append("current ratio")
-    if quick_ratio < 0:
-        negative_ratios.append("quick ratio")
-    if net_profit_margin < 0:
-        negative_ratios.append("net profit margin")
-    if return_on_assets < 0:
-        negative_ratios.append("return on assets")
-    if debt_to_equity < 0:
-        negative_ratios.append("debt-to-equity ratio")
-    if interest_cover < 0:
-        negative_ratios.append("interest cover ratio")
-
+    """
+    Analyse financial ratios and build the report with the comments
+    from the commentary rules of the industry
+    """
+    ratios = RatioSet(
+        current_ratio, quick_ratio, net_profit_margin, return_on_assets,
+        debt_to_equity, interest_cover)
+    classifier = get_classifier()
+    comments = classifier.comments(classifier.classify(ratios))
+    report = Report()
+    report.rule()
+    for heading, names in COMMENTARY_SECTIONS:
+        report.heading(heading)
+        for name in names:
+            report.text(f"\n\t{comments[name]}")
+
+    negative_ratios = classifier.negative_labels(ratios)
     if negative_ratios:
-        print(f"\n\t{Fore.RED}Warning: The following ratios are negative, "
-              "indicating severe financial distress. "
-              "Immediate investigation required:")
+        report.warning(
+            "\n\tWarning: The following ratios are negative, "
+            "indicating severe financial distress. "
+            "Immediate investigation required:")
         for ratio in negative_ratios:
-            print_with_delay(f"\t- {ratio}")
+            report.text(f"\t- {ratio}")
+    report.data['negative_ratios'] = negative_ratios
+    return report
 
 
 # Actual vs Benchmark ratios comparison
 
 # Extract Benchmark Values
 
+# Cell of each benchmark in the industry_benchmarks tab
+BENCHMARK_CELLS = {
+    'current_ratio': 'B4',
+    'quick_ratio': 'B5',
+    'net_profit_margin': 'B6',
+    'return_on_assets': 'B7',
+    'debt_to_equity': 'B8',
+    'interest_cover': 'B9'
+}
+
+
+def get_benchmarks(rows=None):
+    """
+    Extract benchmark values from Google sheets, or from the given
+    snapshot rows of the industry_benchmarks tab
+    """
+    rows = get_snapshot(BENCHMARKS) if rows is None else rows
+    return RatioSet(**{
+        ratio: cell_value(rows, cell)
+        for ratio, cell in BENCHMARK_CELLS.items()
+    })
+
 
-def get_benchmarks():
-    """Extract benchmark values from Google sheets"""
+def peer_ranking(ratios, sales_revenue=None):
+    """
+    Rank the ratios against the peers of the industry and of the size
+    band of the sales revenue, all peers of the industry when it is not
+    given. None when there is no peers file.
+    """
+    index = get_peer_index()
+    if index is None:
+        return None
+    band = None if sales_revenue is None else (
+        size_band(sales_revenue).item())
     return {
-        'current_ratio': get_value(benchmarks_sheet, 'B4'),
-        'quick_ratio': get_value(benchmarks_sheet, 'B5'),
-        'net_profit_margin': get_value(benchmarks_sheet, 'B6'),
-        'return_on_assets': get_value(benchmarks_sheet, 'B7'),
-        'debt_to_equity': get_value(benchmarks_sheet, 'B8'),
-        'interest_cover': get_value(benchmarks_sheet, 'B9')
+        name: {key: float(value) for key, value in measures.items()}
+        for name, measures in index.rank(ratios, INDUSTRY, band).items()
     }
 
 # Compare Actual results to Benchmarks
 
 
+@accepts_ratio_set(1)
 def compare_with_benchmarks(
     benchmarks,
     current_ratio,
@@ -614,9 +901,17 @@ def compare_with_benchmarks(
     net_profit_margin,
     return_on_assets,
     debt_to_equity,
-    interest_cover
+    interest_cover,
+    sales_revenue=None
 ):
-    """Compare actual results with benchmark values"""
+    """
+    Compare actual results with benchmark values, and with the peer
+    distribution of the size band of the sales revenue when there is
+    one, and build the report with the comments
+    """
+    peers = peer_ranking(RatioSet(
+        current_ratio, quick_ratio, net_profit_margin, return_on_assets,
+        debt_to_equity, interest_cover), sales_revenue)
     ratios = {
         'Current Ratio': current_ratio,
         'Quick Ratio': quick_ratio,
@@ -626,79 +921,125 @@ def compare_with_benchmarks(
         'Interest Cover': interest_cover
     }
 
-    print(f"{Back.BLUE}Benchmarking is the practice of comparing "
-          "performance metrics to industry bests and best practices "
-          "from other companies")
+    report = Report()
+    report.note(
+        "Benchmarking is the practice of comparing "
+        "performance metrics to industry bests and best practices "
+        "from other companies")
+    comparison = {}
     for ratio, value in ratios.items():
         benchmark_value = benchmarks[ratio.lower().replace(' ', '_')]
         unit = 'times' if ratio in ['Current Ratio',
                                     'Quick Ratio', 'Interest Cover'] else '%'
 
-        print_with_delay(f"\n\t{ratio}: {value:.2f} {unit} "
-                         f"(Benchmark: {benchmark_value:.2f} {unit})")
+        report.text(f"\n\t{ratio}: {value:.2f} {unit} "
+                    f"(Benchmark: {benchmark_value:.2f} {unit})")
 
         if ratio == 'Debt to Equity':
             if value < benchmark_value:
-                print_with_delay(
+                report.text(
                     f"\n\tThe {ratio} is below the industry benchmark, "
                     "indicating better performance.")
             elif value > benchmark_value:
-                print_with_delay(
+                report.text(
                     f"\n\tThe {ratio} is above the industry benchmark, "
                     "indicating higher financial risk.")
             else:
-                print_with_delay(
+                report.text(
                     f"\n\tThe {ratio} is equal to the industry benchmark, "
                     "indicating average performance.")
         else:
             if value > benchmark_value:
-                print_with_delay(
+                report.text(
                     f"\n\tThe {ratio} is above the industry benchmark, "
                     "indicating better performance.")
             elif value < benchmark_value:
-                print_with_delay(
+                report.text(
                     f"\n\tThe {ratio} is below the industry benchmark, "
                     "indicating underperformance.")
             else:
-                print_with_delay(
+                report.text(
                     f"\n\tThe {ratio} is equal to the industry benchmark, "
                     "indicating average performance.")
+        comparison[ratio] = {
+            'value': value,
+            'benchmark': benchmark_value,
+            'unit': unit,
+            'position': (
+                'above' if value > benchmark_value
+                else 'below' if value < benchmark_value else 'equal'
+            )
+        }
+        if peers is not None:
+            rank = peers[ratio.lower().replace(' ', '_')]
+            if not math.isnan(rank['percentile']):
+                report.text(
+                    f"\tAmong {rank['peers']:.0f} {INDUSTRY} peers it ranks "
+                    f"at the {rank['percentile']:.0f}th percentile "
+                    f"(quartile {rank['quartile']:.0f}), "
+                    f"{rank['distance_from_median']:+.2f} {unit} from the "
+                    f"median of {rank['median']:.2f} {unit}.")
+            comparison[ratio]['peers'] = rank
+    report.data['benchmark_comparison'] = comparison
+    return report
+
 
 # Carry out the trend analysis based on historical data
 
 # Extract historical data
 
+# Row with the period labels and row of each ratio in the history tab
+HISTORY_HEADER_ROW = 3
+HISTORY_ROWS = {
+    'current_ratio': 5,
+    'quick_ratio': 6,
+    'net_profit_margin': 8,
+    'return_on_assets': 9,
+    'debt_to_equity': 11,
+    'interest_cover': 12
+}
+
+
+def history_value(value):
+    """Convert a cell of the history tab to float, NaN when it is blank"""
+    value = value.replace(',', '').strip()
+    return float(value) if value else math.nan
+
+
+def history_periods(rows):
+    """
+    Columns of the ratios_historical_data tab holding any ratio, with
+    the label of their period, P and the column number when unlabelled
+    """
+    return [
+        (column, label or f"P{column}")
+        for column, label in enumerate(rows[HISTORY_HEADER_ROW - 1][1:], 1)
+        if any(rows[row - 1][column] for row in HISTORY_ROWS.values())
+    ]
 
-def get_historical_data():
-    """Extract historical data for four quarters from Google Sheets."""
-    quarters = ['Q1', 'Q2', 'Q3', 'Q4']
-    columns = 'BCDE'
 
+def get_historical_data(rows=None):
+    """
+    Extract historical data for every period (column) of the
+    ratios_historical_data tab, labelled by the header row, blank cells
+    as missing (NaN). The snapshot rows of the tab can be given instead
+    of reading them. With a local history store, its latest ratios are
+    read instead.
+    """
+    if rows is None:
+        store = get_history_store()
+        if store is not None:
+            historical_data = store.history(HISTORY_ENTITY)
+            if historical_data[RATIO_NAMES[0]]:
+                return historical_data
+        rows = get_snapshot(FIN_RATIOS)
+    periods = history_periods(rows)
     historical_data = {
-        'current_ratio': {
-            quarter: get_value(fin_ratios_sheet, f'{column}5')
-            for quarter, column in zip(quarters, columns)
-        },
-        'quick_ratio': {
-            quarter: get_value(fin_ratios_sheet, f'{column}6')
-            for quarter, column in zip(quarters, columns)
-        },
-        'net_profit_margin': {
-            quarter: get_value(fin_ratios_sheet, f'{column}8')
-            for quarter, column in zip(quarters, columns)
-        },
-        'return_on_assets': {
-            quarter: get_value(fin_ratios_sheet, f'{column}9')
-            for quarter, column in zip(quarters, columns)
-        },
-        'debt_to_equity': {
-            quarter: get_value(fin_ratios_sheet, f'{column}11')
-            for quarter, column in zip(quarters, columns)
-        },
-        'interest_cover': {
-            quarter: get_value(fin_ratios_sheet, f'{column}12')
-            for quarter, column in zip(quarters, columns)
+        ratio: {
+            label: history_value(rows[row - 1][column])
+            for column, label in periods
         }
+        for ratio, row in HISTORY_ROWS.items()
     }
 
     return historical_data
@@ -706,43 +1047,49 @@ def get_historical_data():
 # Trend analysis
 
 
-def calculate_trend_analysis(historical_data):
+trends = None
+
+
+def get_trend_engine():
     """
-    Carry out the trend analysis based on the historical data
-    and print the results.
+    Build the trend engine of the historical data on first use. Ratios
+    recorded later in the session are appended to it by record_trends.
     """
-    trend_analysis = {}
+    global trends
+    if trends is None:
+        engine = TrendEngine.from_history(get_historical_data())
+        with cache_lock:
+            if trends is None:
+                trends = engine
+    return trends
+
+
+def calculate_trend_analysis(historical_data=None):
+    """
+    Carry out the trend analysis based on the historical data, those
+    of the session by default, and build the report with the results.
+    """
+    engine = get_trend_engine() if historical_data is None else (
+        TrendEngine.from_history(historical_data))
+    trend_analysis = engine.changes()
     significant_changes = {
         'significant_positive': [],
         'significant_negative': []
     }
 
-    for ratio, data in historical_data.items():
-        trend_analysis[ratio] = {}
-        quarters = list(data.keys())
-        for i in range(1, len(quarters)):
-            current_quarter = quarters[i]
-            previous_quarter = quarters[i - 1]
-            current_value = data[current_quarter]
-            previous_value = data[previous_quarter]
-            if previous_value != 0:
-                change = ((current_value - previous_value) /
-                          previous_value) * 100
-            else:
-                change = float('inf')
-            trend_analysis[ratio][
-                f"{previous_quarter}-"
-                f"{current_quarter}"] = change
-
     # Trend analysis results with commentary
-    print(
-        f"{Back.BLUE}Trend analysis is defined as a statistical and "
+    report = Report()
+    report.note(
+        "Trend analysis is defined as a statistical and "
         "analytical technique used to evaluate and identify patterns, "
         "trends, or changes in data over time.")
     for ratio, changes in trend_analysis.items():
-        print_with_delay(f"\n{ratio}:")
+        report.text(f"\n{ratio}:")
         for period, change in changes.items():
             comment = ""
+            if math.isnan(change):
+                report.text(f"\t{period}: not available (missing value)")
+                continue
             if change == float('inf'):
                 comment = (
                     "(Significant increase due "
@@ -765,21 +1112,102 @@ def calculate_trend_analysis(historical_data):
                     comment = " (Negative trend)"
             else:
                 comment = " (No change)"
-            print_with_delay(f"\t{period}: {change:.2f}%{comment}")
+            report.text(f"\t{period}: {change:.2f}%{comment}")
     # Display warnings for significant changes
     if (
         significant_changes['significant_positive'] or
             significant_changes['significant_negative']):
-        print(f"\n{Fore.RED}Warnings:")
+        report.warning("\nWarnings:")
         if significant_changes['significant_positive']:
-            print_with_delay("\n\tSignificant Positive Trends:")
+            report.text("\n\tSignificant Positive Trends:")
             for positive in significant_changes['significant_positive']:
-                print_with_delay(f"\t- {positive}")
+                report.text(f"\t- {positive}")
         if significant_changes['significant_negative']:
-            print_with_delay("\n\tSignificant Negative Trends:")
+            report.text("\n\tSignificant Negative Trends:")
             for negative in significant_changes['significant_negative']:
-                print_with_delay(f"\t- {negative}")
-    return trend_analysis
+                report.text(f"\t- {negative}")
+    report.data['trend_analysis'] = trend_analysis
+    report.data['moving_average'] = dict(
+        zip(engine.names, engine.moving_average[:, -1].tolist()))
+    report.data['cagr'] = dict(zip(engine.names, engine.cagr.tolist()))
+    report.data['significant_changes'] = significant_changes
+    return report
+
+
+# Complete financial report
+
+
+@accepts_ratio_set()
+def generate_complete_report(
+    current_ratio,
+    quick_ratio,
+    net_profit_margin,
+    return_on_assets,
+    debt_to_equity,
+    interest_cover,
+    sales_revenue=None
+):
+    """
+    Build the complete financial report: ratios analysis, benchmark
+    comparison against the peers of the size band of the sales revenue,
+    trend analysis and summary
+    """
+    ratios = (current_ratio, quick_ratio, net_profit_margin,
+              return_on_assets, debt_to_equity, interest_cover)
+    report = Report("Financial report for the ABC company")
+    report.heading("Financial Ratios Results:")
+    report.extend(analyse_ratios(*ratios))
+    report.rule()
+    report.heading("Benchmark Comparison Analysis:")
+    report.rule()
+    report.extend(compare_with_benchmarks(
+        get_benchmarks(), *ratios, sales_revenue=sales_revenue))
+    report.rule()
+    report.heading("Trend Analysis Results:")
+    report.rule()
+    report.extend(calculate_trend_analysis())
+    report.heading("Summary:")
+    report.text(
+        "\n\tThe financial report generated for ABC company reviews "
+        "its overall financial health and performance.")
+    report.text(
+        "\tKey points include updated profit "
+        "and loss figures, balance "
+        "sheet numbers, and a comprehensive analysis "
+        "of financial ratios.")
+    report.text(
+        "\tBenchmark comparison helps to understand "
+        "the company's standing "
+        "relative to industry standards.")
+    report.text(
+        "\tTrend analysis reveals whether the company's "
+        "financial health is "
+        "improving or deteriorating over time.")
+    report.rule()
+    return report
+
+
+# Session instrumentation
+
+# Span recorded for each menu option
+MENU_SPANS = {
+    'I': 'ratio_analysis',
+    'II': 'benchmark_comparison',
+    'III': 'trend_analysis',
+    'IV': 'complete_report',
+    'V': 'exit'
+}
+
+
+def export_session():
+    """
+    Write the session summary, Prometheus counters and Chrome trace to
+    the directory set by the FIN_TRACE_DIR environment variable
+    """
+    directory = os.environ.get('FIN_TRACE_DIR')
+    if directory:
+        for path in session.export(directory):
+            print(f"Session metrics written to {path}")
 
 
 def main():
@@ -790,12 +1218,18 @@ def main():
     # Introduction
     print(f"\n{Fore.CYAN}Financial report for the ABC company operating "
           "in the retail industry as at 31 of December 20X3")
+    # Read the worksheets in the background while the user types. The
+    # statements are loaded into the calculation graph before their
+    # update, which is then applied locally, so they are read only once.
+    prefetch(BENCHMARKS, PROFIT_AND_LOSS, BALANCE_SHEET)
     # Update Financial Statements
     print(f"\n{Fore.CYAN}Step 1. Update Profit and Loss account numbers:")
-    update_profit_and_loss()
+    with span('update_profit_and_loss'):
+        update_profit_and_loss()
     print(f"\n{Fore.CYAN}The Profit and loss account has been updated")
     print(f"\n{Fore.CYAN}Step 2. Update the Balance Sheet numbers:")
-    update_balance_sheet()
+    with span('update_balance_sheet'):
+        update_balance_sheet()
     print(f"\n{Fore.CYAN}The Balance sheet has been updated")
     # Generate Financial Statements
     while True:
@@ -810,114 +1244,94 @@ def main():
                 "Please select 'y' for yes or 'n' for no.")
     if generate_statements == 'y':
         print(f"\n{Fore.CYAN}Step 3. Generate Financial Statements")
-        generate_profit_and_loss()
-        generate_balance_sheet()
+        with span('generate_statements'):
+            generate_profit_and_loss()
+            generate_balance_sheet()
     else:
         print_with_delay(
             "\nGenerating Profit and Loss account and "
             "Balance Sheet has been omitted.")
-        time.sleep(1)
+        pause()
     # Financial Ratios Calculation
     print_with_delay("\nStep 4. Calculate Financial Ratios")
-    time.sleep(1)
-    current_ratio, quick_ratio = calculate_liquidity_ratios()
-    net_profit_margin, return_on_assets = calculate_profitability_ratios()
-    debt_to_equity, interest_cover = calculate_solvency_ratios()
+    pause()
+    with span('calculate_ratios'):
+        current_ratio, quick_ratio = calculate_liquidity_ratios()
+        net_profit_margin, return_on_assets = (
+            calculate_profitability_ratios())
+        debt_to_equity, interest_cover = calculate_solvency_ratios()
     # Google Sheets Update
     print_with_delay(
         "\nStep 5. Update Google sheets with "
         "calculated ratios numbers:")
-    update_ratios_googlews(current_ratio, quick_ratio, net_profit_margin,
-                           return_on_assets, debt_to_equity, interest_cover)
+    with span('update_ratios'):
+        update_ratios_googlews(
+            current_ratio, quick_ratio, net_profit_margin,
+            return_on_assets, debt_to_equity, interest_cover)
+    # The trends are read from the history store when there is one
+    if get_history_store() is None:
+        prefetch(FIN_RATIOS)
     # Options for users to choose
     while True:
         print_with_delay("\nWhat would you like to generate next:")
-        time.sleep(1)
+        pause()
         print_with_delay("\nI. Financial ratios analysis")
-        time.sleep(1)
+        pause()
         print_with_delay("II. Benchmark comparison")
-        time.sleep(1)
+        pause()
         print_with_delay("III. Trend analysis")
-        time.sleep(1)
+        pause()
         print_with_delay(
             "IV. Complete financial report (all points from I to III)")
-        time.sleep(1)
+        pause()
         print_with_delay("V. Exit")
-        time.sleep(1)
+        pause()
         user_choice = input(
             "\nEnter your choice (I, II, III, IV, V):\n ").strip().upper()
         print("\n-------------------------------")
-        if user_choice == 'I':
-            print(f"\n{Fore.CYAN}Financial Ratios Results:")
-            time.sleep(1)
-            analyse_ratios(current_ratio, quick_ratio, net_profit_margin,
-                           return_on_assets, debt_to_equity, interest_cover)
-        elif user_choice == 'II':
-            print("\n-------------------------------")
-            print(f"\n{Fore.CYAN}Benchmark Comparison Analysis:")
-            print("\n-------------------------------")
-            benchmarks = get_benchmarks()
-            compare_with_benchmarks(
-                benchmarks,
-                current_ratio,
-                quick_ratio,
-                net_profit_margin,
-                return_on_assets,
-                debt_to_equity,
-                interest_cover
-            )
-        elif user_choice == 'III':
-            print("\n-------------------------------")
-            print(f"\n{Fore.CYAN}Trend Analysis Results:")
-            print("\n-------------------------------")
-            historical_data = get_historical_data()
-            calculate_trend_analysis(historical_data)
-        elif user_choice == 'IV':
-            print(f"\n{Fore.CYAN}Financial Ratios Results:")
-            analyse_ratios(current_ratio, quick_ratio, net_profit_margin,
-                           return_on_assets, debt_to_equity, interest_cover)
-            print("\n-------------------------------")
-            print(f"\n{Fore.CYAN}Benchmark Comparison Analysis:")
-            print("\n-------------------------------")
-            benchmarks = get_benchmarks()
-            compare_with_benchmarks(
-                benchmarks,
-                current_ratio,
-                quick_ratio,
-                net_profit_margin,
-                return_on_assets,
-                debt_to_equity,
-                interest_cover)
-            print("\n-------------------------------")
-            print(f"\n{Fore.CYAN}Trend Analysis Results:")
-            print("\n-------------------------------")
-            historical_data = get_historical_data()
-            calculate_trend_analysis(historical_data)
-            print(f"\n{Fore.CYAN}Summary:")
-            print_with_delay(
-                "\n\tThe financial report generated for ABC company reviews "
-                "its overall financial health and performance.")
-            print_with_delay(
-                "\tKey points include updated profit "
-                "and loss figures, balance "
-                "sheet numbers, and a comprehensive analysis "
-                "of financial ratios.")
-            print_with_delay(
-                "\tBenchmark comparison helps to understand "
-                "the company's standing "
-                "relative to industry standards.")
-            print_with_delay(
-                "\tTrend analysis reveals whether the company's "
-                "financial health is "
-                "improving or deteriorating over time.")
-            print("\n-------------------------------")
-        elif user_choice == 'V':
-            print_with_delay("\nExiting the program.")
-            break
-        else:
-            print(f"\n{Fore.RED}Invalid choice. Please select a valid option.")
+        with span(MENU_SPANS.get(user_choice, 'invalid_choice')):
+            if user_choice == 'I':
+                print(f"\n{Fore.CYAN}Financial Ratios Results:")
+                pause()
+                render_report(analyse_ratios(
+                    current_ratio, quick_ratio, net_profit_margin,
+                    return_on_assets, debt_to_equity, interest_cover))
+            elif user_choice == 'II':
+                print("\n-------------------------------")
+                print(f"\n{Fore.CYAN}Benchmark Comparison Analysis:")
+                print("\n-------------------------------")
+                benchmarks = get_benchmarks()
+                render_report(compare_with_benchmarks(
+                    benchmarks,
+                    current_ratio,
+                    quick_ratio,
+                    net_profit_margin,
+                    return_on_assets,
+                    debt_to_equity,
+                    interest_cover,
+                    sales_revenue=get_graph().line_item('sales_revenue')
+                ))
+            elif user_choice == 'III':
+                print("\n-------------------------------")
+                print(f"\n{Fore.CYAN}Trend Analysis Results:")
+                print("\n-------------------------------")
+                render_report(calculate_trend_analysis())
+            elif user_choice == 'IV':
+                render_report(generate_complete_report(
+                    current_ratio, quick_ratio, net_profit_margin,
+                    return_on_assets, debt_to_equity, interest_cover,
+                    sales_revenue=get_graph().line_item('sales_revenue')))
+            elif user_choice == 'V':
+                print_with_delay("\nExiting the program.")
+                break
+            else:
+                print(f"\n{Fore.RED}Invalid choice. "
+                      "Please select a valid option.")
 
 
 if __name__ == "__main__":
     display_instructions()
-    main()
+    try:
+        main()
+    finally:
+        export_session()
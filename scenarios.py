@@ -0,0 +1,245 @@
+"""
+This module runs what-if scenarios over the valid ranges of the input
+accounts: it calculates and classifies the six ratios of every
+combination of a grid or a sample of inputs in memory, without writing
+to Google Sheets, and finds the input values at which a ratio crosses a
+commentary threshold
+"""
+import argparse
+import json
+import sys
+import numpy as np
+from batch import INPUT_ACCOUNTS, base_cells, recalculate_ratios
+from commentary import get_classifier
+from ratio_engine import RATIO_NAMES
+from storage import PROFIT_AND_LOSS, BALANCE_SHEET
+
+# Combinations calculated at once, to bound the memory of a sweep
+SWEEP_CHUNK = 100_000
+
+# Values of each account tried when looking for breakpoints
+BREAKPOINT_STEPS = 1001
+
+# Choose the inputs
+
+
+def account_grid(steps=11, accounts=None):
+    """
+    Evenly spaced whole values over the valid range of each account,
+    all accounts by default
+    """
+    return {
+        name: np.unique(np.round(np.linspace(minimum, maximum, steps)))
+        for name, (_, _, minimum, maximum) in INPUT_ACCOUNTS.items()
+        if accounts is None or name in accounts
+    }
+
+
+def account_sample(count, seed=None, accounts=None):
+    """Random whole values within the valid range of each account"""
+    rng = np.random.default_rng(seed)
+    return {
+        name: rng.integers(minimum, maximum, count, endpoint=True).astype(
+            float)
+        for name, (_, _, minimum, maximum) in INPUT_ACCOUNTS.items()
+        if accounts is None or name in accounts
+    }
+
+# Calculate the scenarios
+
+
+class ScenarioEngine:
+    """
+    Calculate the ratios of scenarios on top of the workbook. Accounts
+    not set by a scenario keep their value in the workbook.
+    """
+
+    def __init__(self, base=None):
+        self.base = base if base is not None else {
+            worksheet: base_cells(worksheet)
+            for worksheet in (PROFIT_AND_LOSS, BALANCE_SHEET)
+        }
+        self.classifier = get_classifier()
+
+    def inputs(self):
+        """Current value of each input account in the workbook"""
+        return {
+            name: self.base[worksheet].get(cell, 0.0)
+            for name, (worksheet, cell, _, _) in INPUT_ACCOUNTS.items()
+        }
+
+    def evaluate(self, values):
+        """
+        Calculate the ratios for account values given as {account:
+        values}. The values of different accounts are broadcast against
+        each other; undefined ratios are NaN.
+        """
+        _, ratios = recalculate_ratios(self.base, {
+            INPUT_ACCOUNTS[name][:2]: np.asarray(value, dtype=float)
+            for name, value in values.items()
+        })
+        shape = np.broadcast(*(
+            np.asarray(value) for value in values.values())).shape
+        return {
+            name: np.broadcast_to(ratio, shape)
+            for name, ratio in ratios.items()
+        }
+
+    def sweep(self, values, chunk=SWEEP_CHUNK):
+        """
+        Calculate and classify the scenarios of a sample, one value per
+        account for each scenario. Returns {'ratios', 'codes'} with one
+        array per ratio.
+        """
+        count = len(next(iter(values.values()))) if values else 1
+        ratios = {name: np.empty(count) for name in RATIO_NAMES}
+        codes = {name: np.empty(count, dtype=np.int8) for name in RATIO_NAMES}
+        for start in range(0, count, chunk):
+            selected = slice(start, start + chunk)
+            part = self.evaluate({
+                name: np.asarray(value)[selected]
+                for name, value in values.items()
+            })
+            for name, column in self.classifier.classify(part).items():
+                ratios[name][selected] = part[name]
+                codes[name][selected] = column
+        return {'ratios': ratios, 'codes': codes}
+
+    def sweep_grid(self, grid, chunk=SWEEP_CHUNK):
+        """
+        Calculate and classify every combination of the grid values of
+        the accounts. The arrays returned have one axis per account, in
+        the order of the grid.
+        """
+        shape = tuple(len(value) for value in grid.values())
+        count = int(np.prod(shape))
+        ratios = {name: np.empty(count) for name in RATIO_NAMES}
+        codes = {name: np.empty(count, dtype=np.int8) for name in RATIO_NAMES}
+        for start in range(0, count, chunk):
+            indices = np.unravel_index(
+                np.arange(start, min(start + chunk, count)), shape)
+            part = self.evaluate({
+                name: np.asarray(value)[index]
+                for (name, value), index in zip(grid.items(), indices)
+            })
+            selected = slice(start, start + chunk)
+            for name, column in self.classifier.classify(part).items():
+                ratios[name][selected] = part[name]
+                codes[name][selected] = column
+        return {
+            'ratios': {
+                name: column.reshape(shape) for name, column in ratios.items()
+            },
+            'codes': {
+                name: column.reshape(shape) for name, column in codes.items()
+            }
+        }
+
+    def category_shares(self, codes):
+        """Share of the scenarios in each category of each ratio"""
+        shares = {}
+        for name, column in codes.items():
+            names = self.classifier.names[name]
+            counts = np.bincount(column.ravel(), minlength=len(names))
+            shares[name] = dict(zip(names, (counts / column.size).tolist()))
+        return shares
+
+    def breakpoints(self, steps=BREAKPOINT_STEPS):
+        """
+        Find the value of each account at which a ratio crosses one of
+        its commentary thresholds, the other accounts keeping their
+        value in the workbook. Each breakpoint is a dict with a
+        description such as "current ratio drops below 1.5 when Cash
+        and Cash Equivalents < 23,000".
+        """
+        found = []
+        for account, values in account_grid(steps).items():
+            ratios = self.evaluate({account: values})
+            codes = self.classifier.classify(ratios)
+            for name in RATIO_NAMES:
+                rule = self.classifier.rules[name]
+                column, code = ratios[name], codes[name].astype(int)
+                for step in np.flatnonzero(code[1:] != code[:-1]):
+                    low, high = sorted((code[step], code[step + 1]))
+                    for edge in range(low, high):
+                        found.append(self.breakpoint(
+                            name, rule, account, edge,
+                            values[step:step + 2], column[step:step + 2],
+                            code[step] > code[step + 1]))
+        return found
+
+    def breakpoint(self, name, rule, account, edge, values, ratios, falling):
+        """
+        Describe the crossing of threshold `edge` between two steps of
+        the account, interpolating the account value at the threshold.
+        `falling` is true when the ratio falls below the threshold as
+        the account increases.
+        """
+        threshold, operator = rule['thresholds'][edge]
+        if ratios[1] != ratios[0] and np.isfinite(ratios).all():
+            value = values[0] + (threshold - ratios[0]) * (
+                values[1] - values[0]) / (ratios[1] - ratios[0])
+        else:
+            value = values[0] if falling else values[1]
+        categories = self.classifier.names[name]
+        drop = "drops below" if operator == '>=' else "drops to or below"
+        side = '>' if falling else '<'
+        return {
+            'ratio': name,
+            'account': account,
+            'threshold': threshold,
+            'value': round(float(value)),
+            'category_below': categories[edge],
+            'category_above': categories[edge + 1],
+            'description': (
+                f"{rule['label']} {drop} {threshold:g} when {account} "
+                f"{side} {value:,.0f}"
+            )
+        }
+
+
+def main(argv=None):
+    """Run a scenario sweep from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Sweep the input accounts over their valid ranges "
+        "and report the ratio categories and breakpoints."
+    )
+    parser.add_argument(
+        '--steps', type=int, default=11,
+        help="values per account on the grid (default: 11)")
+    parser.add_argument(
+        '--sample', type=int,
+        help="analyse this many random scenarios instead of the grid")
+    parser.add_argument('--seed', type=int, help="seed of the sample")
+    parser.add_argument(
+        '-o', '--output',
+        help="JSON file for the category shares and breakpoints")
+    args = parser.parse_args(argv)
+
+    engine = ScenarioEngine()
+    if args.sample:
+        result = engine.sweep(account_sample(args.sample, args.seed))
+    else:
+        result = engine.sweep_grid(account_grid(args.steps))
+    summary = {
+        'scenarios': result['codes'][RATIO_NAMES[0]].size,
+        'categories': engine.category_shares(result['codes']),
+        'breakpoints': engine.breakpoints()
+    }
+
+    print(f"Analysed {summary['scenarios']:,} scenarios.")
+    for name, shares in summary['categories'].items():
+        print(f"\n{name}: " + ', '.join(
+            f"{category} {share:.1%}" for category, share in shares.items()))
+    print("\nBreakpoints:")
+    for breakpoint in summary['breakpoints']:
+        print(f"\t{breakpoint['description']}")
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(summary, output, indent=2)
+            output.write('\n')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+This module schedules the requests sent to the Google Sheets API: it
+keeps them within the project quota with a token bucket, retries rate
+limited and server errors with jittered exponential backoff, merges
+duplicate reads in flight and combines reads and writes issued close
+together into batch requests
+"""
+import functools
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from gspread.exceptions import APIError
+from gspread.utils import a1_to_rowcol
+from instrumentation import note_request, note_retry
+
+# Requests per minute allowed for the project and how many may be sent
+# at once after a quiet period
+REQUESTS_PER_MINUTE = float(os.environ.get('SHEETS_REQUESTS_PER_MINUTE', 60))
+REQUEST_BURST = int(os.environ.get('SHEETS_REQUEST_BURST', 10))
+
+# Seconds to collect reads and writes into one batch request
+COALESCE_WINDOW = float(os.environ.get('SHEETS_COALESCE_WINDOW', 0.01))
+
+# Retries of a request and their delays in seconds: a random delay up
+# to BACKOFF_BASE * 2 ** attempt, at most BACKOFF_MAX
+MAX_RETRIES = int(os.environ.get('SHEETS_MAX_RETRIES', 5))
+BACKOFF_BASE = 1
+BACKOFF_MAX = 32
+
+# Errors worth retrying: rate limited or temporarily unavailable
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """
+    Allow `rate` requests per second on average and up to `capacity` at
+    once. Callers wait for their token, in the order they asked.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, waiting until one is available"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # A token not yet available is reserved, so that waiting
+            # callers are served in turn
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+@functools.lru_cache(maxsize=None)
+def project_bucket():
+    """Token bucket shared by every spreadsheet of the process"""
+    return TokenBucket(REQUESTS_PER_MINUTE / 60, REQUEST_BURST)
+
+
+def retry_delay(error, attempt):
+    """
+    Seconds to wait before retrying after the error, None when the error
+    is not worth retrying. The Retry-After header is honoured when sent.
+    """
+    if getattr(error, 'code', None) not in RETRY_STATUS_CODES:
+        return None
+    retry_after = error.response.headers.get('Retry-After', '')
+    if retry_after.isdigit():
+        return float(retry_after)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def is_cell(cell_range):
+    """Check whether the A1 range is a single cell, e.g. 'B5'"""
+    return re.fullmatch(r'[A-Za-z]+[0-9]+', cell_range) is not None
+
+
+def coalesce(cells):
+    """
+    Combine single cells of the same worksheet and column on adjacent
+    rows into ranges. Takes (worksheet, cell) pairs and returns
+    (worksheet, range, cells) with the cells of each range in row order.
+    """
+    columns = {}
+    for worksheet, cell in dict.fromkeys(cells):
+        row, col = a1_to_rowcol(cell)
+        columns.setdefault((worksheet, col), []).append((row, cell))
+    merged = []
+    for (worksheet, _), rows in columns.items():
+        rows.sort()
+        runs = [[rows[0]]]
+        for row in rows[1:]:
+            if row[0] == runs[-1][-1][0] + 1:
+                runs[-1].append(row)
+            else:
+                runs.append([row])
+        for run in runs:
+            cell_range = run[0][1] if len(run) == 1 else (
+                f"{run[0][1]}:{run[-1][1]}")
+            merged.append((worksheet, cell_range, [cell for _, cell in run]))
+    return merged
+
+
+class RequestScheduler:
+    """
+    Send the reads and writes of one spreadsheet through the project
+    token bucket. `batch_get` takes (worksheet, range) pairs and returns
+    the rows of each range; `batch_update` takes (worksheet, range, rows)
+    triples. Both are retried on rate limits and server errors.
+    """
+
+    def __init__(
+        self, batch_get, batch_update, bucket=None, window=COALESCE_WINDOW
+    ):
+        self.batch_get = batch_get
+        self.batch_update = batch_update
+        self.bucket = bucket or project_bucket()
+        self.window = window
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.pending_reads = None
+        self.pending_writes = None
+        self.stats = {
+            'requests': 0, 'retries': 0, 'deduplicated': 0, 'coalesced': 0
+        }
+
+    def call(self, function, *args, quota='read'):
+        """
+        Call the API function once a token is available, retrying with
+        jittered exponential backoff. Every attempt is counted against
+        the quota bucket.
+        """
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            with self.lock:
+                self.stats['requests'] += 1
+            note_request(quota)
+            try:
+                return function(*args)
+            except APIError as error:
+                delay = retry_delay(error, attempt)
+                if delay is None or attempt >= MAX_RETRIES:
+                    raise
+            attempt += 1
+            with self.lock:
+                self.stats['retries'] += 1
+            note_retry()
+            time.sleep(delay)
+
+    def read(self, worksheet, cell_range):
+        """Read one range of the worksheet"""
+        return self.read_many([(worksheet, cell_range)])[0]
+
+    def read_many(self, ranges):
+        """
+        Read several (worksheet, range) pairs. A range already being read
+        is not requested again, and ranges asked for by other threads
+        within the coalescing window are sent in the same request.
+        """
+        futures = []
+        leader = False
+        with self.lock:
+            for key in ranges:
+                future = self.in_flight.get(key)
+                if future is not None:
+                    self.stats['deduplicated'] += 1
+                else:
+                    future = self.in_flight[key] = Future()
+                    if self.pending_reads is None:
+                        self.pending_reads = {}
+                        leader = True
+                    self.pending_reads[key] = future
+                futures.append(future)
+        if leader:
+            time.sleep(self.window)
+            with self.lock:
+                batch, self.pending_reads = self.pending_reads, None
+            self.send_reads(batch)
+        return [future.result() for future in futures]
+
+    def send_reads(self, batch):
+        """Read a batch of ranges in one request and resolve their futures"""
+        cells = [key for key in batch if is_cell(key[1])]
+        requests = [
+            (key, [key]) for key in batch if not is_cell(key[1])
+        ] + [
+            ((worksheet, cell_range),
+             [(worksheet, cell) for cell in merged_cells])
+            for worksheet, cell_range, merged_cells in coalesce(cells)
+        ]
+        with self.lock:
+            self.stats['coalesced'] += len(batch) - len(requests)
+        try:
+            results = self.call(
+                self.batch_get, [request for request, _ in requests])
+            for (_, keys), rows in zip(requests, results):
+                if len(keys) == 1:
+                    batch[keys[0]].set_result(rows)
+                else:
+                    for key, row in zip(keys, rows):
+                        batch[key].set_result([row])
+        except Exception as error:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(error)
+        finally:
+            with self.lock:
+                for key in batch:
+                    self.in_flight.pop(key, None)
+
+    def write(self, updates):
+        """
+        Write (worksheet, cell, value) updates. Updates from other threads
+        within the coalescing window are sent in the same request, with
+        adjacent cells written as one range.
+        """
+        leader = False
+        with self.lock:
+            if self.pending_writes is None:
+                self.pending_writes = ({}, Future())
+                leader = True
+            pending, future = self.pending_writes
+            for worksheet, cell, value in updates:
+                pending[(worksheet, cell)] = value
+        if leader:
+            time.sleep(self.window)
+            with self.lock:
+                self.pending_writes = None
+            self.send_writes(pending, future)
+        future.result()
+
+    def send_writes(self, pending, future):
+        """Write a batch of cell values in one request"""
+        cells = [key for key in pending if is_cell(key[1])]
+        data = [
+            (worksheet, cell, [[value]])
+            for (worksheet, cell), value in pending.items()
+            if not is_cell(cell)
+        ] + [
+            (worksheet, cell_range,
+             [[pending[(worksheet, cell)]] for cell in merged_cells])
+            for worksheet, cell_range, merged_cells in coalesce(cells)
+        ]
+        with self.lock:
+            self.stats['coalesced'] += len(pending) - len(data)
+        try:
+            self.call(self.batch_update, data, quota='write')
+        except Exception as error:
+            future.set_exception(error)
+        else:
+            future.set_result(None)
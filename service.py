@@ -0,0 +1,258 @@
+"""
+This module serves the ratio calculation, benchmark comparison and trend
+analysis as a long-running HTTP service returning JSON. All requests
+share one authenticated storage client and the worksheet cache, so
+concurrent users need neither a new process nor a new sign-in.
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+from gspread.exceptions import APIError
+import run
+from batch import run_batch
+from calculator import CalculationGraph
+from instrumentation import session
+from report import JsonRenderer, finite_or_none
+
+# Address of the service, PORT as set by Heroku
+HOST = os.environ.get('FIN_SERVICE_HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', 8000))
+
+# Calls and spans kept for the metrics of the running service
+MAX_EVENTS = 10_000
+
+# Largest request body accepted, in bytes
+MAX_BODY = 1_000_000
+
+# Seconds after which the workbook is read again, and its revision
+# checked again, for edits made outside the service
+REFRESH_INTERVAL = float(
+    os.environ.get('FIN_SERVICE_REFRESH', run.CACHE_TTL))
+
+# Calculation graph of the statements, rebuilt when the cached snapshots
+# it was loaded from are read again
+graph_lock = threading.Lock()
+graph_state = {'snapshots': None, 'graph': None, 'refreshed_at': None}
+
+
+def current_graph(clock=time.monotonic):
+    """
+    Get the calculation graph of the statements as currently cached,
+    shared by all requests until the workbook is refreshed. A refresh
+    also drops the graph of the run module, so that every analysis
+    reads the same statements.
+    """
+    with graph_lock:
+        now = clock()
+        refreshed_at = graph_state['refreshed_at']
+        if refreshed_at is None:
+            graph_state['refreshed_at'] = now
+        elif now - refreshed_at >= REFRESH_INTERVAL:
+            run.refresh_workbook()
+            graph_state['refreshed_at'] = now
+    snapshots = {
+        worksheet: run.get_snapshot(worksheet)
+        for worksheet in run.STATEMENTS
+    }
+    with graph_lock:
+        cached = graph_state['snapshots']
+        if cached is None or any(
+            cached[worksheet] is not rows
+            for worksheet, rows in snapshots.items()
+        ):
+            graph = CalculationGraph()
+            graph.load(snapshots)
+            graph_state.update(snapshots=snapshots, graph=graph)
+        return graph_state['graph']
+
+
+def current_ratios():
+    """Get the six ratios of the workbook as a RatioSet"""
+    return run.calculate_ratios(current_graph())
+
+
+def current_revenue():
+    """Get the sales revenue of the workbook, for the peer size band"""
+    return current_graph().line_item('sales_revenue')
+
+# Endpoints
+
+
+def get_health(body):
+    """Check that the service is running"""
+    return {'status': 'ok'}
+
+
+def get_ratios(body):
+    """Calculate the six ratios of the workbook"""
+    return {'ratios': current_ratios().to_dict()}
+
+
+def get_ratio_analysis(body):
+    """Analyse the ratios, as option I of the menu"""
+    return JsonRenderer().to_dict(run.analyse_ratios(current_ratios()))
+
+
+def get_benchmarks(body):
+    """Compare the ratios with the industry benchmarks (option II)"""
+    return JsonRenderer().to_dict(run.compare_with_benchmarks(
+        run.get_benchmarks(), current_ratios(),
+        sales_revenue=current_revenue()))
+
+
+def get_trends(body):
+    """Analyse the trends of the historical ratios (option III)"""
+    return JsonRenderer().to_dict(
+        run.calculate_trend_analysis())
+
+
+def get_report(body):
+    """Build the complete financial report (option IV)"""
+    return JsonRenderer().to_dict(
+        run.generate_complete_report(
+            current_ratios(), sales_revenue=current_revenue()))
+
+
+def post_analyse(body):
+    """
+    Analyse account inputs sent as one JSON object or a list of them
+    without updating the workbook, as batch mode does
+    """
+    records = json.loads(body or 'null')
+    if isinstance(records, dict):
+        records = [records]
+    if not isinstance(records, list) or not all(
+            isinstance(record, dict) for record in records):
+        raise ValueError("Send a JSON object or a list of objects.")
+    return {'results': run_batch(records)}
+
+
+ENDPOINTS = {
+    ('GET', '/health'): get_health,
+    ('GET', '/ratios'): get_ratios,
+    ('GET', '/ratios/analysis'): get_ratio_analysis,
+    ('GET', '/benchmarks'): get_benchmarks,
+    ('GET', '/trends'): get_trends,
+    ('GET', '/report'): get_report,
+    ('POST', '/analyse'): post_analyse
+}
+
+
+def metrics():
+    """Prometheus counters of the API calls and the worksheet cache"""
+    with run.cache_lock:
+        stats = dict(run.cache_stats)
+    lines = [
+        "# HELP fin_cache_requests_total Worksheet cache lookups.",
+        "# TYPE fin_cache_requests_total counter"
+    ] + [
+        f'fin_cache_requests_total{{result="{result}"}} {count}'
+        for result, count in (('hit', stats['hits']),
+                              ('miss', stats['misses']))
+    ]
+    return session.to_prometheus() + '\n'.join(lines) + '\n'
+
+# Request handling
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    """Route each request to its endpoint and answer with JSON"""
+
+    server_version = 'FinancialAnalysis/1.0'
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def handle_request(self, method):
+        path = urlsplit(self.path).path.rstrip('/') or '/'
+        if method == 'GET' and path == '/metrics':
+            self.send(200, metrics().encode('utf-8'),
+                      'text/plain; version=0.0.4')
+            return
+        endpoint = ENDPOINTS.get((method, path))
+        if endpoint is None:
+            self.send_json(404, {'error': f"Not found: {method} {path}"})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if not 0 <= length <= MAX_BODY:
+            self.send_json(400, {
+                'error': "Content-Length must be a number of bytes from 0 "
+                f"to {MAX_BODY:,}."
+            })
+            return
+        body = self.rfile.read(length).decode('utf-8') if length else ''
+        try:
+            with session.span(f"{method} {path}"):
+                result = endpoint(body)
+        except json.JSONDecodeError as error:
+            self.send_json(400, {'error': f"Invalid JSON: {error}"})
+        except ValueError as error:
+            self.send_json(422, {'error': str(error)})
+        except APIError as error:
+            self.send_json(502, {'error': f"Google Sheets error: {error}"})
+        except Exception as error:
+            self.log_error("%s %s failed: %r", method, path, error)
+            self.send_json(500, {'error': "Internal server error."})
+        else:
+            self.send_json(200, result)
+
+    def send_json(self, status, content):
+        self.send(
+            status,
+            json.dumps(finite_or_none(content), default=str).encode('utf-8'),
+            'application/json'
+        )
+
+    def send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_server(host=HOST, port=PORT):
+    """
+    Create the threaded HTTP server, authenticating the storage client
+    and starting to read every worksheet before the first request
+    """
+    session.keep_last(MAX_EVENTS)
+    run.prefetch()
+    server = ThreadingHTTPServer((host, port), AnalysisHandler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    """Run the analysis service from the command line"""
+    parser = argparse.ArgumentParser(
+        description="Serve the financial analysis as JSON over HTTP."
+    )
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    args = parser.parse_args(argv)
+
+    server = create_server(args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
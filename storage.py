@@ -0,0 +1,665 @@
+"""
+This module provides the storage backends used to read and write the
+financial statements workbook: Google Sheets, a local SQLite database
+and an in-memory fake with the same cell layout
+"""
+import csv
+import functools
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+import gspread
+from gspread.utils import a1_range_to_grid_range, a1_to_rowcol, rowcol_to_a1
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+from requests.adapters import HTTPAdapter
+from scheduler import RequestScheduler
+
+# Authenticate and authorise the Google Sheets API
+
+SCOPE = [
+    "https://www.googleapis.com/auth/spreadsheets",
+    "https://www.googleapis.com/auth/drive.file",
+    "https://www.googleapis.com/auth/drive"
+]
+
+# Access token shared between sessions and refreshed before it expires
+TOKEN_CACHE_FILE = '.token_cache.json'
+TOKEN_REFRESH_MARGIN = 300
+
+# Connections kept open to the Google APIs for concurrent requests
+HTTP_POOL_SIZE = int(os.environ.get('SHEETS_HTTP_POOL_SIZE', 20))
+
+# Ranges read from Google Sheets are kept on disk until the spreadsheet
+# changes, set to an empty string to always read them from the API
+SNAPSHOT_CACHE_FILE = os.environ.get(
+    'SHEETS_SNAPSHOT_CACHE', '.snapshot_cache.db')
+
+# Seconds the revision of the spreadsheet is trusted before it is checked
+# again, so that edits made by others are seen
+SNAPSHOT_REVISION_TTL = float(os.environ.get('SHEETS_REVISION_TTL', 60))
+
+# Worksheet names
+PROFIT_AND_LOSS = 'profit_and_loss'
+BALANCE_SHEET = 'balance_sheet'
+FIN_RATIOS = 'ratios_historical_data'
+BENCHMARKS = 'industry_benchmarks'
+
+
+def load_cached_token(creds):
+    """Reuse the access token saved by an earlier session if still valid"""
+    try:
+        with open(TOKEN_CACHE_FILE) as token_file:
+            cached = json.load(token_file)
+        token = cached['token']
+        expiry = datetime.fromisoformat(cached['expiry'])
+    except (OSError, ValueError, KeyError, TypeError):
+        # A missing or malformed cache only costs a token exchange
+        return
+    if (expiry - datetime.utcnow()).total_seconds() > TOKEN_REFRESH_MARGIN:
+        creds.token = token
+        creds.expiry = expiry
+
+
+def save_cached_token(creds):
+    """Save the access token so that the next session skips the exchange"""
+    descriptor = os.open(
+        TOKEN_CACHE_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(descriptor, 'w') as token_file:
+        json.dump({
+            'token': creds.token,
+            'expiry': creds.expiry.isoformat()
+        }, token_file)
+
+
+def refresh_token(creds):
+    """
+    Refresh the access token in the background shortly before it
+    expires and schedule the next refresh
+    """
+    if not creds.valid or (
+        creds.expiry - datetime.utcnow()
+    ).total_seconds() <= TOKEN_REFRESH_MARGIN:
+        creds.refresh(Request())
+        save_cached_token(creds)
+    delay = (
+        creds.expiry - datetime.utcnow()
+    ).total_seconds() - TOKEN_REFRESH_MARGIN
+    timer = threading.Timer(max(delay, 0), refresh_token, args=(creds,))
+    timer.daemon = True
+    timer.start()
+
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    """
+    Authorise the Google Sheets client on first use and reuse it
+    for the rest of the process, sharing its connection pool between
+    threads
+    """
+    creds = Credentials.from_service_account_file('creds.json')
+    scoped_creds = creds.with_scopes(SCOPE)
+    load_cached_token(scoped_creds)
+    refresh_token(scoped_creds)
+    client = gspread.authorize(scoped_creds)
+    # Keep enough connections open for concurrent requests to reuse them
+    client.http_client.session.mount('https://', HTTPAdapter(
+        pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE))
+    return client
+
+
+# Workbook layout
+
+# Labels and input values of each worksheet, as laid out in Google Sheets
+WORKBOOK_LAYOUT = {
+    PROFIT_AND_LOSS: {
+        'A1': 'Company ABC Profit & Loss Account',
+        'A2': 'For the Year Ended December 31, 20X3',
+        'B2': '£',
+        'A4': 'Revenue:',
+        'A5': 'Sales Revenue', 'B5': 200_000,
+        'A7': 'Cost of Goods Sold:',
+        'A8': 'Beginning Inventory', 'B8': 10_000,
+        'A9': 'Purchased Inventory', 'B9': 80_000,
+        'A10': 'Ending Inventory', 'B10': 20_000,
+        'A11': 'Cost of Goods Sold',
+        'A13': 'Gross Profit:',
+        'A15': 'Operating Expenses:',
+        'A16': 'Payroll', 'B16': 40_000,
+        'A17': 'Utilities', 'B17': 5_000,
+        'A18': 'Rent', 'B18': 5_000,
+        'A19': 'Advertising & Marketing Expenses', 'B19': 15_000,
+        'A20': 'Depreciation Expense', 'B20': 5_000,
+        'A21': 'Total Operating Expenses:',
+        'A23': 'Operating Income',
+        'A25': 'Interest Expense', 'B25': 6_000,
+        'A27': 'Net Income'
+    },
+    BALANCE_SHEET: {
+        'A1': 'Company ABC Balance Sheet',
+        'A2': 'As of December 31, 20X3',
+        'B2': '£',
+        'A4': 'Non-Current Assets:',
+        'A5': 'Property, Plant & Equipment', 'B5': 100_000,
+        'A7': 'Current Assets:',
+        'A8': 'Cash and Cash Equivalents', 'B8': 50_000,
+        'A9': 'Accounts Receivable', 'B9': 30_000,
+        'A10': 'Inventory', 'B10': 20_000,
+        'A11': 'Total Current Assets',
+        'A13': 'Total Assets:',
+        'A15': 'Non-current liabilities:',
+        'A16': 'Long-term Debt', 'B16': 50_000,
+        'A18': 'Current Liabilities',
+        'A19': 'Accounts Payable', 'B19': 15_000,
+        'A20': 'Short-term Loans', 'B20': 5_000,
+        'A21': 'Total Current Liabilities',
+        'A23': 'Total Liabilities',
+        'A25': 'Common Stock', 'B25': 50_000,
+        'A26': 'Retained Earnings', 'B26': 75_000,
+        'A27': "Total Shareholder's Equity",
+        'A29': 'Total Liabilities and Equity',
+        'A31': 'Discrepancy to investigate'
+    },
+    FIN_RATIOS: {
+        'A1': 'Financial Ratios: Historical Data',
+        'B3': 'Q1 2023', 'C3': 'Q2 2023', 'D3': 'Q3 2023', 'E3': 'Q4 2023',
+        'A4': 'Liquidity ratios:',
+        'A5': 'Current ratio (times)',
+        'B5': 1.8, 'C5': 2.5, 'D5': 3.2, 'E5': 5,
+        'A6': 'Quick ratio (times)',
+        'B6': 1.5, 'C6': 2.2, 'D6': 3, 'E6': 4,
+        'A7': 'Profitability ratios:',
+        'A8': 'Net Profit Margin (%)',
+        'B8': 8.5, 'C8': 9.2, 'D8': 8.8, 'E8': 27,
+        'A9': 'Return on Assets (%)',
+        'B9': 12, 'C9': 11.5, 'D9': 11.8, 'E9': 27,
+        'A10': 'Solvency ratios:',
+        'A11': 'Debt-to-Equity (%)',
+        'B11': 40, 'C11': 42.5, 'D11': 38, 'E11': 16,
+        'A12': 'Interest Cover (times)',
+        'B12': 2.3, 'C12': 2.1, 'D12': 2.5, 'E12': 10
+    },
+    BENCHMARKS: {
+        'A1': 'Retail Industry Benchmarks:',
+        'A4': 'Current Ratio (times)', 'B4': 1.5,
+        'A5': 'Quick Ratio (times)', 'B5': 1,
+        'A6': 'Net Profit Margin (%)', 'B6': 5,
+        'A7': 'Return on Assets (%)', 'B7': 10,
+        'A8': 'Debt-to-Equity (%)', 'B8': 50,
+        'A9': 'Interest Cover (times)', 'B9': 2
+    }
+}
+
+# Totals calculated by sheet formulas, as signed sums of other cells,
+# listed in the order they are recalculated
+WORKBOOK_FORMULAS = {
+    PROFIT_AND_LOSS: {
+        'B11': ['B8', 'B9', '-B10'],
+        'B13': ['B5', '-B11'],
+        'B21': ['B16', 'B17', 'B18', 'B19', 'B20'],
+        'B23': ['B13', '-B21'],
+        'B27': ['B23', '-B25']
+    },
+    BALANCE_SHEET: {
+        'B11': ['B8', 'B9', 'B10'],
+        'B13': ['B5', 'B11'],
+        'B21': ['B19', 'B20'],
+        'B23': ['B16', 'B21'],
+        'B27': ['B25', 'B26'],
+        'B29': ['B23', 'B27'],
+        'B31': ['B13', '-B29']
+    },
+    FIN_RATIOS: {},
+    BENCHMARKS: {}
+}
+
+# Cells holding the line items used to calculate the ratios. Debt to
+# equity is based on the current liabilities total, as in the workbook.
+LINE_ITEM_CELLS = {
+    'current_assets': (BALANCE_SHEET, 'B11'),
+    'current_liabilities': (BALANCE_SHEET, 'B21'),
+    'inventory': (BALANCE_SHEET, 'B10'),
+    'net_income': (PROFIT_AND_LOSS, 'B27'),
+    'sales_revenue': (PROFIT_AND_LOSS, 'B5'),
+    'total_assets': (BALANCE_SHEET, 'B13'),
+    'total_liabilities': (BALANCE_SHEET, 'B21'),
+    'total_equity': (BALANCE_SHEET, 'B27'),
+    'operating_income': (PROFIT_AND_LOSS, 'B23'),
+    'interest_expense': (PROFIT_AND_LOSS, 'B25')
+}
+
+
+def to_number(value):
+    """
+    Convert a cell value to a number, treating empty cells as zero.
+    Numbers and arrays of numbers are returned unchanged.
+    """
+    if value is None:
+        return 0.0
+    if isinstance(value, str):
+        return float(value.replace(',', '')) if value else 0.0
+    return value
+
+
+def format_value(value):
+    """Format numbers the way the worksheets display them"""
+    if isinstance(value, (int, float)):
+        return f"{value:,.2f}"
+    return value
+
+
+def recalculate(worksheet, cells):
+    """Recalculate the formula totals of the worksheet in place"""
+    for cell, terms in WORKBOOK_FORMULAS[worksheet].items():
+        cells[cell] = sum(
+            -to_number(cells.get(term[1:])) if term.startswith('-')
+            else to_number(cells.get(term))
+            for term in terms
+        )
+
+
+def range_bounds(cell_range):
+    """
+    Get 1-based first and last row and column of an A1 range. The last
+    row or column is None when the range is open-ended, e.g. '1:12'.
+    """
+    grid = a1_range_to_grid_range(cell_range)
+    return (
+        grid.get('startRowIndex', 0) + 1,
+        grid.get('endRowIndex'),
+        grid.get('startColumnIndex', 0) + 1,
+        grid.get('endColumnIndex')
+    )
+
+
+def cells_to_rows(cells, cell_range):
+    """
+    Lay out a dict of cell values as the rows of the given range,
+    open-ended ranges reaching the last filled row or column
+    """
+    first_row, last_row, first_col, last_col = range_bounds(cell_range)
+    positions = [a1_to_rowcol(cell) for cell in cells]
+    if last_row is None:
+        last_row = max((row for row, _ in positions), default=first_row)
+    if last_col is None:
+        last_col = max((col for _, col in positions), default=first_col)
+    return [
+        [
+            format_value(cells.get(rowcol_to_a1(row, col), ''))
+            for col in range(first_col, last_col + 1)
+        ]
+        for row in range(first_row, last_row + 1)
+    ]
+
+
+def read_records(path):
+    """Read records from a JSON list of objects or a CSV file"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='') as csv_file:
+            return list(csv.DictReader(csv_file))
+    with open(path) as json_file:
+        return json.load(json_file)
+
+# Storage backends
+
+
+class StorageBackend:
+    """
+    Interface shared by all storage backends. Ranges are read as lists
+    of rows of formatted values, the same as gspread get_values returns.
+    """
+
+    # Whether revision() tells when the workbook has changed
+    tracks_revisions = False
+
+    # Whether requests go through a scheduler, which reports each request
+    # sent to the session instrumentation
+    schedules_requests = False
+
+    def read_range(self, worksheet, cell_range):
+        """Read a range of cells from the worksheet"""
+        raise NotImplementedError
+
+    def read_ranges(self, ranges):
+        """
+        Read several (worksheet, range) pairs, returning the rows of each
+        range in the same order
+        """
+        return [
+            self.read_range(worksheet, cell_range)
+            for worksheet, cell_range in ranges
+        ]
+
+    def write_cells(self, updates):
+        """Write a batch of (worksheet, cell, value) updates"""
+        raise NotImplementedError
+
+    def revision(self):
+        """
+        Get (workbook id, revision) of the stored workbook, the revision
+        changing on every edit, or None when it is not tracked
+        """
+        return None
+
+
+class GoogleSheetsBackend(StorageBackend):
+    """
+    Read and write the workbook stored in Google Sheets. Every request
+    goes through the request scheduler, which keeps within the API quota,
+    retries rate limited requests and batches reads and writes.
+    """
+
+    tracks_revisions = True
+    schedules_requests = True
+
+    def __init__(self, spreadsheet='financial_statements', key=None):
+        self.spreadsheet_name = spreadsheet
+        self.key = key
+        self.scheduler = RequestScheduler(self.batch_get, self.batch_update)
+
+    @functools.cached_property
+    def spreadsheet(self):
+        """Open the spreadsheet by key or by name on first use"""
+        if self.key:
+            return self.scheduler.call(get_client().open_by_key, self.key)
+        return self.scheduler.call(
+            get_client().open, self.spreadsheet_name, quota='drive')
+
+    def batch_get(self, ranges):
+        """Read all ranges in a single values batch_get request"""
+        response = self.spreadsheet.values_batch_get([
+            gspread.utils.absolute_range_name(worksheet, cell_range)
+            for worksheet, cell_range in ranges
+        ])
+        results = []
+        for (_, cell_range), value_range in zip(
+                ranges, response['valueRanges']):
+            first_row, last_row, first_col, last_col = range_bounds(
+                cell_range)
+            results.append(gspread.utils.fill_gaps(
+                value_range.get('values', []),
+                rows=last_row and last_row - first_row + 1,
+                cols=last_col and last_col - first_col + 1
+            ))
+        return results
+
+    def batch_update(self, data):
+        """Write (worksheet, range, rows) in a single batch_update request"""
+        self.spreadsheet.values_batch_update({
+            'valueInputOption': 'USER_ENTERED',
+            'data': [
+                {
+                    'range': gspread.utils.absolute_range_name(
+                        worksheet, cell_range),
+                    'values': rows
+                }
+                for worksheet, cell_range, rows in data
+            ]
+        })
+
+    def read_range(self, worksheet, cell_range):
+        return self.scheduler.read(worksheet, cell_range)
+
+    def read_ranges(self, ranges):
+        return self.scheduler.read_many(ranges)
+
+    def write_cells(self, updates):
+        self.scheduler.write(updates)
+
+    def revision(self):
+        """Spreadsheet id and last modified time, one Drive API request"""
+        return (
+            self.spreadsheet.id,
+            self.scheduler.call(
+                self.spreadsheet.get_lastUpdateTime, quota='drive')
+        )
+
+
+class MemoryBackend(StorageBackend):
+    """
+    Keep the workbook in memory with the same cell layout as Google
+    Sheets, so that the whole tool runs without network access
+    """
+
+    def __init__(self, layout=None):
+        self.workbook = {
+            worksheet: dict(cells)
+            for worksheet, cells in (layout or WORKBOOK_LAYOUT).items()
+        }
+        for worksheet, cells in self.workbook.items():
+            recalculate(worksheet, cells)
+
+    def read_range(self, worksheet, cell_range):
+        return cells_to_rows(self.workbook[worksheet], cell_range)
+
+    def write_cells(self, updates):
+        for worksheet, cell, value in updates:
+            self.workbook[worksheet][cell] = to_number(value)
+        for worksheet in {worksheet for worksheet, _, _ in updates}:
+            recalculate(worksheet, self.workbook[worksheet])
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Keep the workbook in a local SQLite database, seeded from CSV files
+    (one per worksheet) or from the default layout when it is empty
+    """
+
+    def __init__(self, path='financial_statements.db', csv_directory=None):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cells ("
+            "worksheet TEXT, row INTEGER, col INTEGER, value TEXT, "
+            "PRIMARY KEY (worksheet, row, col))"
+        )
+        if csv_directory:
+            self.import_csv(csv_directory)
+        elif not self.connection.execute(
+                "SELECT 1 FROM cells LIMIT 1").fetchone():
+            self.save_workbook(MemoryBackend().workbook)
+
+    def save_workbook(self, workbook):
+        """Store every cell of the given workbook"""
+        with self.lock, self.connection:
+            for worksheet, cells in workbook.items():
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO cells VALUES (?, ?, ?, ?)",
+                    [
+                        (worksheet, *a1_to_rowcol(cell), str(value))
+                        for cell, value in cells.items()
+                    ]
+                )
+
+    def load_worksheet(self, worksheet):
+        """Read every cell of the worksheet into a dict"""
+        rows = self.connection.execute(
+            "SELECT row, col, value FROM cells WHERE worksheet = ?",
+            (worksheet,)
+        )
+        return {rowcol_to_a1(row, col): value for row, col, value in rows}
+
+    def import_csv(self, directory):
+        """Load <worksheet>.csv files laid out as in Google Sheets"""
+        workbook = {}
+        for worksheet in WORKBOOK_FORMULAS:
+            path = os.path.join(directory, f"{worksheet}.csv")
+            with open(path, newline='') as csv_file:
+                workbook[worksheet] = {
+                    rowcol_to_a1(row, col): value
+                    for row, values in enumerate(csv.reader(csv_file), 1)
+                    for col, value in enumerate(values, 1)
+                    if value != ''
+                }
+            recalculate(worksheet, workbook[worksheet])
+        self.save_workbook(workbook)
+
+    def export_csv(self, directory):
+        """Write each worksheet to <worksheet>.csv"""
+        os.makedirs(directory, exist_ok=True)
+        for worksheet in WORKBOOK_FORMULAS:
+            cells = self.load_worksheet(worksheet)
+            last_row = max(a1_to_rowcol(cell)[0] for cell in cells)
+            last_col = max(a1_to_rowcol(cell)[1] for cell in cells)
+            path = os.path.join(directory, f"{worksheet}.csv")
+            with open(path, 'w', newline='') as csv_file:
+                csv.writer(csv_file).writerows(
+                    [
+                        [
+                            cells.get(rowcol_to_a1(row, col), '')
+                            for col in range(1, last_col + 1)
+                        ]
+                        for row in range(1, last_row + 1)
+                    ]
+                )
+
+    def read_range(self, worksheet, cell_range):
+        first_row, last_row, first_col, last_col = range_bounds(cell_range)
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT row, col, value FROM cells WHERE worksheet = ? "
+                "AND row BETWEEN ? AND ? AND col BETWEEN ? AND ?",
+                (worksheet, first_row, last_row or first_row + 10 ** 9,
+                 first_col, last_col or first_col + 10 ** 9)
+            ).fetchall()
+        cells = {rowcol_to_a1(row, col): value for row, col, value in rows}
+        return cells_to_rows(cells, cell_range)
+
+    def write_cells(self, updates):
+        workbook = {}
+        with self.lock:
+            for worksheet in {worksheet for worksheet, _, _ in updates}:
+                workbook[worksheet] = self.load_worksheet(worksheet)
+        for worksheet, cell, value in updates:
+            workbook[worksheet][cell] = to_number(value)
+        for worksheet, cells in workbook.items():
+            recalculate(worksheet, cells)
+        self.save_workbook(workbook)
+
+
+class SnapshotCacheBackend(StorageBackend):
+    """
+    Keep the ranges read from another backend in a local SQLite file,
+    tagged with the revision of the workbook. A range is read again only
+    when the workbook has changed since it was saved. The revision is
+    checked again once it is older than `revision_ttl` seconds and after
+    each write. A write through this backend drops the ranges of the
+    worksheets it changed and moves the others to the new revision, so
+    that they are not read again only because of the tool's own writes.
+    """
+
+    def __init__(self, backend, path=SNAPSHOT_CACHE_FILE,
+                 revision_ttl=SNAPSHOT_REVISION_TTL, clock=time.monotonic):
+        self.backend = backend
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.revision_ttl = revision_ttl
+        self.clock = clock
+        self.current = None
+        self.checked_at = None
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                "workbook TEXT, worksheet TEXT, cell_range TEXT, "
+                "revision TEXT, rows TEXT, "
+                "PRIMARY KEY (workbook, worksheet, cell_range))"
+            )
+
+    def __getattr__(self, name):
+        return getattr(self.backend, name)
+
+    def revision(self):
+        """
+        Get the revision of the workbook, checked again when it is older
+        than the TTL or has been invalidated
+        """
+        with self.lock:
+            now = self.clock()
+            if self.current is None or (
+                    now - self.checked_at >= self.revision_ttl):
+                self.current = self.backend.revision() or False
+                self.checked_at = now
+            return self.current
+
+    def invalidate(self):
+        """Check the revision again on the next read"""
+        with self.lock:
+            self.current = None
+
+    def read_range(self, worksheet, cell_range):
+        return self.read_ranges([(worksheet, cell_range)])[0]
+
+    def read_ranges(self, ranges):
+        revision = self.revision()
+        if not revision:
+            return self.backend.read_ranges(ranges)
+        workbook, tag = revision
+        results = {}
+        with self.lock:
+            for worksheet, cell_range in ranges:
+                saved = self.connection.execute(
+                    "SELECT rows FROM snapshots WHERE workbook = ? "
+                    "AND worksheet = ? AND cell_range = ? AND revision = ?",
+                    (workbook, worksheet, cell_range, tag)
+                ).fetchone()
+                if saved:
+                    results[(worksheet, cell_range)] = json.loads(saved[0])
+        missing = [key for key in ranges if key not in results]
+        if missing:
+            rows = self.backend.read_ranges(missing)
+            results.update(zip(missing, rows))
+            with self.lock, self.connection:
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (workbook, worksheet, cell_range, tag,
+                         json.dumps(values))
+                        for (worksheet, cell_range), values in zip(
+                            missing, rows)
+                    ]
+                )
+        return [results[key] for key in ranges]
+
+    def write_cells(self, updates):
+        with self.lock:
+            previous = self.current
+        self.backend.write_cells(updates)
+        self.invalidate()
+        if not previous:
+            return
+        workbook, tag = previous
+        written = sorted({worksheet for worksheet, _, _ in updates})
+        revision = self.revision()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM snapshots WHERE workbook = ? AND worksheet IN "
+                f"({', '.join('?' * len(written))})",
+                (workbook, *written)
+            )
+            if revision and revision[0] == workbook:
+                self.connection.execute(
+                    "UPDATE snapshots SET revision = ? "
+                    "WHERE workbook = ? AND revision = ?",
+                    (revision[1], workbook, tag)
+                )
+
+
+def create_backend(name=None):
+    """
+    Create the storage backend selected by name or by the FIN_STORAGE
+    environment variable: sheets (default), sqlite or memory
+    """
+    name = name or os.environ.get('FIN_STORAGE', 'sheets')
+    if name == 'sheets':
+        return GoogleSheetsBackend()
+    if name == 'sqlite':
+        return SQLiteBackend(
+            os.environ.get('FIN_STORAGE_PATH', 'financial_statements.db'),
+            os.environ.get('FIN_STORAGE_CSV')
+        )
+    if name == 'memory':
+        return MemoryBackend()
+    raise ValueError(f"Unknown storage backend: {name}")
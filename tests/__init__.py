@@ -0,0 +1,32 @@
+"""
+Tests of the financial statements analyser. They run against the
+in-memory storage backend, so no Google credentials are needed.
+"""
+import os
+import unittest
+from unittest import mock
+
+os.environ['FIN_STORAGE'] = 'memory'
+os.environ['FIN_HISTORY_STORE'] = ''
+
+import run  # noqa: E402
+from storage import MemoryBackend  # noqa: E402
+
+
+class WorkbookTestCase(unittest.TestCase):
+    """
+    Test reading and writing the workbook of its own backend, with the
+    caches of the tool cleared before and after
+    """
+
+    def create_backend(self):
+        """Backend returned by run.get_backend during the test"""
+        return MemoryBackend()
+
+    def setUp(self):
+        self.backend = self.create_backend()
+        patcher = mock.patch.object(run, 'get_backend', lambda: self.backend)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        run.clear_cache()
+        self.addCleanup(run.clear_cache)
@@ -0,0 +1,140 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import run
+from batch import (
+    INPUT_ACCOUNTS, base_cells, describe_position, main, recalculate_ratios,
+    run_batch
+)
+from calculator import CalculationGraph
+from ratio_engine import RATIO_NAMES
+from tests import WorkbookTestCase
+
+RECORD = {
+    'Sales Revenue': 100000,
+    'Purchased Inventory': 20000,
+    'Rent': 6000,
+    'Interest Expense': 6000,
+    'Cash and Cash Equivalents': 30000,
+    'Short-Term Loans': 2000
+}
+
+
+class RunBatchTest(WorkbookTestCase):
+
+    def test_ratios_match_the_interactive_tool(self):
+        result, = run_batch([dict(RECORD, id='acme')])
+        graph = CalculationGraph()
+        graph.load({
+            worksheet: run.get_snapshot(worksheet)
+            for worksheet in run.STATEMENTS
+        })
+        for name, (worksheet, cell, _, _) in INPUT_ACCOUNTS.items():
+            graph.set(worksheet, cell, RECORD[name])
+        expected = run.calculate_ratios(graph).to_dict()
+        self.assertEqual(result['id'], 'acme')
+        for name in RATIO_NAMES:
+            self.assertAlmostEqual(result['ratios'][name], expected[name])
+
+    def test_scalar_and_array_inputs_agree(self):
+        base = {
+            worksheet: base_cells(worksheet) for worksheet in run.STATEMENTS
+        }
+        rents = np.array([5000.0, 6000.0, 8000.0])
+        rent = INPUT_ACCOUNTS['Rent'][:2]
+        _, ratios = recalculate_ratios(base, {rent: rents})
+        for index, value in enumerate(rents):
+            workbook, single = recalculate_ratios(base, {rent: value})
+            self.assertEqual(workbook[rent[0]][rent[1]], value)
+            for name in RATIO_NAMES:
+                self.assertEqual(
+                    single[name],
+                    np.broadcast_to(ratios[name], rents.shape)[index])
+
+    def test_invalid_records_are_reported(self):
+        valid, invalid = run_batch(
+            [RECORD, dict(RECORD, **{'Rent': '5,000.5', 'Sales Revenue': 1})])
+        self.assertTrue(valid['valid'])
+        self.assertEqual(invalid['id'], 2)
+        self.assertFalse(invalid['valid'])
+        self.assertEqual(len(invalid['errors']), 2)
+        self.assertNotIn('ratios', invalid)
+
+    def test_results_hold_no_nan_or_infinity(self):
+        history = {
+            name: {'Q1 2023': 1.0, 'Q2 2023': 0.0, 'Q3 2023': 1.0}
+            for name in RATIO_NAMES
+        }
+        with mock.patch.object(run, 'get_historical_data',
+                               lambda: history):
+            result, = run_batch([RECORD])
+        trends = result['trends']['quick_ratio']
+        self.assertEqual(trends['Q1 2023-Q2 2023'], -100.0)
+        self.assertIsInstance(trends['Q1 2023-Q2 2023'], float)
+        self.assertIsNone(trends['Q2 2023-Q3 2023'])
+        json.dumps(result, allow_nan=False)
+
+
+class DescribePositionTest(unittest.TestCase):
+
+    def test_lower_is_better_for_debt_to_equity(self):
+        self.assertEqual(describe_position('debt_to_equity', -1),
+                         'below, indicating better performance')
+        self.assertEqual(describe_position('current_ratio', -1),
+                         'below, indicating underperformance')
+        self.assertEqual(describe_position('current_ratio', 0),
+                         'equal, indicating average performance')
+        self.assertIsNone(describe_position('current_ratio', np.nan))
+
+
+class BatchCommandLineTest(WorkbookTestCase):
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.input = self.path('records.csv')
+        with open(self.input, 'w', newline='') as records_file:
+            writer = csv.DictWriter(records_file, ['id'] + list(RECORD))
+            writer.writeheader()
+            writer.writerow(dict(RECORD, id='acme'))
+            writer.writerow(dict(RECORD, id='bad', Rent='rent'))
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def analyse(self, output):
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            status = main([self.input, '-o', self.path(output)])
+        self.assertIn("Analysed 1 records, 1 invalid.", stderr.getvalue())
+        return status
+
+    def test_json_output(self):
+        self.assertEqual(self.analyse('results.json'), 1)
+        with open(self.path('results.json')) as results_file:
+            results = json.load(results_file)
+        self.assertEqual([result['id'] for result in results],
+                         ['acme', 'bad'])
+        self.assertEqual(results[1]['errors'],
+                         ["Rent: Input must contain only digits."])
+
+    def test_csv_output_is_flattened(self):
+        self.analyse('results.csv')
+        with open(self.path('results.csv'), newline='') as results_file:
+            rows = list(csv.DictReader(results_file))
+        self.assertEqual(len(rows), 2)
+        self.assertAlmostEqual(
+            float(rows[0]['ratios.current_ratio']), 80000 / 17000,
+            places=6)
+        self.assertEqual(rows[1]['ratios.current_ratio'], '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import unittest
+from unittest import mock
+import run
+from tests import WorkbookTestCase
+
+# The suite is a script, loaded from its path
+SUITE_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'benchmarks', 'run_benchmarks.py')
+spec = importlib.util.spec_from_file_location('run_benchmarks', SUITE_FILE)
+suite = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(suite)
+
+
+class FixtureTest(WorkbookTestCase):
+
+    def create_backend(self):
+        return suite.FixtureBackend(suite.load_fixture())
+
+    def test_fixture_reads_back_as_recorded(self):
+        fixture = suite.load_fixture()
+        for worksheet, recorded in fixture.items():
+            self.assertEqual(
+                self.backend.read_range(worksheet, recorded['range']),
+                recorded['rows'])
+        self.assertEqual(self.backend.calls, len(fixture))
+
+    def test_api_calls_of_the_pipeline_match_the_baseline(self):
+        with open(suite.BASELINE_FILE) as baseline_file:
+            baseline = json.load(baseline_file)
+        stages = {
+            name: stage for name, stage in suite.PIPELINE_STAGES.items()
+            if not name.startswith(('monte_carlo', 'scenario_grid'))
+        }
+        with mock.patch.object(run, 'TYPING_DELAY', 0), \
+                contextlib.redirect_stdout(io.StringIO()):
+            for name, stage in stages.items():
+                with self.subTest(stage=name):
+                    self.assertEqual(
+                        suite.measure(stage, self.backend, 1)['api_calls'],
+                        baseline[name]['api_calls'])
+
+
+class CheckRegressionsTest(unittest.TestCase):
+
+    baseline = {'stage': {'wall_ms': 10.0, 'peak_kib': 100.0,
+                          'api_calls': 2}}
+
+    def check(self, **result):
+        return suite.check_regressions(
+            {'stage': dict(self.baseline['stage'], **result)},
+            self.baseline, 0.5)
+
+    def test_within_the_tolerance(self):
+        self.assertEqual(self.check(wall_ms=15.0, peak_kib=150.0), [])
+        self.assertEqual(suite.check_regressions(
+            {'new_stage': self.baseline['stage']}, self.baseline, 0.5), [])
+
+    def test_any_extra_api_call_is_a_regression(self):
+        self.assertEqual(self.check(api_calls=3),
+                         ["stage: 3 API calls, baseline 2"])
+
+    def test_time_and_memory_beyond_the_tolerance(self):
+        self.assertEqual(self.check(wall_ms=15.1, peak_kib=151.0), [
+            "stage: wall_ms 15.1, baseline 10.0",
+            "stage: peak_kib 151.0, baseline 100.0"])
+
+    def test_differences_too_small_to_measure_are_ignored(self):
+        baseline = {'stage': {'wall_ms': 0.1, 'peak_kib': 1.0,
+                              'api_calls': 0}}
+        self.assertEqual(suite.check_regressions(
+            {'stage': {'wall_ms': 1.0, 'peak_kib': 1.9, 'api_calls': 0}},
+            baseline, 0.5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import math
+import unittest
+import run
+from calculator import CalculationGraph
+from storage import (
+    BALANCE_SHEET, PROFIT_AND_LOSS, WORKBOOK_FORMULAS, MemoryBackend,
+    to_number
+)
+
+
+class CalculationGraphTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = MemoryBackend()
+        self.graph = CalculationGraph()
+        self.graph.load({
+            worksheet: self.backend.read_range(
+                worksheet, run.SNAPSHOT_RANGES[worksheet])
+            for worksheet in run.STATEMENTS
+        })
+
+    def assert_totals_match_the_workbook(self):
+        for worksheet in run.STATEMENTS:
+            for cell in WORKBOOK_FORMULAS[worksheet]:
+                self.assertAlmostEqual(
+                    self.graph.value(worksheet, cell),
+                    to_number(self.backend.workbook[worksheet][cell]),
+                    msg=f"{worksheet}!{cell}")
+
+    def test_totals_of_the_loaded_workbook(self):
+        self.assert_totals_match_the_workbook()
+
+    def test_update_recalculates_the_dependent_totals(self):
+        updates = [(PROFIT_AND_LOSS, 'B5', 150000),
+                   (BALANCE_SHEET, 'B8', 45000)]
+        for worksheet, cell, value in updates:
+            self.graph.set(worksheet, cell, value)
+        self.backend.write_cells(updates)
+        self.assert_totals_match_the_workbook()
+
+    def test_only_dependent_nodes_are_recalculated(self):
+        nodes = self.graph.set(BALANCE_SHEET, 'B8', 45000)
+        self.assertIn('current_ratio', nodes)
+        self.assertIn('return_on_assets', nodes)
+        self.assertNotIn('net_profit_margin', nodes)
+        self.assertFalse(any(
+            isinstance(node, tuple) and node[0] == PROFIT_AND_LOSS
+            for node in nodes))
+
+    def test_ratios_match_the_interactive_tool(self):
+        ratios = run.calculate_ratios(self.graph)
+        self.assertAlmostEqual(
+            ratios.current_ratio,
+            self.graph.line_item('current_assets')
+            / self.graph.line_item('current_liabilities'))
+
+    def test_zero_denominator_is_nan(self):
+        self.graph.set(PROFIT_AND_LOSS, 'B5', 0)
+        self.assertTrue(math.isnan(self.graph.ratio('net_profit_margin')))
+
+    def test_totals_cannot_be_set(self):
+        cell = next(iter(WORKBOOK_FORMULAS[PROFIT_AND_LOSS]))
+        with self.assertRaisesRegex(ValueError, "calculated total"):
+            self.graph.set(PROFIT_AND_LOSS, cell, 1)
+
+    def test_circular_formulas_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, "Circular formula"):
+            CalculationGraph({'sheet': {'A1': ['A2'], 'A2': ['-A1']}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+import numpy as np
+from commentary import (
+    COMMENTARY_RULES, CommentaryClassifier, get_classifier, industry_rules
+)
+from models import RatioSet
+
+
+class ClassifyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.classifier = CommentaryClassifier()
+
+    def categories(self, name, values):
+        ratios = {other: [] for other in COMMENTARY_RULES}
+        ratios[name] = values
+        return list(self.classifier.categories(
+            self.classifier.classify(ratios))[name])
+
+    def test_at_least_thresholds_include_their_value(self):
+        self.assertEqual(
+            self.categories('current_ratio', [0.99, 1, 1.49, 1.5, 3]),
+            ['poor', 'adequate', 'adequate', 'good', 'good'])
+
+    def test_above_thresholds_exclude_their_value(self):
+        self.assertEqual(
+            self.categories('net_profit_margin', [4.9, 5, 10, 10.01]),
+            ['low', 'satisfactory', 'satisfactory', 'healthy'])
+        self.assertEqual(
+            self.categories('debt_to_equity', [49, 50, 60, 61]),
+            ['low_risk', 'moderate_risk', 'moderate_risk', 'high_risk'])
+
+    def test_missing_ratios(self):
+        self.assertEqual(
+            self.categories('quick_ratio',
+                            np.ma.masked_invalid([np.nan, 2.0])),
+            ['weak', 'strong'])
+        self.assertEqual(self.categories('debt_to_equity', [np.nan]),
+                         ['high_risk'])
+
+    def test_codes_keep_the_shape_of_the_values(self):
+        codes = self.classifier.classify(
+            {name: np.ones((2, 3)) for name in COMMENTARY_RULES})
+        self.assertEqual(codes['current_ratio'].shape, (2, 3))
+        comments = self.classifier.comments(codes)
+        self.assertTrue(comments['current_ratio'][1, 2].startswith(
+            "Current ratio suggests adequate liquidity"))
+
+    def test_negative_ratios(self):
+        ratios = RatioSet(1.2, -0.5, -3, 4, 20, float('nan'))
+        self.assertEqual(self.classifier.negative_labels(ratios),
+                         ['quick ratio', 'net profit margin'])
+
+
+class IndustryRulesTest(unittest.TestCase):
+
+    def test_overrides_replace_the_thresholds(self):
+        rules = industry_rules('manufacturing')
+        self.assertEqual(rules['current_ratio']['thresholds'],
+                         [[1.2, '>='], [2, '>=']])
+        self.assertEqual(rules['quick_ratio'],
+                         COMMENTARY_RULES['quick_ratio'])
+        classifier = get_classifier('manufacturing')
+        self.assertIs(classifier, get_classifier('manufacturing'))
+        codes = classifier.classify(
+            {name: [1.1] for name in COMMENTARY_RULES})
+        self.assertEqual(classifier.categories(codes)['current_ratio'][0],
+                         'poor')
+
+    def test_unknown_ratio_in_the_overrides(self):
+        with self.assertRaisesRegex(ValueError, "Unknown ratio"):
+            industry_rules('retail', {'retail': {'margin': {}}})
+
+    def test_invalid_rules_are_rejected(self):
+        for override, message in (
+                ({'thresholds': [[2, '>='], [1, '>=']]}, "ascending"),
+                ({'thresholds': [[1, '<'], [2, '>=']]}, "must use one of"),
+                ({'thresholds': [[1, '>=']]}, "one category more"),
+                ({'missing': 'unknown'}, "is not one of")):
+            with self.subTest(message=message):
+                rules = industry_rules(
+                    'retail', {'retail': {'current_ratio': override}})
+                with self.assertRaisesRegex(ValueError, message):
+                    CommentaryClassifier(rules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import run
+from batch import INPUT_ACCOUNTS
+from export import main, read_benchmarks, record_frames
+from models import RatioFrame
+from ratio_engine import RATIO_NAMES
+
+LEDGER = [
+    ('2023-01-15', 'Sales', '1200.50'),
+    ('2023-01-20', 'Cash', '800'),
+    ('2023-02-03', 'Wages', '300'),
+    ('2023-04-10', 'Inventory', '500'),
+    ('2023-04-10', 'Trade Creditors', '250'),
+]
+
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.ledger = self.path('ledger.csv')
+        with open(self.ledger, 'w', newline='') as ledger_file:
+            writer = csv.writer(ledger_file)
+            writer.writerow(('date', 'account', 'amount'))
+            writer.writerows(LEDGER)
+        # Exports of a ledger must not read the workbook
+        patcher = mock.patch.object(run, 'get_benchmarks', mock.Mock(
+            side_effect=AssertionError("get_benchmarks was called")))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def export(self, *options):
+        with contextlib.redirect_stderr(io.StringIO()):
+            return main([self.ledger, '--ledger', '--format', 'csv',
+                         '-o', self.path('export'), *options])
+
+    def read(self, dataset):
+        with open(self.path(f'export/{dataset}.csv'), newline='') as file:
+            return list(csv.DictReader(file))
+
+    def test_ledger_export_leaves_out_the_benchmarks(self):
+        self.assertEqual(self.export(), 0)
+        self.assertEqual(
+            sorted(os.listdir(self.path('export'))),
+            ['ratios.csv', 'statements.csv', 'trends.csv'])
+        self.assertEqual([row['period'] for row in self.read('ratios')],
+                         ['Q1 2023', 'Q2 2023'])
+
+    def test_csv_is_the_default_format(self):
+        with contextlib.redirect_stderr(io.StringIO()):
+            main([self.ledger, '--ledger', '-o', self.path('export')])
+        self.assertEqual(
+            sorted(os.listdir(self.path('export'))),
+            ['ratios.csv', 'statements.csv', 'trends.csv'])
+
+    def test_ledger_export_with_local_benchmarks(self):
+        with open(self.path('benchmarks.json'), 'w') as benchmarks_file:
+            json.dump(dict.fromkeys(RATIO_NAMES, 1.0), benchmarks_file)
+        self.export('--benchmarks', self.path('benchmarks.json'))
+        rows = self.read('benchmarks')
+        self.assertEqual(len(rows), 2 * len(RATIO_NAMES))
+        self.assertEqual({row['benchmark'] for row in rows}, {'1.0'})
+
+    def test_incomplete_benchmarks_are_rejected(self):
+        with open(self.path('benchmarks.json'), 'w') as benchmarks_file:
+            json.dump({'current_ratio': 1.0}, benchmarks_file)
+        with self.assertRaisesRegex(ValueError, "quick_ratio"):
+            read_benchmarks(self.path('benchmarks.json'))
+
+
+class RecordFramesTest(unittest.TestCase):
+
+    def test_latest_period_is_rounded_as_in_batch_mode(self):
+        record = {
+            name: int(account[2] + account[3]) // 2 + index
+            for index, (name, account) in enumerate(INPUT_ACCOUNTS.items())
+        }
+        history = {name: {'Q3 2023': 1.5, 'Q4 2023': 2.5}
+                   for name in RATIO_NAMES}
+        statements, ratios, invalid = record_frames(
+            [record, {'id': 'bad'}], history)
+        self.assertEqual(invalid, 1)
+        self.assertEqual(ratios.entities, [1])
+        np.testing.assert_array_equal(ratios.data[:, 0], 1.5)
+        np.testing.assert_array_equal(
+            ratios.data[:, 1],
+            np.round(RatioFrame.from_statements(statements).data[:, 0], 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+import contextlib
+import io
+import math
+import unittest
+from unittest import mock
+import run
+from history_store import RatioHistoryStore, period_end
+from models import RatioSet
+from ratio_engine import RATIO_NAMES
+from storage import FIN_RATIOS
+from tests import WorkbookTestCase
+
+
+def ratios(value):
+    return RatioSet(*[value] * len(RATIO_NAMES))
+
+
+class PeriodEndTest(unittest.TestCase):
+
+    def test_labels_of_the_same_month(self):
+        self.assertEqual(period_end('Q4 2023'), period_end('2023-12'))
+        self.assertEqual(period_end('2023'), period_end('2023-12'))
+        self.assertEqual(period_end('Q1 2024'), period_end('2023-12') + 3)
+
+    def test_labels_without_a_year_are_rejected(self):
+        for label in ('Q4', 'P5', ''):
+            with self.assertRaisesRegex(ValueError, "with their year"):
+                period_end(label)
+
+
+class RatioHistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = RatioHistoryStore()
+        self.addCleanup(self.store.close)
+        for time, value in ((1.0, 1.0), (2.0, 2.0)):
+            for quarter in range(1, 5):
+                self.store.append(
+                    'acme', f"Q{quarter} 2023", ratios(value + quarter),
+                    recorded_at=time)
+
+    def test_latest_record_of_each_period(self):
+        history = self.store.history('acme', ('quick_ratio',))
+        self.assertEqual(history['quick_ratio'], {
+            'Q1 2023': 3.0, 'Q2 2023': 4.0, 'Q3 2023': 5.0, 'Q4 2023': 6.0})
+
+    def test_as_of_an_earlier_run(self):
+        history = self.store.history('acme', ('quick_ratio',), as_of=1.5)
+        self.assertEqual(list(history['quick_ratio'].values()),
+                         [2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(
+            self.store.history('acme', as_of=0.5)['quick_ratio'], {})
+
+    def test_last_periods_in_order(self):
+        history = self.store.history('acme', ('quick_ratio',), last=2)
+        self.assertEqual(history['quick_ratio'],
+                         {'Q3 2023': 5.0, 'Q4 2023': 6.0})
+        self.assertEqual(
+            self.store.history('acme', last=0)['quick_ratio'], {})
+
+    def test_last_with_a_range_of_periods(self):
+        history = self.store.history(
+            'acme', ('quick_ratio',), start='Q2 2023', end='Q3 2023',
+            last=5)
+        self.assertEqual(list(history['quick_ratio']),
+                         ['Q2 2023', 'Q3 2023'])
+
+    def test_last_periods_are_read_through_the_index(self):
+        statements = []
+        self.store.connection.set_trace_callback(statements.append)
+        self.store.history('acme', last=2)
+        self.store.connection.set_trace_callback(None)
+        query, = statements
+        self.assertIn('LIMIT 2', query)
+        plan = ' '.join(
+            row[-1] for row in self.store.connection.execute(
+                f"EXPLAIN QUERY PLAN {query}"))
+        self.assertIn('INDEX ratio_history_period', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_missing_ratios_are_nan(self):
+        self.store.append('acme', 'Q1 2024', {
+            name: None for name in RATIO_NAMES})
+        history = self.store.history('acme', last=1)
+        self.assertTrue(math.isnan(history['quick_ratio']['Q1 2024']))
+
+    def test_latest_of_many_entities(self):
+        self.store.append('other', 'Q4 2023', ratios(9.0))
+        frame = self.store.frame(end='Q4 2023')
+        self.assertEqual(frame.entities, ['acme', 'other'])
+        self.assertEqual(frame['quick_ratio'][:, -1].tolist(), [6.0, 9.0])
+        self.assertTrue(math.isnan(frame['quick_ratio'][1, 0]))
+
+    def test_latest_by_time_of_recording(self):
+        self.store.append('late', 'Q1 2023', ratios(2.0), recorded_at=200)
+        self.store.append('late', 'Q1 2023', ratios(1.0), recorded_at=100)
+        self.assertEqual(self.store.history('late')['quick_ratio'],
+                         {'Q1 2023': 2.0})
+        self.assertEqual(
+            self.store.history('late', as_of=150)['quick_ratio'],
+            {'Q1 2023': 1.0})
+        self.assertEqual(self.store.frame(['late'])['quick_ratio'].tolist(),
+                         [[2.0]])
+        self.store.compact()
+        self.assertEqual(self.store.history('late')['quick_ratio'],
+                         {'Q1 2023': 2.0})
+
+    def test_last_inserted_of_the_same_time(self):
+        for value in (1.0, 3.0, 2.0):
+            self.store.append('same', 'Q1 2023', ratios(value),
+                              recorded_at=100)
+        self.assertEqual(self.store.history('same')['quick_ratio'],
+                         {'Q1 2023': 2.0})
+
+    def test_compact_keeps_the_latest_records(self):
+        self.assertEqual(self.store.compact(), 4)
+        self.assertEqual(self.store.records(), 4)
+        self.assertEqual(
+            self.store.history('acme', as_of=1.5)['quick_ratio'], {})
+        self.assertEqual(
+            self.store.history('acme', last=1)['quick_ratio'],
+            {'Q4 2023': 6.0})
+
+
+class RecordRatioHistoryTest(WorkbookTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = RatioHistoryStore()
+        self.addCleanup(self.store.close)
+        for patcher in (
+            mock.patch.object(run, 'get_history_store', lambda: self.store),
+            mock.patch.object(run, 'print_with_delay'),
+            contextlib.redirect_stdout(io.StringIO())
+        ):
+            patcher.__enter__()
+            self.addCleanup(patcher.__exit__, None, None, None)
+        self.addCleanup(run.pending_updates.clear)
+
+    def test_history_of_the_tab_and_the_new_ratios(self):
+        run.update_ratios_googlews(ratios(1.234))
+        history = self.store.history(run.HISTORY_ENTITY)
+        self.assertEqual(list(history['quick_ratio']),
+                         ['Q1 2023', 'Q2 2023', 'Q3 2023', 'Q4 2023'])
+        self.assertEqual(history['quick_ratio']['Q4 2023'], 1.23)
+        self.assertEqual(self.store.records(), 5)
+
+    def test_period_without_a_year_stops_before_the_update(self):
+        self.backend.workbook[FIN_RATIOS]['E3'] = 'Q4'
+        self.backend.write_cells = mock.Mock()
+        with self.assertRaisesRegex(ValueError, "Cell E3 .*'Q4'"):
+            run.update_ratios_googlews(ratios(1.0))
+        self.backend.write_cells.assert_not_called()
+        self.assertEqual(self.store.records(), 0)
+
+    def test_unlabelled_history_column_stops_before_the_update(self):
+        self.backend.workbook[FIN_RATIOS]['C3'] = ''
+        self.backend.write_cells = mock.Mock()
+        with self.assertRaisesRegex(ValueError, "Cell C3"):
+            run.update_ratios_googlews(ratios(1.0))
+        self.backend.write_cells.assert_not_called()
+
+    def test_nothing_is_recorded_when_the_update_fails(self):
+        self.backend.write_cells = mock.Mock(side_effect=OSError)
+        with self.assertRaises(OSError):
+            run.update_ratios_googlews(ratios(1.0))
+        self.assertEqual(self.store.records(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
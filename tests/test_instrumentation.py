@@ -0,0 +1,158 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import scheduler
+from instrumentation import (
+    InstrumentedBackend, Instrumentation, payload_size, peak_in_window
+)
+from scheduler import RequestScheduler
+from storage import BENCHMARKS, MemoryBackend
+
+
+class FailingBackend(MemoryBackend):
+    """Memory backend whose writes are retried twice and then fail"""
+
+    def __init__(self, session):
+        super().__init__()
+        self.session = session
+
+    def write_cells(self, updates):
+        self.session.note_retry()
+        self.session.note_retry()
+        raise OSError("offline")
+
+
+class ScheduledBackend(MemoryBackend):
+    """Memory backend whose reads go through a request scheduler"""
+
+    schedules_requests = True
+
+    def __init__(self):
+        super().__init__()
+        self.scheduler = RequestScheduler(
+            self.batch_get, None, FreeBucket(), window=0.05)
+
+    def batch_get(self, ranges):
+        return [super(ScheduledBackend, self).read_range(*key)
+                for key in ranges]
+
+    def read_range(self, worksheet, cell_range):
+        return self.scheduler.read(worksheet, cell_range)
+
+
+class FreeBucket:
+    """Token bucket that never waits"""
+
+    def acquire(self):
+        pass
+
+
+class InstrumentedBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Instrumentation()
+        self.backend = InstrumentedBackend(MemoryBackend(), self.session)
+
+    def test_calls_are_recorded_with_their_payload(self):
+        rows = self.backend.read_range(BENCHMARKS, 'A1:B9')
+        self.backend.write_cells([(BENCHMARKS, 'B4', '1.60')])
+        read, write = self.session.calls
+        self.assertEqual(
+            (read['operation'], read['worksheet'], read['range']),
+            ('read_range', BENCHMARKS, 'A1:B9'))
+        self.assertEqual(read['payload_bytes'], payload_size(rows))
+        self.assertEqual((write['operation'], write['range']),
+                         ('write_cells', 'B4'))
+        summary = self.session.summary()
+        self.assertEqual(summary['api']['read_range']['calls'], 1)
+        self.assertEqual(summary['quota']['read']['units'], 1)
+        self.assertEqual(summary['quota']['write']['units'], 1)
+
+    def test_errors_and_retries(self):
+        backend = InstrumentedBackend(
+            FailingBackend(self.session), self.session)
+        with self.assertRaises(OSError):
+            backend.write_cells([(BENCHMARKS, 'B4', '1.60')])
+        call, = self.session.calls
+        self.assertEqual(call['error'], 'OSError')
+        self.assertEqual(call['retries'], 2)
+        self.assertEqual(call['quota_units'], 3)
+        api = self.session.summary()['api']['write_cells']
+        self.assertEqual((api['errors'], api['retries']), (1, 2))
+
+    def test_merged_reads_use_one_unit(self):
+        patcher = mock.patch.object(
+            scheduler, 'note_request', self.session.note_request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        backend = InstrumentedBackend(ScheduledBackend(), self.session)
+        threads = [
+            threading.Thread(target=backend.read_range,
+                             args=(BENCHMARKS, cell_range))
+            for cell_range in ('A1:B4', 'A5:B9', 'A1:B4')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        summary = self.session.summary()
+        self.assertEqual(summary['api']['read_range']['calls'], 3)
+        self.assertEqual(summary['quota']['read']['units'], 1)
+        self.assertEqual(
+            sorted(call['quota_units'] for call in self.session.calls),
+            [0, 0, 1])
+
+    def test_other_attributes_come_from_the_backend(self):
+        self.assertIs(self.backend.workbook, self.backend.backend.workbook)
+
+
+class InstrumentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = Instrumentation()
+
+    def test_spans(self):
+        for _ in range(2):
+            with self.session.span('update_ratios'):
+                pass
+        totals = self.session.summary()['spans']['update_ratios']
+        self.assertEqual(totals['count'], 2)
+
+    def test_keep_last(self):
+        self.session.keep_last(3)
+        for index in range(5):
+            with self.session.span(f"step {index}"):
+                pass
+        self.assertEqual([span['name'] for span in self.session.spans],
+                         ['step 2', 'step 3', 'step 4'])
+
+    def test_peak_in_window(self):
+        events = [(0, 1), (30, 2), (59, 1), (61, 1), (200, 5)]
+        self.assertEqual(peak_in_window(events, 60), 5)
+        self.assertEqual(peak_in_window([], 60), 0)
+
+    def test_exports(self):
+        with self.session.api_call('read_range', BENCHMARKS, 'A1:B9'):
+            pass
+        with self.session.span('menu'):
+            pass
+        metrics = self.session.to_prometheus()
+        self.assertIn('fin_api_calls_total{operation="read_range"} 1',
+                      metrics)
+        self.assertIn('fin_span_count_total{span="menu"} 1', metrics)
+        trace = json.loads(self.session.to_chrome_trace())
+        self.assertEqual(
+            sorted(event['name'] for event in trace['traceEvents']
+                   if event['ph'] == 'X'),
+            ['menu', 'read_range'])
+        with tempfile.TemporaryDirectory() as directory:
+            paths = self.session.export(directory)
+            self.assertEqual(len(paths), 3)
+            self.assertTrue(all(os.path.exists(path) for path in paths))
+
+
+if __name__ == '__main__':
+    unittest.main()
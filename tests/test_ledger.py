@@ -0,0 +1,90 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from ledger import LedgerAggregator, ingest, period_label, read_ledger
+
+# Journal lines as (date, account, debit, credit)
+JOURNAL = [
+    ('2023-01-15', 'Sales', '', '1,200.50'),
+    ('2023-01-20', 'Cash', '1200.50', ''),
+    ('2023-02-03', 'Wages', '300', ''),
+    ('2023-02-03', 'Bank', '', '300'),
+    ('2023-04-10', 'Inventory', '500', ''),
+    ('2023-04-10', 'Trade Creditors', '', '500'),
+    ('2023-05-01', 'Suspense', '42', ''),
+]
+
+
+class LedgerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write_csv(self, name, rows):
+        with open(self.path(name), 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(('date', 'account', 'debit', 'credit'))
+            writer.writerows(rows)
+        return self.path(name)
+
+    def write_jsonl(self, name, lines):
+        with open(self.path(name), 'w') as jsonl_file:
+            for line in lines:
+                jsonl_file.write(json.dumps(line) + '\n\n')
+        return self.path(name)
+
+    def test_csv_and_jsonl_debit_credit_give_the_same_totals(self):
+        csv_path = self.write_csv('ledger.csv', JOURNAL)
+        jsonl_path = self.write_jsonl('ledger.jsonl', [
+            dict(zip(('date', 'account', 'debit', 'credit'), row))
+            for row in JOURNAL
+        ])
+        from_csv = ingest(csv_path, chunk_size=3)
+        from_jsonl = ingest(jsonl_path, chunk_size=3)
+        np.testing.assert_allclose(from_jsonl.totals, from_csv.totals)
+        self.assertEqual(from_jsonl.unmapped, from_csv.unmapped)
+        self.assertEqual(from_csv.lines, len(JOURNAL))
+        self.assertNotEqual(np.abs(from_csv.totals).sum(), 0)
+
+    def test_jsonl_amounts_and_debit_credit_lines_can_be_mixed(self):
+        path = self.write_jsonl('ledger.jsonl', [
+            {'date': '2023-01-15', 'account': 'Sales', 'amount': -100},
+            {'date': '2023-01-15', 'account': 'Sales', 'credit': '50'},
+        ])
+        _, _, amounts = next(read_ledger(path))
+        np.testing.assert_allclose(amounts, [-100, -50])
+
+    def test_csv_without_amount_columns_is_rejected(self):
+        path = self.path('ledger.csv')
+        with open(path, 'w') as csv_file:
+            csv_file.write('date,account\n2023-01-01,Sales\n')
+        with self.assertRaises(ValueError):
+            next(read_ledger(path))
+
+    def test_statements_per_quarter(self):
+        aggregator = ingest(self.write_csv('ledger.csv', JOURNAL))
+        periods, workbook = aggregator.statements()
+        self.assertEqual(periods, ['Q1 2023', 'Q2 2023'])
+        self.assertEqual(aggregator.unmapped, {'Suspense': 42.0})
+        ratios = aggregator.ratios('entity')
+        self.assertEqual(ratios.shape, (1, 2))
+
+    def test_unknown_line_item_in_mapping_is_rejected(self):
+        with self.assertRaises(ValueError):
+            LedgerAggregator({'misc': 'Not A Line Item'})
+
+    def test_period_labels(self):
+        self.assertEqual(period_label(4 * 53 + 3, 'quarter'), 'Q4 2023')
+        self.assertEqual(period_label(12 * 53, 'month'), '2023-01')
+        self.assertEqual(period_label(53, 'year'), '2023')
+
+
+if __name__ == '__main__':
+    unittest.main()
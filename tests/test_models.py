@@ -0,0 +1,98 @@
+import math
+import unittest
+import numpy as np
+from models import (
+    RatioFrame, RatioSet, Statement, StatementFrame, accepts_ratio_set,
+    history_values
+)
+from ratio_engine import LINE_ITEMS, RATIO_NAMES
+
+STATEMENT = Statement(
+    current_assets=80000, current_liabilities=40000, inventory=20000,
+    net_income=15000, sales_revenue=150000, total_assets=200000,
+    total_liabilities=40000, total_equity=160000, operating_income=30000,
+    interest_expense=6000)
+
+
+class RecordTest(unittest.TestCase):
+
+    def test_fields_by_attribute_and_name(self):
+        ratios = RatioSet(1.5, 1.1, 10, 5, 0.4, 6)
+        self.assertEqual(ratios.quick_ratio, 1.1)
+        self.assertEqual(ratios['interest_cover'], 6.0)
+        self.assertEqual(list(ratios.keys()), list(RATIO_NAMES))
+        self.assertEqual(RatioSet.from_dict(ratios.to_dict()), ratios)
+        self.assertFalse(hasattr(ratios, '__dict__'))
+
+    def test_missing_fields_are_nan(self):
+        self.assertTrue(math.isnan(RatioSet(current_ratio=1).quick_ratio))
+
+    def test_unknown_fields_are_rejected(self):
+        with self.assertRaises(TypeError):
+            RatioSet(current_ratio=1, margin=2)
+        with self.assertRaises(TypeError):
+            RatioSet(*range(7))
+        with self.assertRaises(KeyError):
+            RatioSet()['margin']
+
+    def test_ratios_of_a_statement(self):
+        ratios = STATEMENT.ratios()
+        self.assertEqual(ratios.current_ratio, 2.0)
+        self.assertEqual(ratios.quick_ratio, 1.5)
+        self.assertEqual(ratios.net_profit_margin, 10.0)
+        self.assertEqual(ratios.interest_cover, 5.0)
+
+    def test_zero_denominator_is_nan(self):
+        values = STATEMENT.to_dict()
+        values['sales_revenue'] = 0
+        self.assertTrue(
+            math.isnan(Statement(**values).ratios().net_profit_margin))
+
+
+class AcceptsRatioSetTest(unittest.TestCase):
+
+    def test_ratio_set_is_expanded_at_its_position(self):
+        @accepts_ratio_set(position=1)
+        def collect(first, *ratios, last=None):
+            return first, ratios, last
+
+        ratios = RatioSet(*range(6))
+        self.assertEqual(collect('a', ratios, last='z'),
+                         ('a', tuple(map(float, range(6))), 'z'))
+        self.assertEqual(collect('a', 1, 2), ('a', (1, 2), None))
+
+
+class FrameTest(unittest.TestCase):
+
+    def test_records_round_trip(self):
+        frame = StatementFrame.from_records({
+            ('acme', 'Q1'): STATEMENT, ('acme', 'Q2'): STATEMENT,
+            ('beta', 'Q1'): STATEMENT.to_dict()})
+        self.assertEqual(frame.shape, (2, 2))
+        self.assertEqual(frame.get('beta', 'Q1'), STATEMENT)
+        self.assertTrue(np.isnan(frame['inventory'][1, 1]))
+        self.assertEqual(frame.nbytes, 2 * 2 * len(LINE_ITEMS) * 8)
+
+    def test_ratios_of_every_entity_and_period(self):
+        statements = StatementFrame.from_records({
+            ('acme', 'Q1'): STATEMENT, ('beta', 'Q1'): STATEMENT})
+        ratios = RatioFrame.from_statements(statements)
+        self.assertEqual(ratios.get('beta', 'Q1'), STATEMENT.ratios())
+
+    def test_history_round_trip(self):
+        history = {name: {'Q1 2023': index, 'Q2 2023': index + 0.5}
+                   for index, name in enumerate(RATIO_NAMES)}
+        frame = RatioFrame.from_history(history, 'acme')
+        self.assertEqual(frame.to_history('acme'), history)
+        names, periods, values = history_values(frame)
+        self.assertEqual(names, list(RATIO_NAMES))
+        self.assertEqual(periods, ['Q1 2023', 'Q2 2023'])
+        np.testing.assert_array_equal(values, history_values(history)[2])
+
+    def test_history_values_of_no_history(self):
+        names, periods, values = history_values({})
+        self.assertEqual((names, periods, values.shape), ([], [], (0, 0)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import contextlib
+import io
+import unittest
+import numpy as np
+from batch import INPUT_ACCOUNTS
+from monte_carlo import (
+    HISTOGRAM_BINS, SimulationModel, histogram_edges, histogram_percentiles,
+    item_cell, main, run_simulation, simulate_chunk
+)
+from ratio_engine import RATIO_NAMES
+from scenarios import ScenarioEngine
+from storage import BALANCE_SHEET, PROFIT_AND_LOSS
+from tests import WorkbookTestCase
+
+
+class SimulationTest(WorkbookTestCase):
+
+    def test_same_seed_gives_the_same_results_for_any_workers(self):
+        model = SimulationModel()
+        single = run_simulation(model, 5000, seed=7, workers=1,
+                                chunk_size=1000)
+        pooled = run_simulation(model, 5000, seed=7, workers=2,
+                                chunk_size=1000)
+        self.assertEqual(single, pooled)
+        self.assertNotEqual(
+            run_simulation(model, 5000, seed=8, workers=1,
+                           chunk_size=1000)['mean'],
+            single['mean'])
+
+    def test_chunks_do_not_grow_with_the_draws(self):
+        model = SimulationModel()
+        edges = histogram_edges(model, 1)
+        small, large = (simulate_chunk(model, 2, size, edges)
+                        for size in (10, 100000))
+        for name in RATIO_NAMES:
+            self.assertEqual(small[name]['histogram'].shape,
+                             large[name]['histogram'].shape)
+            self.assertEqual(large[name]['histogram'].sum(), 100000)
+
+    def test_no_draws_are_rejected(self):
+        with self.assertRaisesRegex(ValueError, "must be positive"):
+            run_simulation(SimulationModel(), 0, workers=1)
+        with contextlib.redirect_stderr(io.StringIO()), \
+                self.assertRaises(SystemExit):
+            main(['--draws', '0'])
+
+    def test_certain_items_give_the_workbook_ratios(self):
+        model = SimulationModel(
+            items={name: {'sd': 0} for name in INPUT_ACCOUNTS})
+        summary = run_simulation(model, 100, seed=1, workers=1)
+        ratios = ScenarioEngine().evaluate({})
+        for name in RATIO_NAMES:
+            self.assertAlmostEqual(
+                summary['percentiles'][name]['p50'], float(ratios[name]),
+                places=4)
+            self.assertEqual(max(summary['categories'][name].values()), 1.0)
+
+    def test_lognormal_items_keep_their_mean(self):
+        model = SimulationModel(items={'Sales Revenue': {
+            'distribution': 'lognormal', 'mean': 150000, 'sd': 0.2}})
+        values = model.draw(np.random.default_rng(3), 200000)
+        index = model.cells.index(item_cell('Sales Revenue'))
+        self.assertAlmostEqual(values[index].mean() / 150000, 1, places=2)
+        self.assertTrue((values[index] > 0).all())
+
+    def test_correlated_draws(self):
+        model = SimulationModel(correlations=[
+            ('Sales Revenue', 'Purchased Inventory', 0.8)])
+        values = model.draw(np.random.default_rng(5), 100000)
+        first = model.cells.index(item_cell('Sales Revenue'))
+        second = model.cells.index(item_cell('Purchased Inventory'))
+        self.assertAlmostEqual(
+            np.corrcoef(values[first], values[second])[0, 1], 0.8,
+            places=2)
+
+    def test_invalid_models_are_rejected(self):
+        for arguments, message in (
+                ({'items': {'Rent': {'distribution': 'uniform'}}},
+                 "distribution must be one of"),
+                ({'items': {'Rent': {'distribution': 'lognormal',
+                                     'mean': 0}}},
+                 "must be > 0"),
+                ({'correlations': [('Rent', 'Sales Revenue', 2)]},
+                 "not a valid correlation matrix")):
+            with self.subTest(message=message):
+                with self.assertRaisesRegex(ValueError, message):
+                    SimulationModel(**arguments)
+
+
+class ItemCellTest(unittest.TestCase):
+
+    def test_accounts_and_cells(self):
+        self.assertEqual(item_cell('Sales Revenue'), (PROFIT_AND_LOSS, 'B5'))
+        self.assertEqual(item_cell(f"{BALANCE_SHEET}!B6"),
+                         (BALANCE_SHEET, 'B6'))
+
+    def test_unknown_items_and_totals(self):
+        with self.assertRaisesRegex(ValueError, "Unknown line item"):
+            item_cell('Goodwill')
+        with self.assertRaisesRegex(ValueError, "calculated total"):
+            item_cell(f"{BALANCE_SHEET}!B13")
+
+
+class HistogramPercentilesTest(unittest.TestCase):
+
+    def percentiles(self, values, edges, percentiles):
+        counts = np.bincount(
+            np.searchsorted(edges, values, side='right'),
+            minlength=len(edges) + 1)
+        return histogram_percentiles(
+            counts, edges, values.min(), values.max(), percentiles)
+
+    def test_within_a_bin_of_numpy(self):
+        values = np.random.default_rng(2).normal(size=100001)
+        edges = np.linspace(-5, 5, HISTOGRAM_BINS + 1)
+        percentiles = (1, 5, 25, 50, 75, 95, 99)
+        np.testing.assert_allclose(
+            self.percentiles(values, edges, percentiles),
+            np.percentile(values, percentiles), atol=10 / HISTOGRAM_BINS)
+
+    def test_extremes_and_a_single_value(self):
+        values = np.array([-5.0, 0.5, 9.0])
+        edges = np.linspace(0, 1, 11)
+        self.assertEqual(self.percentiles(values, edges, (0, 100)),
+                         [-5.0, 9.0])
+        self.assertEqual(
+            self.percentiles(np.array([4.0]), edges, (1, 99)), [4.0, 4.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import math
+import unittest
+from unittest import mock
+import numpy as np
+import run
+from commentary import INDUSTRY
+from models import RatioSet
+from peers import MIN_PEERS, PeerIndex, size_band
+from ratio_engine import RATIO_NAMES
+
+
+def peer_index(bands):
+    """
+    Index of MIN_PEERS peers per size band whose ratios are 1 to
+    MIN_PEERS, plus 100 in the large band, so that bands differ
+    """
+    industries, size_bands, values = [], [], []
+    for band, offset in bands.items():
+        industries += [INDUSTRY] * MIN_PEERS
+        size_bands += [band] * MIN_PEERS
+        values += [value + offset for value in range(1, MIN_PEERS + 1)]
+    return PeerIndex(industries, size_bands, {
+        name: values for name in RATIO_NAMES
+    })
+
+
+class SizeBandTest(unittest.TestCase):
+
+    def test_band_edges(self):
+        self.assertEqual(
+            size_band([999_999, 1_000_000, 9_999_999, 10_000_000]).tolist(),
+            ['small', 'medium', 'medium', 'large'])
+
+    def test_unknown_revenue_has_no_band(self):
+        self.assertIsNone(size_band(float('nan')).item())
+
+
+class PeerRankTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = peer_index({'small': 0})
+
+    def rank(self, *values):
+        return self.index.rank(
+            {name: np.array(values) for name in RATIO_NAMES},
+            INDUSTRY, 'small')['quick_ratio']
+
+    def test_percentile_at_the_ends(self):
+        ranking = self.rank(0.5, 1.0, 20.0, 21.0)
+        self.assertEqual(ranking['percentile'].tolist(),
+                         [0.0, 2.5, 97.5, 100.0])
+        self.assertEqual(ranking['quartile'].tolist(), [1, 1, 4, 4])
+
+    def test_quartile_edges_belong_to_the_lower_quartile(self):
+        ranking = self.rank(5.5, 10.5, 15.5)
+        self.assertEqual(ranking['percentile'].tolist(), [25.0, 50.0, 75.0])
+        self.assertEqual(ranking['quartile'].tolist(), [1, 2, 3])
+
+    def test_just_above_a_quartile_edge(self):
+        ranking = self.rank(6.0, 11.0, 16.0)
+        self.assertEqual(ranking['quartile'].tolist(), [2, 3, 4])
+
+    def test_missing_value_is_not_ranked(self):
+        ranking = self.rank(float('nan'))
+        self.assertTrue(np.isnan(ranking['percentile'][0]))
+        self.assertTrue(np.isnan(ranking['quartile'][0]))
+        self.assertEqual(ranking['peers'][0], MIN_PEERS)
+
+    def test_small_band_falls_back_to_the_industry(self):
+        index = PeerIndex(
+            [INDUSTRY] * 2, ['small', 'large'],
+            {name: [1.0, 3.0] for name in RATIO_NAMES})
+        ranking = index.rank(
+            {name: np.array([2.0]) for name in RATIO_NAMES},
+            INDUSTRY, 'large')['quick_ratio']
+        self.assertEqual(ranking['peers'][0], 2)
+        self.assertEqual(ranking['percentile'][0], 50.0)
+
+
+class PeerRankingTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            run, 'get_peer_index',
+            lambda: peer_index({'small': 0, 'large': 100}))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # The statements of the run module must not be read
+        patcher = mock.patch.object(run, 'get_graph', mock.Mock(
+            side_effect=AssertionError("get_graph was called")))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ratios = RatioSet(*[20.5] * len(RATIO_NAMES))
+
+    def test_band_of_the_given_revenue(self):
+        small = run.peer_ranking(self.ratios, 500_000)['quick_ratio']
+        large = run.peer_ranking(self.ratios, 50_000_000)['quick_ratio']
+        self.assertEqual(small['percentile'], 100.0)
+        self.assertEqual(large['percentile'], 0.0)
+
+    def test_whole_industry_without_revenue(self):
+        ranking = run.peer_ranking(self.ratios)['quick_ratio']
+        self.assertEqual(ranking['peers'], 2 * MIN_PEERS)
+        self.assertEqual(ranking['percentile'], 50.0)
+
+    def test_benchmark_comparison_passes_the_revenue_down(self):
+        report = run.compare_with_benchmarks(
+            self.ratios, self.ratios, sales_revenue=50_000_000)
+        peers = report.data['benchmark_comparison']['Quick Ratio']['peers']
+        self.assertEqual(peers['percentile'], 0.0)
+        self.assertFalse(math.isnan(peers['median']))
+
+
+if __name__ == '__main__':
+    unittest.main()
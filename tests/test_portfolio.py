@@ -0,0 +1,46 @@
+import json
+import unittest
+from portfolio import analyse_workbook, fetch_workbook, run_portfolio
+from storage import PROFIT_AND_LOSS, MemoryBackend
+
+
+def workbook_backend(spreadsheet_id):
+    """In-memory workbook of each id, with no sales for 'no-sales'"""
+    if spreadsheet_id == 'missing':
+        raise LookupError(f"No spreadsheet {spreadsheet_id}")
+    backend = MemoryBackend()
+    if spreadsheet_id == 'no-sales':
+        backend.write_cells([(PROFIT_AND_LOSS, 'B5', 0)])
+    return backend
+
+
+class PortfolioTest(unittest.TestCase):
+
+    def test_zero_denominator_gives_none(self):
+        result = analyse_workbook(
+            'no-sales', fetch_workbook(workbook_backend('no-sales')))
+        self.assertEqual(result['status'], 'ok')
+        self.assertIsNone(result['ratios']['net_profit_margin'])
+        self.assertIsNone(
+            result['benchmarks']['net_profit_margin']['position'])
+        self.assertIsInstance(result['ratios']['current_ratio'], float)
+        json.dumps(result, allow_nan=False)
+
+    def test_results_in_the_order_of_the_ids(self):
+        results = run_portfolio(
+            ['no-sales', 'missing', 'default'], fetch_workers=2,
+            process_workers=2, backend_factory=workbook_backend)
+        self.assertEqual(
+            [result['spreadsheet_id'] for result in results],
+            ['no-sales', 'missing', 'default'])
+        self.assertEqual(
+            [result['status'] for result in results], ['ok', 'error', 'ok'])
+        self.assertIn('fetch: LookupError', results[1]['error'])
+        self.assertEqual(
+            results[2],
+            analyse_workbook(
+                'default', fetch_workbook(workbook_backend('default'))))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import threading
+import unittest
+import run
+from storage import BENCHMARKS, MemoryBackend
+from tests import WorkbookTestCase
+
+
+class CountingBackend(MemoryBackend):
+    """Memory backend counting its reads, optionally held until released"""
+
+    def __init__(self):
+        super().__init__()
+        self.reads = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def read_range(self, worksheet, cell_range):
+        self.release.wait(5)
+        self.reads.append(worksheet)
+        return super().read_range(worksheet, cell_range)
+
+
+class PrefetchTest(WorkbookTestCase):
+
+    def create_backend(self):
+        return CountingBackend()
+
+    def test_each_tab_is_read_once(self):
+        run.prefetch()
+        for _ in range(2):
+            for worksheet in run.SNAPSHOT_RANGES:
+                run.get_snapshot(worksheet)
+        self.assertEqual(sorted(self.backend.reads),
+                         sorted(run.SNAPSHOT_RANGES))
+
+    def test_lookup_waits_for_the_prefetch(self):
+        self.backend.release.clear()
+        run.prefetch(BENCHMARKS)
+        timer = threading.Timer(0.05, self.backend.release.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        rows = run.get_snapshot(BENCHMARKS)
+        self.assertEqual(rows, MemoryBackend().read_range(
+            BENCHMARKS, run.SNAPSHOT_RANGES[BENCHMARKS]))
+        self.assertEqual(self.backend.reads, [BENCHMARKS])
+
+    def test_read_started_before_an_update_is_not_cached(self):
+        self.backend.release.clear()
+        run.prefetch(BENCHMARKS)
+        run.invalidate_snapshot(BENCHMARKS)
+        self.backend.write_cells([(BENCHMARKS, 'B4', 9)])
+        self.backend.release.set()
+        rows = run.get_snapshot(BENCHMARKS)
+        self.assertEqual(run.cell_value(rows, 'B4'), 9.0)
+        run.get_snapshot(BENCHMARKS)
+        self.assertEqual(run.cache_stats, {'hits': 1, 'misses': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
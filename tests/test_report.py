@@ -0,0 +1,98 @@
+import io
+import json
+import math
+import unittest
+import numpy as np
+from report import (
+    HtmlRenderer, JsonRenderer, PlainTextRenderer, Report, TerminalRenderer,
+    finite_or_none, get_renderer
+)
+
+
+def sample_report():
+    report = Report("Report <ABC>")
+    report.heading("Ratios:")
+    report.rule()
+    report.note("A ratio compares two numbers.")
+    report.text("\tThe current ratio is 1.50 & rising.")
+    report.warning("Check the cash.")
+    report.data['ratio'] = math.inf
+    return report
+
+
+class FiniteOrNoneTest(unittest.TestCase):
+
+    def test_numbers(self):
+        self.assertEqual(finite_or_none(1.5), 1.5)
+        self.assertEqual(finite_or_none(3), 3)
+        self.assertIsNone(finite_or_none(math.nan))
+        self.assertIsNone(finite_or_none(-math.inf))
+
+    def test_numpy_numbers_become_floats(self):
+        value = finite_or_none(np.float64(2.5))
+        self.assertIs(type(value), float)
+        self.assertEqual(value, 2.5)
+        self.assertIsNone(finite_or_none(np.float64(np.inf)))
+        self.assertEqual(finite_or_none(np.array(4.0)), 4.0)
+
+    def test_masked_values(self):
+        self.assertIsNone(finite_or_none(np.ma.masked))
+        self.assertIsNone(finite_or_none(np.ma.masked_array(1.0, mask=True)))
+        self.assertEqual(
+            finite_or_none(np.ma.masked_array(1.0, mask=False)), 1.0)
+
+    def test_containers(self):
+        self.assertEqual(
+            finite_or_none({'a': [math.nan, 'text', None], 'b': (1.0,)}),
+            {'a': [None, 'text', None], 'b': [1.0]})
+
+
+class RendererTest(unittest.TestCase):
+
+    def test_plain_text(self):
+        self.assertEqual(PlainTextRenderer().to_text(sample_report()), (
+            "\nRatios:\n\n-------------------------------\n"
+            "A ratio compares two numbers.\n"
+            "\tThe current ratio is 1.50 & rising.\nCheck the cash.\n"))
+
+    def test_json_leaves_out_rules_and_non_finite_data(self):
+        content = json.loads(JsonRenderer().to_json(sample_report()))
+        self.assertEqual(content['title'], "Report <ABC>")
+        self.assertEqual(
+            [line['style'] for line in content['lines']],
+            ['heading', 'note', 'text', 'warning'])
+        self.assertEqual(content['lines'][2]['text'],
+                         "The current ratio is 1.50 & rising.")
+        self.assertEqual(content['data'], {'ratio': None})
+
+    def test_html_is_escaped(self):
+        page = HtmlRenderer().to_html(sample_report())
+        self.assertIn("<h1>Report &lt;ABC&gt;</h1>", page)
+        self.assertIn(
+            '<p class="text">The current ratio is 1.50 &amp; rising.</p>',
+            page)
+        self.assertIn("<hr>", page)
+
+    def test_terminal_without_delay(self):
+        stream = io.StringIO()
+        TerminalRenderer(delay=0, pause=0, stream=stream).render(
+            sample_report())
+        self.assertIn("\tThe current ratio is 1.50 & rising.\n",
+                      stream.getvalue())
+
+    def test_renderer_by_name(self):
+        self.assertIsInstance(get_renderer('html'), HtmlRenderer)
+        with self.assertRaisesRegex(ValueError, "Unknown report format"):
+            get_renderer('pdf')
+
+    def test_extend_adds_lines_and_data(self):
+        report = Report().text("first")
+        report.data['a'] = 1
+        report.extend(sample_report())
+        self.assertEqual(report.lines[0], ('text', "first"))
+        self.assertEqual(len(report.lines), 6)
+        self.assertEqual(set(report.data), {'a', 'ratio'})
+
+
+if __name__ == '__main__':
+    unittest.main()
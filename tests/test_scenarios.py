@@ -0,0 +1,81 @@
+import unittest
+import numpy as np
+import run
+from batch import INPUT_ACCOUNTS
+from calculator import CalculationGraph
+from ratio_engine import RATIO_NAMES
+from scenarios import ScenarioEngine, account_grid, account_sample
+from tests import WorkbookTestCase
+
+GRID_ACCOUNTS = ('Sales Revenue', 'Rent', 'Cash and Cash Equivalents')
+
+
+class ScenarioEngineTest(WorkbookTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.engine = ScenarioEngine()
+
+    def test_scenario_matches_the_calculation_graph(self):
+        values = {'Sales Revenue': 120000, 'Cash and Cash Equivalents': 25000}
+        ratios = self.engine.evaluate(values)
+        graph = CalculationGraph()
+        graph.load({
+            worksheet: run.get_snapshot(worksheet)
+            for worksheet in run.STATEMENTS
+        })
+        for name, value in values.items():
+            worksheet, cell, _, _ = INPUT_ACCOUNTS[name]
+            graph.set(worksheet, cell, value)
+        for name in RATIO_NAMES:
+            self.assertAlmostEqual(float(ratios[name]), graph.ratio(name))
+
+    def test_grid_matches_the_sample_of_its_combinations(self):
+        grid = account_grid(5, GRID_ACCOUNTS)
+        result = self.engine.sweep_grid(grid, chunk=7)
+        combinations = np.meshgrid(*grid.values(), indexing='ij')
+        sample = self.engine.sweep({
+            name: values.ravel()
+            for name, values in zip(grid, combinations)
+        })
+        for name in RATIO_NAMES:
+            self.assertEqual(result['codes'][name].shape, (5, 5, 5))
+            np.testing.assert_array_equal(
+                result['ratios'][name].ravel(), sample['ratios'][name])
+            np.testing.assert_array_equal(
+                result['codes'][name].ravel(), sample['codes'][name])
+
+    def test_category_shares(self):
+        result = self.engine.sweep(account_sample(200, seed=1))
+        shares = self.engine.category_shares(result['codes'])
+        for name, categories in shares.items():
+            self.assertEqual(list(categories),
+                             list(self.engine.classifier.names[name]))
+            self.assertAlmostEqual(sum(categories.values()), 1.0)
+
+    def test_samples_are_within_the_valid_ranges(self):
+        sample = account_sample(500, seed=3)
+        for name, (_, _, minimum, maximum) in INPUT_ACCOUNTS.items():
+            self.assertTrue(minimum <= sample[name].min())
+            self.assertTrue(sample[name].max() <= maximum)
+        np.testing.assert_array_equal(
+            sample['Rent'], account_sample(500, seed=3)['Rent'])
+
+    def test_breakpoints_separate_their_categories(self):
+        breakpoints = self.engine.breakpoints()
+        self.assertTrue(breakpoints)
+        for breakpoint in breakpoints:
+            with self.subTest(breakpoint['description']):
+                name = breakpoint['ratio']
+                ratios = self.engine.evaluate({breakpoint['account']: [
+                    breakpoint['value'] - 50, breakpoint['value'] + 50]})
+                categories = self.engine.classifier.categories(
+                    self.engine.classifier.classify(ratios))[name]
+                self.assertEqual(
+                    set(categories),
+                    {breakpoint['category_below'],
+                     breakpoint['category_above']})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import threading
+import unittest
+from unittest import mock
+from gspread.exceptions import APIError
+import scheduler
+from scheduler import RequestScheduler, TokenBucket, coalesce, retry_delay
+
+
+def api_error(code, retry_after=''):
+    """APIError of a response with the status code"""
+    response = mock.Mock()
+    response.json.return_value = {
+        'error': {'code': code, 'message': 'error', 'status': 'ERROR'}}
+    response.headers = {'Retry-After': retry_after} if retry_after else {}
+    return APIError(response)
+
+
+class FreeBucket:
+    """Token bucket that never waits"""
+
+    def acquire(self):
+        pass
+
+
+class CoalesceTest(unittest.TestCase):
+
+    def test_adjacent_rows_of_a_column(self):
+        self.assertEqual(
+            coalesce([('pl', 'B7'), ('pl', 'B5'), ('pl', 'B6'),
+                      ('pl', 'B9'), ('pl', 'C6'), ('bs', 'B6'),
+                      ('pl', 'B5')]),
+            [('pl', 'B5:B7', ['B5', 'B6', 'B7']), ('pl', 'B9', ['B9']),
+             ('pl', 'C6', ['C6']), ('bs', 'B6', ['B6'])])
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_burst_then_the_rate(self):
+        now = [0.0]
+        sleeps = []
+        with mock.patch.object(scheduler.time, 'monotonic',
+                               lambda: now[0]), \
+                mock.patch.object(scheduler.time, 'sleep', sleeps.append):
+            bucket = TokenBucket(rate=2, capacity=3)
+            for _ in range(5):
+                bucket.acquire()
+            self.assertEqual(sleeps, [0.5, 1.0])
+            now[0] = 10.0
+            bucket.acquire()
+        self.assertEqual(sleeps, [0.5, 1.0])
+
+
+class RetryDelayTest(unittest.TestCase):
+
+    def test_errors_not_worth_retrying(self):
+        self.assertIsNone(retry_delay(api_error(400), 0))
+        self.assertIsNone(retry_delay(ValueError(), 0))
+
+    def test_retry_after_is_honoured(self):
+        self.assertEqual(retry_delay(api_error(429, '7'), 0), 7.0)
+
+    def test_jittered_exponential_backoff(self):
+        with mock.patch.object(scheduler.random, 'uniform',
+                               lambda low, high: high):
+            self.assertEqual(
+                [retry_delay(api_error(503), attempt)
+                 for attempt in range(7)],
+                [1, 2, 4, 8, 16, 32, 32])
+
+
+class RequestSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.gets = []
+        self.updates = []
+        self.scheduler = RequestScheduler(
+            self.batch_get, self.updates.append, FreeBucket(), window=0)
+
+    def batch_get(self, ranges):
+        self.gets.append(ranges)
+        return [
+            [[f"{worksheet}!{cell_range}"]] if ':' not in cell_range
+            else [[f"{worksheet}!{cell_range}#{row}"] for row in range(3)]
+            for worksheet, cell_range in ranges
+        ]
+
+    def test_adjacent_cells_are_read_as_one_range(self):
+        values = self.scheduler.read_many(
+            [('pl', 'B5'), ('pl', 'B6'), ('pl', 'B7'), ('pl', 'A1:B3')])
+        self.assertEqual(self.gets, [[('pl', 'A1:B3'), ('pl', 'B5:B7')]])
+        self.assertEqual(values[:3], [
+            [['pl!B5:B7#0']], [['pl!B5:B7#1']], [['pl!B5:B7#2']]])
+        self.assertEqual(self.scheduler.stats['coalesced'], 2)
+
+    def test_range_in_flight_is_not_read_again(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow_get(ranges):
+            started.set()
+            release.wait(5)
+            return self.batch_get(ranges)
+
+        self.scheduler.batch_get = slow_get
+        results = []
+        first = threading.Thread(target=lambda: results.append(
+            self.scheduler.read('pl', 'A1:B27')))
+        first.start()
+        started.wait(5)
+        second = threading.Thread(target=lambda: results.append(
+            self.scheduler.read('pl', 'A1:B27')))
+        second.start()
+        for _ in range(5000):
+            if self.scheduler.stats['deduplicated']:
+                break
+            second.join(0.001)
+        release.set()
+        first.join(5)
+        second.join(5)
+        self.assertEqual(len(self.gets), 1)
+        self.assertEqual(results[0], results[1])
+        self.assertEqual(self.scheduler.stats['deduplicated'], 1)
+
+    def test_writes_of_adjacent_cells_are_one_range(self):
+        self.scheduler.write([('fr', 'E5', '1.00'), ('fr', 'E6', '2.00'),
+                              ('fr', 'E8', '3.00')])
+        self.assertEqual(self.updates, [[
+            ('fr', 'E5:E6', [['1.00'], ['2.00']]), ('fr', 'E8', [['3.00']])
+        ]])
+
+    def test_rate_limited_requests_are_retried(self):
+        errors = [api_error(429), api_error(503)]
+
+        def flaky_get(ranges):
+            if errors:
+                raise errors.pop(0)
+            return self.batch_get(ranges)
+
+        self.scheduler.batch_get = flaky_get
+        with mock.patch.object(scheduler.time, 'sleep') as sleep, \
+                mock.patch.object(scheduler.random, 'uniform',
+                                  lambda low, high: high):
+            self.assertEqual(self.scheduler.read('pl', 'B5'), [['pl!B5']])
+        # The first sleep is the coalescing window
+        self.assertEqual(sleep.call_args_list,
+                         [mock.call(0), mock.call(1), mock.call(2)])
+        self.assertEqual(self.scheduler.stats,
+                         {'requests': 3, 'retries': 2, 'deduplicated': 0,
+                          'coalesced': 0})
+
+    def test_retries_give_up(self):
+        self.scheduler.batch_get = mock.Mock(side_effect=api_error(429))
+        with mock.patch.object(scheduler.time, 'sleep'), \
+                self.assertRaises(APIError):
+            self.scheduler.read('pl', 'B5')
+        self.assertEqual(self.scheduler.batch_get.call_count,
+                         scheduler.MAX_RETRIES + 1)
+        self.assertEqual(self.scheduler.in_flight, {})
+
+    def test_other_errors_are_not_retried(self):
+        self.scheduler.batch_update = mock.Mock(side_effect=api_error(400))
+        with self.assertRaises(APIError):
+            self.scheduler.write([('fr', 'E5', '1.00')])
+        self.assertEqual(self.scheduler.batch_update.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
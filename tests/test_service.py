@@ -0,0 +1,118 @@
+import http.client
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+import run
+import service
+from storage import PROFIT_AND_LOSS
+from tests import WorkbookTestCase
+
+
+class ServiceTestCase(WorkbookTestCase):
+    """Service on top of a memory backend"""
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(service.graph_state.update, snapshots=None,
+                        graph=None, refreshed_at=None)
+        service.graph_state.update(
+            snapshots=None, graph=None, refreshed_at=None)
+
+
+class ServiceRefreshTest(ServiceTestCase):
+
+    def edit_revenue(self, value):
+        """Change the sales revenue outside the service"""
+        self.backend.write_cells([(PROFIT_AND_LOSS, 'B5', value)])
+
+    def test_graph_is_shared_until_the_refresh(self):
+        graph = service.current_graph(clock=lambda: 0.0)
+        self.edit_revenue(999_999)
+        self.assertIs(service.current_graph(
+            clock=lambda: service.REFRESH_INTERVAL - 1), graph)
+
+    def test_refresh_reads_edits_made_elsewhere(self):
+        service.current_graph(clock=lambda: 0.0)
+        self.edit_revenue(999_999)
+        graph = service.current_graph(clock=lambda: service.REFRESH_INTERVAL)
+        self.assertEqual(graph.line_item('sales_revenue'), 999_999)
+
+    def test_refresh_drops_the_graph_of_the_run_module(self):
+        service.current_graph(clock=lambda: 0.0)
+        run.get_graph()
+        self.edit_revenue(999_999)
+        service.current_graph(clock=lambda: service.REFRESH_INTERVAL)
+        self.assertEqual(run.get_graph().line_item('sales_revenue'), 999_999)
+
+    def test_refresh_checks_the_revision_again(self):
+        self.backend.invalidate = mock.Mock()
+        service.current_graph(clock=lambda: 0.0)
+        self.backend.invalidate.assert_not_called()
+        service.current_graph(clock=lambda: service.REFRESH_INTERVAL)
+        self.backend.invalidate.assert_called_once_with()
+
+
+class AnalysisHandlerTest(ServiceTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server = service.create_server('127.0.0.1', 0)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def request(self, path, body=None):
+        """Send a request, returning the status and the JSON answer"""
+        host, port = self.server.server_address
+        request = urllib.request.Request(
+            f"http://{host}:{port}{path}",
+            data=None if body is None else body.encode('utf-8'))
+        try:
+            with urllib.request.urlopen(request, timeout=5) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as error:
+            with error:
+                return error.code, json.load(error)
+
+    def test_ratios_of_the_workbook(self):
+        status, content = self.request('/ratios/')
+        self.assertEqual(status, 200)
+        self.assertEqual(content['ratios'], run.calculate_ratios(
+            run.get_graph()).to_dict())
+
+    def test_unknown_endpoint(self):
+        self.assertEqual(self.request('/ratio'),
+                         (404, {'error': "Not found: GET /ratio"}))
+        self.assertEqual(self.request('/ratios', '{}')[0], 404)
+
+    def test_invalid_json(self):
+        status, content = self.request('/analyse', '{"Rent": ')
+        self.assertEqual(status, 400)
+        self.assertTrue(content['error'].startswith("Invalid JSON"))
+
+    def test_invalid_content_length(self):
+        host, port = self.server.server_address
+        for length in ('abc', '-5', str(service.MAX_BODY + 1)):
+            with self.subTest(length=length):
+                connection = http.client.HTTPConnection(host, port, timeout=5)
+                self.addCleanup(connection.close)
+                connection.putrequest('POST', '/analyse')
+                connection.putheader('Content-Length', length)
+                connection.endheaders()
+                response = connection.getresponse()
+                self.assertEqual(response.status, 400)
+                self.assertIn("Content-Length", json.load(response)['error'])
+
+    def test_invalid_input(self):
+        self.assertEqual(
+            self.request('/analyse', '["Rent"]'),
+            (422, {'error': "Send a JSON object or a list of objects."}))
+
+
+if __name__ == '__main__':
+    unittest.main()
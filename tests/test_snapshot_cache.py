@@ -0,0 +1,124 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import storage
+from storage import (
+    BENCHMARKS, PROFIT_AND_LOSS, MemoryBackend, SnapshotCacheBackend,
+    format_value, load_cached_token
+)
+
+
+class RevisedBackend(MemoryBackend):
+    """Memory backend whose revision changes on every edit"""
+
+    tracks_revisions = True
+
+    def __init__(self):
+        super().__init__()
+        self.edits = 0
+        self.reads = 0
+        self.checks = 0
+        self.tabs = []
+
+    def read_range(self, worksheet, cell_range):
+        self.reads += 1
+        self.tabs.append(worksheet)
+        return super().read_range(worksheet, cell_range)
+
+    def write_cells(self, updates):
+        super().write_cells(updates)
+        self.edits += 1
+
+    def revision(self):
+        self.checks += 1
+        return ('workbook', str(self.edits))
+
+
+class SnapshotCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache.db')
+        self.now = 0.0
+        self.backend = RevisedBackend()
+        self.cache = self.open_cache()
+
+    def open_cache(self):
+        """Open the cache file as a new session does"""
+        cache = SnapshotCacheBackend(
+            self.backend, self.path, revision_ttl=60,
+            clock=lambda: self.now)
+        self.addCleanup(cache.connection.close)
+        return cache
+
+    def read(self):
+        return self.cache.read_range(PROFIT_AND_LOSS, 'B4')
+
+    def edit_elsewhere(self, value):
+        """Edit the workbook without going through the cache"""
+        self.backend.write_cells([(PROFIT_AND_LOSS, 'B4', value)])
+
+    def test_unchanged_workbook_is_read_once(self):
+        first = self.read()
+        self.now = 30
+        self.assertEqual(self.read(), first)
+        self.assertEqual(self.backend.reads, 1)
+        self.assertEqual(self.backend.checks, 1)
+
+    def test_edit_by_someone_else_is_seen_after_the_ttl(self):
+        self.read()
+        self.edit_elsewhere(123456)
+        self.now = 59
+        self.assertNotEqual(self.read(), [[format_value(123456)]])
+        self.now = 60
+        self.assertEqual(self.read(), [[format_value(123456)]])
+        self.assertEqual(self.backend.checks, 2)
+
+    def test_own_write_checks_the_revision_again(self):
+        self.read()
+        self.cache.write_cells([(PROFIT_AND_LOSS, 'B4', 654321)])
+        self.assertEqual(self.read(), [[format_value(654321)]])
+
+    def test_own_writes_keep_the_other_tabs(self):
+        for _ in range(3):
+            cache = self.open_cache()
+            cache.read_ranges([(BENCHMARKS, 'A1:B9'),
+                               (PROFIT_AND_LOSS, 'A1:B27')])
+            cache.write_cells([(PROFIT_AND_LOSS, 'B4', 100000)])
+        self.assertEqual(self.backend.tabs.count(BENCHMARKS), 1)
+        self.assertEqual(self.backend.tabs.count(PROFIT_AND_LOSS), 3)
+
+    def test_written_tab_is_read_again_without_a_new_revision(self):
+        self.read()
+        self.backend.revision = lambda: ('workbook', '0')
+        self.cache.write_cells([(PROFIT_AND_LOSS, 'B4', 654321)])
+        self.assertEqual(self.read(), [[format_value(654321)]])
+
+    def test_invalidate_checks_the_revision_again(self):
+        self.read()
+        self.edit_elsewhere(111111)
+        self.cache.invalidate()
+        self.assertEqual(self.read(), [[format_value(111111)]])
+
+
+class TokenCacheTest(unittest.TestCase):
+
+    def test_malformed_cache_is_ignored(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'token.json')
+            for content in ('{"token": "abc"}', '[]', '{"token": "abc", '
+                            '"expiry": "tomorrow"}', '{'):
+                with self.subTest(content=content):
+                    with open(path, 'w') as token_file:
+                        token_file.write(content)
+                    creds = mock.Mock(token=None)
+                    with mock.patch.object(
+                            storage, 'TOKEN_CACHE_FILE', path):
+                        load_cached_token(creds)
+                    self.assertIsNone(creds.token)
+
+
+if __name__ == '__main__':
+    unittest.main()
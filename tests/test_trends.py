@@ -0,0 +1,142 @@
+import contextlib
+import io
+import math
+import unittest
+from unittest import mock
+import numpy as np
+import run
+from models import RatioSet
+from tests import WorkbookTestCase
+from trends import TrendEngine
+
+
+def history_rows(columns):
+    """
+    Rows of the history tab with the given {label: [six cells]} columns,
+    in the order of HISTORY_ROWS
+    """
+    rows = [[''] * (len(columns) + 1) for _ in range(12)]
+    for column, (label, cells) in enumerate(columns.items(), 1):
+        rows[run.HISTORY_HEADER_ROW - 1][column] = label
+        for row, cell in zip(run.HISTORY_ROWS.values(), cells):
+            rows[row - 1][column] = cell
+    return rows
+
+
+class TrendEngineTest(unittest.TestCase):
+
+    def test_changes(self):
+        engine = TrendEngine.from_history({
+            'quick_ratio': {'Q1': 1.0, 'Q2': 2.0, 'Q3': 1.5, 'Q4': 1.5,
+                            'Q5': 3.0}
+        })
+        self.assertEqual(engine.changes(), {'quick_ratio': {
+            'Q1-Q2': 100.0, 'Q2-Q3': -25.0, 'Q3-Q4': 0.0, 'Q4-Q5': 100.0}})
+        self.assertEqual(engine.yoy[0, -1], 200.0)
+        self.assertEqual(engine.moving_average[0, -1], 2.0)
+        np.testing.assert_allclose(engine.cagr, [200.0])
+
+    def test_change_from_zero_is_infinite(self):
+        engine = TrendEngine.from_history({'quick_ratio': {'Q1': 0.0,
+                                                           'Q2': 1.0}})
+        self.assertEqual(engine.changes()['quick_ratio']['Q1-Q2'],
+                         math.inf)
+
+    def test_extend_in_parts_matches_one_load(self):
+        values = np.arange(1.0, 41.0).reshape(2, 20)
+        periods = [f"P{i}" for i in range(20)]
+        whole = TrendEngine(['a', 'b'], capacity=20)
+        whole.extend(periods, values)
+        parts = TrendEngine(['a', 'b'], capacity=1)
+        for start in range(0, 20, 3):
+            parts.extend(periods[start:start + 3], values[:, start:start + 3])
+        for attribute in ('values', 'qoq', 'yoy', 'moving_average', 'cagr'):
+            np.testing.assert_array_equal(
+                getattr(parts, attribute), getattr(whole, attribute))
+
+    def test_missing_value_only_leaves_its_windows(self):
+        values = [1.0, math.nan, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0]
+        engine = TrendEngine.from_history({'quick_ratio': {
+            f"Q{index}": value for index, value in enumerate(values, 1)}})
+        np.testing.assert_allclose(
+            engine.moving_average[0, 3:],
+            [8 / 3, 4.0, 4.5, 5.5, 6.5, 7.5])
+
+    def test_window_of_missing_values_has_no_average(self):
+        engine = TrendEngine(['a'], window=2)
+        engine.extend(['Q1', 'Q2', 'Q3'], [[math.nan, math.nan, 2.0]])
+        np.testing.assert_array_equal(engine.moving_average,
+                                      [[math.nan, math.nan, 2.0]])
+
+    def test_cagr_needs_positive_ends(self):
+        engine = TrendEngine(['negative', 'to_zero', 'from_missing', 'up'],
+                             periods_per_year=1)
+        engine.extend(['2022', '2023'], [[-1.0, -2.0], [1.0, 0.0],
+                                         [math.nan, 2.0], [1.0, 2.0]])
+        np.testing.assert_array_equal(engine.cagr,
+                                      [math.nan, math.nan, math.nan, 100.0])
+
+    def test_append_matches_a_rebuild(self):
+        engine = TrendEngine(['a', 'b'])
+        for index in range(9):
+            engine.append(f"Q{index}", [index + 1.0, 10.0 - index])
+        engine.append('Q8', [20.0, 1.0])
+        rebuilt = TrendEngine(['a', 'b'])
+        rebuilt.extend([f"Q{index}" for index in range(9)], [
+            [1, 2, 3, 4, 5, 6, 7, 8, 20], [10, 9, 8, 7, 6, 5, 4, 3, 1]])
+        self.assertEqual(engine.periods, rebuilt.periods)
+        for attribute in ('values', 'qoq', 'yoy', 'moving_average', 'cagr'):
+            np.testing.assert_array_equal(
+                getattr(engine, attribute), getattr(rebuilt, attribute))
+
+
+class SessionTrendsTest(WorkbookTestCase):
+
+    def test_recorded_ratios_are_appended_to_the_trends(self):
+        engine = run.get_trend_engine()
+        ratios = RatioSet(1.234, 0.9, 12.5, 6.0, 45.0, 3.0)
+        with mock.patch.object(run, 'TYPING_DELAY', 0), \
+                contextlib.redirect_stdout(io.StringIO()):
+            run.update_ratios_googlews(ratios)
+        self.assertIs(run.get_trend_engine(), engine)
+        rebuilt = TrendEngine.from_history(run.get_historical_data())
+        self.assertEqual(engine.periods, rebuilt.periods)
+        np.testing.assert_array_equal(engine.values, rebuilt.values)
+        self.assertEqual(engine.values[0, -1], 1.23)
+
+    def test_refresh_rebuilds_the_trends(self):
+        engine = run.get_trend_engine()
+        run.refresh_workbook()
+        self.assertIsNot(run.get_trend_engine(), engine)
+
+
+class HistoricalDataTest(unittest.TestCase):
+
+    def test_blank_cells_are_missing(self):
+        history = run.get_historical_data(history_rows({
+            'Q1 2023': ['1.50', '1.00', '10.00', '5.00', '0.50', '4.00'],
+            'Q2 2023': ['1,600.00', '', '12.00', ' ', '0.40', '5.00']
+        }))
+        self.assertEqual(history['current_ratio'],
+                         {'Q1 2023': 1.5, 'Q2 2023': 1600.0})
+        self.assertTrue(math.isnan(history['quick_ratio']['Q2 2023']))
+        self.assertTrue(math.isnan(history['return_on_assets']['Q2 2023']))
+
+    def test_empty_columns_are_left_out(self):
+        history = run.get_historical_data(history_rows({
+            'Q1 2023': ['1.50', '1.00', '10.00', '5.00', '0.50', '4.00'],
+            'Q2 2023': [''] * 6
+        }))
+        self.assertEqual(list(history['current_ratio']), ['Q1 2023'])
+
+    def test_missing_change_is_not_reported_as_no_change(self):
+        report = run.calculate_trend_analysis({
+            'quick_ratio': {'Q1': 1.0, 'Q2': math.nan, 'Q3': 1.0}
+        })
+        lines = [text for style, text in report.lines if style == 'text']
+        self.assertIn("\tQ1-Q2: not available (missing value)", lines)
+        self.assertFalse(any("No change" in line for line in lines))
+
+
+if __name__ == '__main__':
+    unittest.main()
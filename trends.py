@@ -0,0 +1,174 @@
+"""
+This module provides a trend engine for any number of periods of
+financial ratios, updated incrementally as new periods are appended
+"""
+import numpy as np
+from models import history_values
+
+
+class TrendEngine:
+    """
+    Hold a history of ratios (ratios x periods) and the changes derived
+    from it: period-over-period (QoQ) and year-over-year (YoY) change in
+    %, moving averages and compound annual growth rate (CAGR).
+
+    Derived arrays are aligned with the periods and hold NaN where they
+    are undefined, e.g. the QoQ change of the first period. A change
+    from a previous value of zero is infinite. Missing values (NaN) are
+    left out of the moving averages.
+    """
+
+    def __init__(self, names, window=4, periods_per_year=4, capacity=16):
+        self.names = list(names)
+        self.window = window
+        self.periods_per_year = periods_per_year
+        self.periods = []
+        self._values = np.full((len(self.names), capacity), np.nan)
+        # Running sums and counts of the values present, for the
+        # moving averages
+        self._cumulative = np.zeros((len(self.names), capacity + 1))
+        self._counts = np.zeros((len(self.names), capacity + 1))
+        self._qoq = np.full_like(self._values, np.nan)
+        self._yoy = np.full_like(self._values, np.nan)
+        self._moving_average = np.full_like(self._values, np.nan)
+
+    @classmethod
+    def from_history(cls, historical_data, **options):
+        """
+        Build the engine from historical data in the format returned by
+        get_historical_data: {ratio: {period: value}}, or a RatioFrame
+        """
+        names, periods, values = history_values(historical_data)
+        engine = cls(names, capacity=max(len(periods), 1), **options)
+        engine.extend(periods, values)
+        return engine
+
+    def _grow(self, size):
+        """Double the capacity of the buffers until size periods fit"""
+        capacity = self._values.shape[1]
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for attribute in ('_values', '_qoq', '_yoy', '_moving_average'):
+            old = getattr(self, attribute)
+            new = np.full((len(self.names), capacity), np.nan)
+            new[:, :old.shape[1]] = old
+            setattr(self, attribute, new)
+        for attribute in ('_cumulative', '_counts'):
+            old = getattr(self, attribute)
+            new = np.zeros((len(self.names), capacity + 1))
+            new[:, :old.shape[1]] = old
+            setattr(self, attribute, new)
+
+    @staticmethod
+    def _change(current, previous):
+        """Change from previous to current in %, infinite from zero"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(
+                previous != 0, (current - previous) / previous * 100, np.inf)
+
+    def extend(self, periods, values):
+        """
+        Append one or more periods, values given as ratios x periods.
+        Only the derived values of the new periods are calculated.
+        """
+        values = np.asarray(values, dtype=float).reshape(
+            len(self.names), len(periods))
+        start = len(self.periods)
+        end = start + len(periods)
+        self._grow(end)
+        self._values[:, start:end] = values
+        present = ~np.isnan(values)
+        self._cumulative[:, start + 1:end + 1] = (
+            self._cumulative[:, start:start + 1] +
+            np.cumsum(np.where(present, values, 0), axis=1)
+        )
+        self._counts[:, start + 1:end + 1] = (
+            self._counts[:, start:start + 1] + np.cumsum(present, axis=1))
+        self.periods.extend(periods)
+
+        first = max(start, 1)
+        self._qoq[:, first:end] = self._change(
+            self._values[:, first:end], self._values[:, first - 1:end - 1])
+        lag = self.periods_per_year
+        first = max(start, lag)
+        if first < end:
+            self._yoy[:, first:end] = self._change(
+                self._values[:, first:end],
+                self._values[:, first - lag:end - lag])
+        first = max(start, self.window - 1)
+        if first < end:
+            window = (slice(None), slice(first + 1, end + 1))
+            before = (slice(None), slice(first + 1 - self.window,
+                                         end + 1 - self.window))
+            total = self._cumulative[window] - self._cumulative[before]
+            count = self._counts[window] - self._counts[before]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self._moving_average[:, first:end] = np.where(
+                    count > 0, total / count, np.nan)
+
+    def append(self, period, values):
+        """
+        Append a single period with one value per ratio. A period with
+        the label of the last one replaces it, as when the ratios of the
+        current period are recorded again.
+        """
+        if self.periods and self.periods[-1] == period:
+            self.periods.pop()
+        self.extend([period], np.asarray(values, dtype=float)[:, None])
+
+    @property
+    def values(self):
+        """Ratio values, ratios x periods"""
+        return self._values[:, :len(self.periods)]
+
+    @property
+    def qoq(self):
+        """Change from the previous period in %"""
+        return self._qoq[:, :len(self.periods)]
+
+    @property
+    def yoy(self):
+        """Change from the same period of the previous year in %"""
+        return self._yoy[:, :len(self.periods)]
+
+    @property
+    def moving_average(self):
+        """Average of the last `window` periods"""
+        return self._moving_average[:, :len(self.periods)]
+
+    @property
+    def cagr(self):
+        """
+        Compound annual growth rate in % between the first and the last
+        period, NaN when the growth is not defined (fewer than two
+        periods, or a first or last value that is missing, zero or
+        negative)
+        """
+        count = len(self.periods)
+        if count < 2:
+            return np.full(len(self.names), np.nan)
+        years = (count - 1) / self.periods_per_year
+        first, last = self._values[:, 0], self._values[:, count - 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(
+                (first > 0) & (last > 0),
+                ((last / first) ** (1 / years) - 1) * 100,
+                np.nan
+            )
+
+    def changes(self):
+        """
+        Get the period-over-period changes as {ratio: {'P1-P2': change}},
+        the format used by calculate_trend_analysis
+        """
+        labels = [
+            f"{self.periods[i - 1]}-{self.periods[i]}"
+            for i in range(1, len(self.periods))
+        ]
+        qoq = self.qoq[:, 1:].tolist()
+        return {
+            name: dict(zip(labels, row))
+            for name, row in zip(self.names, qoq)
+        }